@@ -1,9 +1,14 @@
 import streamlit as st
 from agent_functions import *
-from testing_agent import test_code
+from testing_agent import test_code, MEASUREMENT_MODES, profile_code, load_profile, format_hotspots, flame_summary, invalidate_code
+from timing_harness import is_significant_difference
+from db_manager import DatabaseHandler, WriteBehindQueue
+from similarity_index import SimilarityIndex
+import os
 import time
 import json
 import pandas as pd
+from typing import Dict, Optional
 
 # streamlit styles
 st.markdown(
@@ -93,15 +98,58 @@ def create_error_message(error: str) -> str:
     ```
     """
 
-# ChatGPT style text output
-def typewriter_effect_code(text, language="python", speed=0.01):
-    displayed_text = ""
-    text_placeholder = st.empty()
+# ChatGPT style text output: streamed tokens are rendered as they arrive, with re-renders
+# rate limited so long candidates do not redraw the code block for every token
+class StreamingCodeView:
+    def __init__(self, language="python", min_interval=0.1):
+        self.placeholder = st.empty()
+        self.language = language
+        self.min_interval = min_interval
+        self.text = ""
+        self.last_render = 0.0
 
-    for char in text:
-        displayed_text += char
-        text_placeholder.code(displayed_text, language)  # Preserve syntax highlighting
-        time.sleep(speed)
+    def update(self, text):
+        self.text = text
+        now = time.perf_counter()
+        if now - self.last_render >= self.min_interval:
+            self.placeholder.code(self.text, self.language)  # Preserve syntax highlighting
+            self.last_render = now
+
+    def finish(self, text=None):
+        if text is not None:
+            self.text = text
+        self.placeholder.code(self.text, self.language)
+
+# Optimization history, shared with the benchmark store in testing_agent
+HISTORY_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_optimizer.db")
+
+@st.cache_resource
+def open_history(db_path: str) -> tuple:
+    """The history handler and its similarity index, created once per process instead of on every rerun"""
+    history_db = DatabaseHandler(db_path)
+    return history_db, SimilarityIndex(history_db)
+
+history_db, code_index = open_history(HISTORY_DB_PATH)
+# History writes go through one background writer per process so the UI never waits on SQLite
+history_writer = WriteBehindQueue.for_database(HISTORY_DB_PATH)
+
+def show_previous_results(match: Dict):
+    """Display the stored, already measured variants of a near-identical earlier submission"""
+    st.info(f"This code is {match['similarity']:.0%} similar to an earlier submission. "
+            "Showing its previously measured variants; use Run anyway to optimize it again.")
+    st.table(pd.DataFrame([{
+        'Technique': result['techniques'],
+        'Execution Time (s)': f"{result['execution_time']:.4f}",
+        'Peak RSS (KB)': result['memory_usage'],
+        'Output': result['output']
+    } for result in match['results']]))
+    best = match['results'][0]
+    st.subheader(f"Fastest previous variant: {best['techniques']}")
+    st.code(best['improved_code'], language="python")
+
+def request_run_anyway(code: str):
+    """Button callback: the rerun it triggers runs the full pipeline for code despite a history match"""
+    st.session_state.run_anyway = code
 
 # Change available models, if you want to use something else. Make sure you also add the model to the select_model dict in agent.py
 available_models = ["OpenAI o1", "Claude 3.5 Sonnet","OpenAI GPT-4o", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini"]
@@ -117,7 +165,17 @@ user_code = st.text_area("Enter your prompt or Python code here:", height=200)
 not_code = st.toggle("Generate Optimized Code from Prompt")
 model_option = st.selectbox("Model used:", available_models)
 select_model(model_option)
-number_times = st.slider("Number of improvement techniques:", min_value=1, max_value=5, value=3)
+measurement_mode = st.radio(
+    "Measurement mode:", MEASUREMENT_MODES, horizontal=True,
+    format_func=lambda mode: {"fast": "Fast (parallel)", "quiet": "Quiet machine (serial, pinned)",
+                              "tournament": "Tournament (successive halving)"}[mode]
+)
+# Tournament mode eliminates slow candidates on small inputs, so it can afford more techniques
+number_times = st.slider("Number of improvement techniques:", min_value=1,
+                         max_value=12 if measurement_mode == "tournament" else 5, value=3)
+force_remeasure = st.checkbox("Force re-measure (new sample input; ignore memoized benchmark results and profiles)")
+reuse_history = st.toggle("Reuse results of near-identical past submissions", value=True)
+profile_first = st.toggle("Profile before choosing techniques (slower start, techniques target measured hotspots)")
 
 async def process_optimization(): 
     # Store results
@@ -131,50 +189,111 @@ async def process_optimization():
         else:
             st.subheader("Unoptimized Code")
             st.code(user_code, language="python")
+
+    # Short-circuit the whole pipeline when a near-identical snippet was already optimized and measured,
+    # unless the user chose to run it anyway
+    run_anyway = st.session_state.pop('run_anyway', None) == user_code
+    if reuse_history and not not_code and not run_anyway:
+        match = code_index.find_best_match(user_code)
+        if match:
+            with results_container:
+                show_previous_results(match)
+                st.button("Run anyway", key="run_anyway_button", on_click=request_run_anyway, args=(user_code,))
+            return
     
+    def show_hotspots(baseline_profile) -> Optional[str]:
+        if not baseline_profile:
+            return None
+        hotspots = format_hotspots(baseline_profile)
+        with results_container:
+            with st.expander("Measured hotspots of the original code"):
+                st.text(hotspots)
+        return hotspots
+
+    # Profile the original so the improvements target its measured bottlenecks. The profile runs in a worker
+    # thread while the techniques are generated, unless profile_first asks for techniques that target it too.
+    hotspots = None
+    profile_task = None
+    if not not_code:
+        if force_remeasure:
+            # Start from a fresh sample input, so the profile below and the measurements use the same one
+            invalidate_code(user_code, include_sample=True)
+        profile_task = asyncio.ensure_future(asyncio.to_thread(profile_code, user_code))
+        if profile_first:
+            with st.spinner("Profiling the original code..."):
+                hotspots = show_hotspots(await profile_task)
+
     # Generate optimization techniques
     with st.spinner("Generating optimization techniques..."):
-        optimization_techniques = cached_get_optimization_techniques(user_code, number_times)
+        optimization_techniques = await get_optimization_techniques(user_code, number_times, hotspots)
         
         if not optimization_techniques:
             st.warning("Failed to generate optimization techniques. Using default improvements.")
             optimization_techniques = ["General improvement"]
 
+    if profile_task is not None and not profile_first:
+        with st.spinner("Profiling the original code..."):
+            hotspots = show_hotspots(await profile_task)
+
     # List to store all code versions (original + optimized)
     if not_code:
         code_versions = list()
     else:
         code_versions = [user_code]
-    num_to_adjective = {1:"first", 2:"second", 3:"third", 4:"fourth", 5:"fifth"}
 
-    # Generate optimized versions
-    for i, technique in enumerate(optimization_techniques, start=1):
-        with st.spinner(f"Trying the {num_to_adjective[i]} optimization technique..."):
-            improved_code = cached_improve_code(user_code, [technique])
+    # One streaming view per technique, in technique order, filled concurrently as tokens arrive
+    code_views = {}
+    with results_container:
+        for i, technique in enumerate(optimization_techniques, start=1):
+            st.subheader(f"Optimization {i}: {technique}")
+            code_views[i] = StreamingCodeView()
 
+    # Generate optimized versions concurrently
+    improved_versions = [None] * len(optimization_techniques)
+    with st.spinner(f"Trying {len(optimization_techniques)} optimization techniques..."):
+        async for i, technique, improved_code in improve_code_concurrently(
+                user_code, optimization_techniques, on_update=lambda i, text: code_views[i].update(text), hotspots=hotspots):
             if improved_code:
-                # Display optimized code
-                with results_container:
-                    st.subheader(f"Optimization {i}: {technique}")
-                    typewriter_effect_code(improved_code)
-                
-                # Add to code versions for testing
-                code_versions.append(improved_code)
-            await asyncio.sleep(0)
+                code_views[i].finish(improved_code)
+                improved_versions[i - 1] = improved_code
+            else:
+                code_views[i].placeholder.warning(f"No code was generated for technique: {technique}")
+
+    # Add to code versions for testing, keeping the technique order
+    version_techniques = [] if not_code else ["Original"]
+    for technique, improved_code in zip(optimization_techniques, improved_versions):
+        if improved_code:
+            code_versions.append(improved_code)
+            version_techniques.append(technique)
 
     # Test all code versions
     with st.spinner("Running performance tests..."):
         # Use testing_agent to test all code versions
-        test_results = test_code(code_versions)
+        test_results = test_code(code_versions, mode=measurement_mode, force_remeasure=force_remeasure)
 
         # Prepare data for DataFrame
         results_data = []
         for i, result in enumerate(test_results):
             complexity = json.loads(result['complexity_analysis']) if isinstance(result['complexity_analysis'], str) else result['complexity_analysis']
+            if result.get('eliminated_in'):
+                # Only measured on a reduced input; its round times are in the output
+                measured = {'Execution Time (s)': f"eliminated in round {result['eliminated_in']}",
+                            **dict.fromkeys(['Min / IQR (s)', '95% CI (s)', 'Peak RSS (KB)', 'CPU User/Sys per call (s)',
+                                             'Ctx Switches per call (vol/invol)', 'Page Faults per call (major/minor)'], 'N/A')}
+            else:
+                measured = {
+                    'Execution Time (s)': f"{result['execution_time']:.4f}",
+                    'Min / IQR (s)': f"{result['timing']['min']:.4f} / {result['timing']['iqr']:.4f}" if result['timing'] else 'N/A',
+                    '95% CI (s)': f"[{result['timing']['ci_low']:.4f}, {result['timing']['ci_high']:.4f}]" if result['timing'] else 'N/A',
+                    'Peak RSS (KB)': result['memory_usage'],
+                    # Averages over the timed calls; whole-run totals when the sample has no benchmark_target
+                    'CPU User/Sys per call (s)': f"{result['cpu_user_time']:.3g} / {result['cpu_system_time']:.3g}",
+                    'Ctx Switches per call (vol/invol)': f"{result['voluntary_context_switches']:.1f} / {result['involuntary_context_switches']:.1f}",
+                    'Page Faults per call (major/minor)': f"{result['major_page_faults']:.1f} / {result['minor_page_faults']:.1f}"
+                }
             results_data.append({
                 'Version': f'Optimization {i + 1}' if not_code else f'Optimization {i}' if i != 0 else 'Original',
-                'Execution Time (s)': f"{result['execution_time']:.4f}",
-                'Memory Usage (KB)': result['memory_usage'],
+                **measured,
                 'Time Complexity': complexity.get('time_complexity', 'N/A'),
                 'Space Complexity': complexity.get('space_complexity', 'N/A'),
                 'Output': result['output']
@@ -192,11 +311,25 @@ async def process_optimization():
         if len(test_results) > 1 and not not_code:
             original = test_results[0]
             for i, optimized in enumerate(test_results[1:], start=1):
+                if optimized.get('eliminated_in'):
+                    improvements.append({
+                        'Optimization': f'Optimization {i}',
+                        'Time Improvement (%)': f"eliminated in round {optimized['eliminated_in']}",
+                        'Memory Improvement (%)': 'N/A'
+                    })
+                    continue
                 time_improvement = (original['execution_time'] - optimized['execution_time']) / original['execution_time'] * 100
-                memory_improvement = (original['memory_usage'] - optimized['memory_usage']) / original['memory_usage'] * 100
+                memory_improvement = (original['memory_usage'] - optimized['memory_usage']) / original['memory_usage'] * 100 if original['memory_usage'] else 0.0
+                # Only claim a time difference when the confidence intervals of the medians do not overlap
+                if optimized.get('limit_exceeded'):
+                    time_improvement_text = optimized['output']
+                elif is_significant_difference(original['timing'], optimized['timing']):
+                    time_improvement_text = f"{time_improvement:.2f}"
+                else:
+                    time_improvement_text = f"not significant ({time_improvement:.2f})"
                 improvements.append({
                     'Optimization': f'Optimization {i}',
-                    'Time Improvement (%)': f"{time_improvement:.2f}",
+                    'Time Improvement (%)': time_improvement_text,
                     'Memory Improvement (%)': f"{memory_improvement:.2f}"
                 })
 
@@ -204,8 +337,51 @@ async def process_optimization():
                 st.subheader("Performance Improvements")
                 st.table(pd.DataFrame(improvements))
 
-if st.button("Improve Code", type="primary"):
+        # Flame-style summary of where each version spends its time, with the raw profiles for download
+        profiled = [(row['Version'], result['profile_key']) for row, result in zip(results_data, test_results)
+                    if result.get('profile_key')]
+        if profiled:
+            st.subheader("Profiles")
+        for version, profile_key in profiled:
+            profile = load_profile(profile_key)
+            if not profile:
+                continue
+            with st.expander(f"{version}: where the time goes"):
+                st.code(flame_summary(profile['summary']), language=None)
+                st.text(format_hotspots(profile['summary']))
+                name = version.lower().replace(' ', '_')
+                if profile['pstats']:
+                    st.download_button("Download cProfile stats (.pstats)", profile['pstats'],
+                                       file_name=f"{name}.pstats", key=f"pstats_{profile_key}")
+                if profile['folded']:
+                    st.download_button("Download collapsed stacks (.folded)", profile['folded'],
+                                       file_name=f"{name}.folded", key=f"folded_{profile_key}")
+                st.download_button("Download summary (.json)", json.dumps(profile['summary'], indent=2),
+                                   file_name=f"{name}_profile.json", key=f"summary_{profile_key}")
+
+    # Record the run in the history and make it findable for future near-duplicates
+    # The conversation is created by the history writer too; its future stands in for the id
+    if 'conversation_id' not in st.session_state:
+        st.session_state.conversation_id = history_writer.create_conversation(user_code.strip().split('\n')[0][:80])
+    signature, buckets = (None, None) if not_code else code_index.signature_record(user_code)
+    history_writer.save_optimization(st.session_state.conversation_id, user_code, number_times, [{
+        'code': version,
+        'output': result['output'],
+        'execution_time': result['execution_time'],
+        'memory_usage': result['memory_usage'],
+        'techniques': technique,
+        'limit_exceeded': result.get('limit_exceeded'),
+        'eliminated_in': result.get('eliminated_in')
+    } for version, result, technique in zip(code_versions, test_results, version_techniques)], signature, buckets)
+
+cache_stats = llm_cache.stats()
+st.sidebar.caption(f"LLM cache: {cache_stats['total_hits']} hits / {cache_stats['total_misses']} misses, {cache_stats['entries']} entries")
+writer_stats = history_writer.metrics()
+st.sidebar.caption(f"History writer: {writer_stats['queue_depth']} queued, "
+                   f"last flush {writer_stats['last_flush_latency'] * 1000:.1f} ms, max {writer_stats['max_flush_latency'] * 1000:.1f} ms")
+
+if st.button("Improve Code", type="primary") or st.session_state.get('run_anyway') == user_code:
     if user_code:
-        asyncio.run(process_optimization())
+        run_async_func(process_optimization)
     else:
         st.warning("Please enter a prompt or some Python code to improve.")
\ No newline at end of file
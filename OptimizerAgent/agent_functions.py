@@ -2,89 +2,275 @@ import os
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import AIMessage
 import streamlit as st
 from openai import OpenAIError, RateLimitError
-from anthropic import APIError
+from anthropic import APIError, RateLimitError as AnthropicRateLimitError
 import nest_asyncio
 import time
+import json
 #from langchain_community.tools import DuckDuckGoSearchRun
 #from langchain_community.tools import DuckDuckGoSearchResults
 #from langchain_community.tools import TavilySearchResults
 
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient
 
 from dotenv import load_dotenv
 import asyncio
-from typing import List, Tuple, Dict
+import httpx
+from typing import Callable, List, Tuple, Dict, Optional
+from llm_cache import LLMCache
+from llm_clients import ClientRegistry, retry_after_seconds
 
 #search = DuckDuckGoSearchRun()
 nest_asyncio.apply()
 load_dotenv()
-llm = None
 model_names = {"OpenAI o1":"o1", "Claude 3.5 Sonnet":"claude-3-5-sonnet-latest", "OpenAI GPT-4o":"gpt-4o", "OpenAI o3-mini":"o3-mini",
 "Claude 3.5 Haiku":"claude-3-5-haiku-latest", "OpenAI GPT-4o mini":"gpt-4o-mini"}
-unavailable_models = list()
+model_fallback = {"OpenAI o1": ["Claude 3.5 Sonnet","OpenAI GPT-4o", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini"],
+                 "Claude 3.5 Sonnet":["OpenAI GPT-4o", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini", "OpenAI o1"],
+                 "OpenAI GPT-4o":["Claude 3.5 Sonnet", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini", "OpenAI o1"],
+                 "OpenAI o3-mini":["Claude 3.5 Haiku", "OpenAI GPT-4o mini", "OpenAI GPT-4o", "Claude 3.5 Sonnet", "OpenAI o1"],
+                 "Claude 3.5 Haiku":["OpenAI o3-mini", "OpenAI GPT-4o mini", "OpenAI GPT-4o", "Claude 3.5 Sonnet", "OpenAI o1"],
+                 "OpenAI GPT-4o mini":["Claude 3.5 Haiku", "OpenAI o3-mini", "OpenAI GPT-4o", "Claude 3.5 Sonnet", "OpenAI o1"]}
 selected_model = None
+# Upper bound on simultaneous improve_code requests issued by improve_code_concurrently
+MAX_CONCURRENT_IMPROVEMENTS = 5
+# Persistent cache of every invoke_with_fallback response, shared across processes and restarts
+llm_cache = LLMCache()
+# Hedged requests: when a model is slower than its HEDGE_PERCENTILE latency, the next model in
+# model_fallback is queried in parallel. Until HEDGE_MIN_SAMPLES calls were seen, HEDGE_DEFAULT_DELAY is used.
+HEDGE_REQUESTS = True
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 5
+HEDGE_DEFAULT_DELAY = 60.0
+
+def get_model_temperature(option: str) -> Optional[float]:
+    """Sampling temperature used for a model; None for models using the provider default."""
+    if "Claude" in option:
+        return None
+    if option in ["OpenAI o1", "OpenAI o1 mini", "OpenAI o3-mini"]:
+        return 1.0
+    return 0.7
+
+def build_client(option: str, http_client):
+    """Create the chat client for a model. OPENAI_BASE_URL / ANTHROPIC_BASE_URL can point at a local fake provider.
+
+    OpenAI clients use the registry's pooled http_client. The Anthropic SDK is built on its own httpx fork and
+    rejects an httpx client, so a Claude client keeps the connection pool it creates on first use; close_client
+    releases it.
+    """
+    if "Claude" in option:
+        kwargs = {'base_url': os.getenv('ANTHROPIC_BASE_URL')} if os.getenv('ANTHROPIC_BASE_URL') else {}
+        return ChatAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), model_name=model_names[option], **kwargs)
+    kwargs = {'base_url': os.getenv('OPENAI_BASE_URL')} if os.getenv('OPENAI_BASE_URL') else {}
+    return ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name=model_names[option],
+                      temperature=get_model_temperature(option), http_async_client=http_client, **kwargs)
+
+async def close_client(client) -> None:
+    """Close the SDK client a ChatAnthropic created for itself, if it made any request"""
+    sdk_client = client.__dict__.get('_async_client') if isinstance(client, ChatAnthropic) else None
+    if sdk_client is not None:
+        await sdk_client.close()
+
+# Long-lived clients per model plus a circuit breaker per model, replacing the old unavailable_models ban list
+client_registry = ClientRegistry(build_client, client_closer=close_client)
 
 def select_model(option: str):
-    global llm
     global selected_model
     selected_model = option
-    if option in ["Claude 3.5 Haiku", "Claude 3.5 Sonnet"]:
-        llm = ChatAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), model_name=model_names[option])
-    elif option in ["OpenAI o1 mini","OpenAI o3-mini"]:
-        llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name=model_names[option], temperature=1.0)
-    else:
-        llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name=model_names[option], temperature=0.7)
-        
+
 #llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name='o1-mini') 
 #llm = ChatAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), model_name='claude-3-5-sonnet-20241022')
 #llm = ChatAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), model_name='claude-3-7-sonnet-latest')
-client = TavilyClient(os.getenv('TAVILY_API_KEY'))
+# Async web search client; search_techniques awaits it so the event loop keeps serving LLM requests
+search_backend = AsyncTavilyClient(os.getenv('TAVILY_API_KEY'))
+# Seconds before a web search is abandoned and technique discovery continues without it
+SEARCH_TIMEOUT = 20.0
 
 if not os.environ.get("TAVILY_API_KEY"):
     os.environ["TAVILY_API_KEY"] = os.getenv('TAVILY_API_KEY')
 
-async def invoke_with_fallback(prompt: str) -> str:
-    global llm
+# A connection dropped while a stream is being read surfaces as the HTTP library's own error instead of an SDK
+# error; newer Anthropic SDKs are built on httpx2
+STREAM_TRANSPORT_ERRORS = (httpx.TransportError,)
+try:
+    import httpx2
+    STREAM_TRANSPORT_ERRORS += (httpx2.TransportError,)
+except ImportError:
+    pass
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return isinstance(error, (RateLimitError, AnthropicRateLimitError)) or getattr(error, "status_code", None) == 429
+
+def is_transient_error(error: Exception) -> bool:
+    """Connection problems, timeouts and server-side errors are worth retrying on another model"""
+    status_code = getattr(error, "status_code", None)
+    return status_code is None or status_code >= 500
+
+class ModelFailed(Exception):
+    """A model could not answer (rate limit, open breaker, transient error); the next model should be tried"""
+
+async def invoke_model(model: str, prompt: str):
+    """Send a prompt to one model through its circuit breaker, recording the latency of successful calls.
+
+    A cached answer of this model is returned without a request. An empty answer counts as a failure.
+    """
+    cached_response = llm_cache.get(model_names[model], get_model_temperature(model), prompt)
+    if cached_response is not None:
+        return AIMessage(content=cached_response)
+    breaker = client_registry.breaker(model)
+    if not breaker.allow_request():
+        raise ModelFailed(f"{model} is cooling down")
+    start = time.perf_counter()
+    try:
+        response = await client_registry.get(model).ainvoke(prompt)
+    except asyncio.CancelledError:
+        breaker.release_probe()
+        raise
+    except (OpenAIError, APIError) as e:
+        if is_rate_limit_error(e):
+            st.warning(f"Rate limit reached for {model}. Trying another model...")
+            breaker.record_failure(retry_after=retry_after_seconds(e), trip=True)
+            raise ModelFailed(str(e))
+        if is_transient_error(e):
+            print(f"Error invoking {model}: {str(e)}")
+            breaker.record_failure()
+            raise ModelFailed(str(e))
+        breaker.release_probe()
+        raise
+    breaker.record_success()
+    client_registry.latency(model).record(time.perf_counter() - start)
+    if not response or not response.content:
+        raise ModelFailed(f"{model} returned an empty response")
+    if isinstance(response.content, str):
+        llm_cache.set(model_names[model], get_model_temperature(model), prompt, response.content)
+    return response
+
+def hedge_delay(model: str) -> float:
+    """How long to wait for a model before hedging: its HEDGE_PERCENTILE latency once enough calls were seen"""
+    histogram = client_registry.latency(model)
+    if histogram.count < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return histogram.percentile(HEDGE_PERCENTILE)
+
+def switch_to_model(model: str):
     global selected_model
-    model_fallback = {"OpenAI o1": ["Claude 3.5 Sonnet","OpenAI GPT-4o", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini"],
-                     "Claude 3.5 Sonnet":["OpenAI GPT-4o", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini", "OpenAI o1"],
-                     "OpenAI GPT-4o":["Claude 3.5 Sonnet", "OpenAI o3-mini", "Claude 3.5 Haiku", "OpenAI GPT-4o mini", "OpenAI o1"],
-                     "OpenAI o3-mini":["Claude 3.5 Haiku", "OpenAI GPT-4o mini", "OpenAI GPT-4o", "Claude 3.5 Sonnet", "OpenAI o1"],
-                     "Claude 3.5 Haiku":["OpenAI o3-mini", "OpenAI GPT-4o mini", "OpenAI GPT-4o", "Claude 3.5 Sonnet", "OpenAI o1"],
-                     "OpenAI GPT-4o mini":["Claude 3.5 Haiku", "OpenAI o3-mini", "OpenAI GPT-4o", "Claude 3.5 Sonnet", "OpenAI o1"]}
-    model_queue = [selected_model] + model_fallback[selected_model]
-    for model in model_queue:
-        if model in unavailable_models:
+    if model != selected_model:
+        st.warning(f"The optimization processes will proceed with {model}")
+        selected_model = model
+
+async def invoke_with_fallback(prompt: str, hedge: Optional[bool] = None) -> str:
+    """Invoke the selected model, falling back along model_fallback when a model fails.
+
+    With hedging (HEDGE_REQUESTS by default), a model that has not answered within its hedge_delay gets a
+    parallel request to the next model in the chain; the first valid answer wins and the others are cancelled.
+    """
+    hedge = HEDGE_REQUESTS if hedge is None else hedge
+    models = [selected_model] + model_fallback[selected_model]
+    model_queue = iter(models)
+    running = {}
+    primary_failed = False
+    exhausted = False
+
+    def launch_next():
+        nonlocal exhausted
+        model = next(model_queue, None)
+        if model is None:
+            exhausted = True
+        else:
+            running[asyncio.ensure_future(invoke_model(model, prompt))] = model
+
+    try:
+        launch_next()
+        while running:
+            # Hedge on the most recently launched model, while there is still another model to try
+            timeout = hedge_delay(list(running.values())[-1]) if hedge and not exhausted else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch_next()
+                continue
+            for task in done:
+                model = running.pop(task)
+                try:
+                    response = task.result()
+                except ModelFailed:
+                    primary_failed = primary_failed or model == selected_model
+                    if not running:
+                        launch_next()
+                    continue
+                if primary_failed:
+                    switch_to_model(model)
+                return response
+    finally:
+        # Wait for the losers to unwind, so their requests are aborted before the winner is returned
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    st.error("All models are currently unavailable. Please try again later.")
+    return None
+            
+def chunk_text(chunk) -> str:
+    """Text of a streamed message chunk; Anthropic chunks may carry a list of content blocks"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if isinstance(block, dict))
+
+async def stream_with_fallback(prompt: str, on_update: Callable[[str], None]) -> Optional[str]:
+    """Stream a completion, calling on_update with the accumulated text as tokens arrive.
+
+    Models are tried in fallback order like invoke_with_fallback, and the user is told when a model other
+    than the selected one answers. Streams are not hedged: the first tokens reach the UI within seconds even
+    when the whole completion is slow, and a hedge would bill a second full completion for every slow stream.
+    If a model fails mid-stream (including a dropped connection), the next model starts over and on_update
+    restarts from its first token. The final text is stored in the LLM cache; a cache hit of the model being
+    tried is delivered as a single update. A model that streams no text counts as failed.
+    """
+    models = [selected_model] + model_fallback[selected_model]
+    for model in models:
+        cached_response = llm_cache.get(model_names[model], get_model_temperature(model), prompt)
+        if cached_response is not None:
+            switch_to_model(model)
+            on_update(cached_response)
+            return cached_response
+        breaker = client_registry.breaker(model)
+        if not breaker.allow_request():
             continue
-        if model != selected_model:
-            if "Claude" in model:
-                llm = ChatAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), model_name=model_names[model])
-            elif model in ["OpenAI o1", "OpenAI o3-mini"]:
-                llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name=model_names[model], temperature=1.0)
-            else:
-                llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name=model_names[model], temperature=0.7)
+        start = time.perf_counter()
+        text = ""
         try:
-            response = await llm.ainvoke(prompt)
-            if model != selected_model:
-                st.warning(f"The optimization processes will proceed with {model}")
-                selected_model = model
-            return response
-        except OpenAIError:
-            if RateLimitError:
+            async for chunk in client_registry.get(model).astream(prompt):
+                piece = chunk_text(chunk)
+                if piece:
+                    text += piece
+                    on_update(text)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except (OpenAIError, APIError) as e:
+            if is_rate_limit_error(e):
                 st.warning(f"Rate limit reached for {model}. Trying another model...")
-                unavailable_models.append(model)
+                breaker.record_failure(retry_after=retry_after_seconds(e), trip=True)
                 continue
-            else:
-                raise
-        except APIError as e:
-            if e.status_code == 429:
-                st.warning(f"Rate limit reached for {model}. Trying another model...")
-                unavailable_models.append(model)
+            if is_transient_error(e):
+                print(f"Error streaming from {model}: {str(e)}")
+                breaker.record_failure()
                 continue
-            else:
-                raise
+            breaker.release_probe()
+            raise
+        except STREAM_TRANSPORT_ERRORS as e:
+            print(f"Stream from {model} broke off: {str(e)}")
+            breaker.record_failure()
+            continue
+        breaker.record_success()
+        client_registry.latency(model).record(time.perf_counter() - start)
+        if not text:
+            print(f"{model} streamed an empty response")
+            continue
+        llm_cache.set(model_names[model], get_model_temperature(model), prompt, text)
+        switch_to_model(model)
+        return text
     st.error("All models are currently unavailable. Please try again later.")
     return None
             
@@ -98,10 +284,32 @@ should include all the optimizations before it, along with the new one.
 If you use numpy, you can move away from using it in later optimizations.
 """
 
-async def get_optimization_techniques(user_code: str, number_times: int) -> List[str]:
+def parse_techniques(text: str) -> List[str]:
+    techniques = text.strip().split('\n')
+    return [technique.strip('- ').strip().lstrip('0123456789. ')
+            for technique in techniques if technique.strip()]
+
+def hotspot_section(hotspots: Optional[str]) -> str:
+    """Prompt section with the measured hotspots of the code, empty when it was not profiled"""
+    if not hotspots:
+        return ""
+    return f"""
+Profiling the code on a representative input measured these hotspots. Target them first:
+{hotspots}
+"""
+
+async def get_optimization_techniques(user_code: str, number_times: int, hotspots: Optional[str] = None) -> List[str]:
+    """Find optimization techniques for the code.
+
+    A direct technique-generation prompt runs speculatively while the code is summarized and the
+    summary is searched on the web; the search snippets and the direct suggestions are then merged.
+    If the search fails or times out, the direct suggestions are used on their own. hotspots is the
+    measured profile of the code (testing_agent.format_hotspots), so techniques target real bottlenecks.
+    """
     try:
         prompt = f"""You are an expert in performance optimization. Generate a list of {number_times} code optimization techniques for the following code:
 {user_code}
+{hotspot_section(hotspots)}
 Each technique should be specific and actionable.
 Consider creative and advanced optimizations to improve its performance. 
 The optimizations should go beyond basic NumPy usage and incorporate techniques such as cache locality exploitation, 
@@ -110,26 +318,38 @@ Consider factors such as memory access patterns, minimizing cache misses, reduci
 and optimizing for different architectures (e.g., CPU vs. GPU). Feel free
 to import libraries that can also improve performance, especially new and interesting ones.
 Return only the list of techniques, one per line, with no additional text."""
-        
-        #response = await llm.ainvoke(prompt)
-        response = None
-        if not response or not response.content:
-            
-            summary = await user_code_summary(user_code) 
-            
+
+        async def summarize_and_search() -> List[str]:
+            summary = await user_code_summary(user_code)
+            if not summary or not summary.content:
+                return []
             summary = summary.content.strip().split('\n')[0]
-            
             print("llm summary response: ", summary)
-            techniques = await search_techniques(user_code, number_times, summary)
-            web_prompt = f""" {techniques} I have gathered multiple search snippets on advanced optimization. For {number_times}
-            snippets, return only the list of techniques, one per line, with only a one sentence description of the optimization."""
+            return await search_techniques(user_code, number_times, summary)
+
+        direct_response, snippets = await asyncio.gather(
+            invoke_with_fallback(prompt), summarize_and_search(), return_exceptions=True)
+        if isinstance(direct_response, Exception):
+            print(f"Error generating direct optimization techniques: {str(direct_response)}")
+            direct_response = None
+        if isinstance(snippets, Exception):
+            print(f"Error searching optimization techniques: {str(snippets)}")
+            snippets = []
+        direct_techniques = parse_techniques(direct_response.content) if direct_response and direct_response.content else []
+
+        response = None
+        if snippets:
+            web_prompt = f""" {snippets} I have gathered multiple search snippets on advanced optimization.
+            These techniques were also suggested for the code directly: {direct_techniques}
+            For {number_times} snippets, return only the list of techniques, one per line, with only a one sentence description of the optimization.
+            Prefer techniques supported by the snippets and merge duplicates with the direct suggestions.
+            {hotspot_section(hotspots)}"""
             response = await invoke_with_fallback(web_prompt)
             #response = await llm.ainvoke(web_prompt)
-            #return ["Basic optimization"]  # Fallback default
-            
-        techniques = response.content.strip().split('\n')
-        techniques = [technique.strip('- ').strip().lstrip('0123456789. ')
-                    for technique in techniques if technique.strip()]
+
+        techniques = parse_techniques(response.content) if response and response.content else direct_techniques
+        if not techniques:
+            return ["Basic optimization"]  # Fallback default
         
         print("techniques[0]", techniques[0])
         
@@ -141,25 +361,41 @@ Return only the list of techniques, one per line, with no additional text."""
         print(f"Error generating optimization techniques: {str(e)}")
         return ["Basic optimization"]
 
+def set_search_backend(backend) -> None:
+    """Replace the web search client, e.g. with a local stub. The backend needs an async
+    search(query=..., max_results=..., **options) returning a Tavily-style dict with 'answer' and 'results'."""
+    global search_backend
+    search_backend = backend
+
 async def search_techniques(user_code: str, number_times: int, user_code_summary: str) -> List[str]:
     
     query = f"detailed and in-depth {user_code_summary} optimization techniques"
-    
+    cache_key = f"{query}\n{number_times}"
+    cached_results = llm_cache.get("tavily", None, cache_key, namespace="search")
+    if cached_results is not None:
+        return json.loads(cached_results)
+
+    final_results = []
     try:
-        response = client.search(
+        response = await asyncio.wait_for(search_backend.search(
         max_results=number_times,
         query=query,
         search_depth="advanced",
         include_answer="advanced",
-        include_domains=["acm.org","ieee.org", "arxiv.org", "researchgate.net"]
-        )
+        include_domains=["acm.org","ieee.org", "arxiv.org", "researchgate.net"],
+        timeout=SEARCH_TIMEOUT
+        ), SEARCH_TIMEOUT)
         
         results_list = response
         answer = results_list.get('answer', '')
         content_list = [result.get('content', '') for result in results_list.get('results', []) if result.get('content')]
-        final_results = [answer] + content_list
+        final_results = ([answer] if answer else []) + content_list
         
         print("Tavily Search Results:", final_results)
+        if final_results:
+            llm_cache.set("tavily", None, cache_key, json.dumps(final_results), namespace="search")
+    except asyncio.TimeoutError:
+        print(f"Tavily search timed out after {SEARCH_TIMEOUT} seconds")
     except Exception as e:
         print(f"Error invoking Tavily search: {str(e)}")
 
@@ -168,6 +404,7 @@ async def search_techniques(user_code: str, number_times: int, user_code_summary
 
 async def user_code_summary(user_code: str) -> str:
     
+    response = None
     try:
         prompt = f"""Summarize the following code snippet: {user_code} 
         only give a brief, few word description of what the code is doing. For example, 
@@ -183,7 +420,10 @@ async def user_code_summary(user_code: str) -> str:
     return response
     
 
-async def improve_code(code: str, technique_subset: List[str]) -> str:
+async def improve_code(code: str, technique_subset: List[str], on_update: Optional[Callable[[str], None]] = None,
+                       hotspots: Optional[str] = None) -> str:
+    """Ask the LLM for an improved version of code. With on_update, tokens are streamed and
+    on_update receives the accumulated text as it grows. hotspots is the measured profile of the code."""
     techniques = ', '.join(technique_subset)
     
     print("techniques: ", techniques)
@@ -201,31 +441,74 @@ part of the functionality of the code. Do not include a main method, unless one
 Feel free to import libraries that can also improve performance, especially new and interesting ones.
 
 {code}
-
+{hotspot_section(hotspots)}
 ONLY RETURN CODE, NO OTHER TEXT.
 ONLY RETURN THE RAW CODE WITHOUT ANY MARKDOWN, AND NOTHING ELSE.
 Ensure all variables are properly defined before use.
 Keep any print statements or output generation from the original code.
 Only return optimized code in the language the original code was given in.
 """
+    if on_update is not None:
+        return await stream_with_fallback(prompt, on_update)
     response = await invoke_with_fallback(prompt)
     #response = await llm.ainvoke(prompt)
     parser = StrOutputParser()
     improved_code = parser.invoke(response.content)
     return improved_code
 
+async def improve_code_concurrently(code: str, techniques: List[str], max_concurrency: int = MAX_CONCURRENT_IMPROVEMENTS,
+                                    on_update: Optional[Callable[[int, str], None]] = None, hotspots: Optional[str] = None):
+    """Generate one improved candidate per technique concurrently.
+
+    Yields (index, technique, improved_code) tuples in completion order, so callers can
+    render each candidate as soon as it arrives. At most max_concurrency LLM requests are in flight.
+    If on_update is given, candidates are streamed and on_update(index, text_so_far) is called as tokens arrive.
+    When the caller stops early, the remaining requests are cancelled before the generator closes.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def improve_one(index: int, technique: str) -> Tuple[int, str, str]:
+        async with semaphore:
+            try:
+                stream_handler = (lambda text: on_update(index, text)) if on_update else None
+                improved_code = await improve_code(code, [technique], stream_handler, hotspots)
+            except Exception as e:
+                print(f"Error improving code with technique '{technique}': {str(e)}")
+                improved_code = None
+        return index, technique, improved_code
+
+    tasks = [asyncio.ensure_future(improve_one(i, technique)) for i, technique in enumerate(techniques, start=1)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
 def run_async_func(_async_func, *args, **kwargs):
-    return asyncio.run(_async_func(*args, **kwargs))
-
-@st.cache_data
-def cached_improve_code(code: str, technique_subset: List[str]) -> str:
-    #start = time.perf_counter()
-    #time.sleep(4)
-    #end = time.perf_counter()
-    #print(f"Execution time: {end - start:.6f} seconds")
-    #print(f"test test test") 
-    return run_async_func(improve_code, code, technique_subset)
-
-@st.cache_data
-def cached_get_optimization_techniques(user_code: str, number_times: int) -> List[str]:
-    return run_async_func(get_optimization_techniques, user_code, number_times)
\ No newline at end of file
+    """Run a coroutine function to completion. The outermost run owns the loop's clients and closes them at the end;
+    a nested run (nest_asyncio) leaves them to it."""
+    try:
+        asyncio.get_running_loop()
+        nested = True
+    except RuntimeError:
+        nested = False
+    if nested:
+        return asyncio.run(_async_func(*args, **kwargs))
+
+    async def run_and_close():
+        try:
+            return await _async_func(*args, **kwargs)
+        finally:
+            await client_registry.aclose()
+    return asyncio.run(run_and_close())
+
+# LLM responses are cached on disk by invoke_with_fallback, so these wrappers no longer need st.cache_data
+def cached_improve_code(code: str, technique_subset: List[str], hotspots: Optional[str] = None) -> str:
+    return run_async_func(improve_code, code, technique_subset, hotspots=hotspots)
+
+def cached_get_optimization_techniques(user_code: str, number_times: int, hotspots: Optional[str] = None) -> List[str]:
+    return run_async_func(get_optimization_techniques, user_code, number_times, hotspots)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Micro-benchmark of history write throughput in DatabaseHandler.
+
+Compares the previous access pattern (a new connection per call, one INSERT per result,
+one DELETE per entry) against the pooled WAL connection with executemany and cascading deletes.
+
+    python db_benchmark.py --entries 500 --results-per-entry 5
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List
+
+from db_manager import DatabaseHandler
+
+def make_results(count: int) -> List[Dict]:
+    return [{
+        'code': f"def f{i}(x):\n    return x * {i}\n",
+        'output': f"{i}",
+        'execution_time': 0.001 * i,
+        'memory_usage': 1024.0 + i,
+        'techniques': f"technique {i}"
+    } for i in range(count)]
+
+def legacy_save(db_name: str, conversation_id: int, original_code: str, results: List[Dict]) -> None:
+    """Row-at-a-time insert on a fresh connection, as save_optimization used to do"""
+    with sqlite3.connect(db_name) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO optimization_entries (conversation_id, original_code, num_techniques)
+            VALUES (?, ?, ?)
+        """, (conversation_id, original_code, len(results)))
+        entry_id = cursor.lastrowid
+        for result in results:
+            cursor.execute("""
+                INSERT INTO optimization_results
+                (entry_id, improved_code, output, execution_time, memory_usage, techniques)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (entry_id, result['code'], result['output'], result['execution_time'],
+                  result['memory_usage'], result['techniques']))
+        conn.commit()
+
+def legacy_delete(db_name: str, conversation_id: int) -> None:
+    """Per-entry deletes on a fresh connection, as delete_conversation used to do"""
+    with sqlite3.connect(db_name) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM optimization_entries WHERE conversation_id = ?", (conversation_id,))
+        for (entry_id,) in cursor.fetchall():
+            cursor.execute("DELETE FROM optimization_results WHERE entry_id = ?", (entry_id,))
+        cursor.execute("DELETE FROM optimization_entries WHERE conversation_id = ?", (conversation_id,))
+        cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+        conn.commit()
+
+def run(entries: int, results_per_entry: int) -> Dict[str, Dict[str, float]]:
+    results = make_results(results_per_entry)
+    rows = entries * (results_per_entry + 1)
+    timings = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("legacy", "pooled"):
+            db_name = os.path.join(directory, f"{name}.db")
+            handler = DatabaseHandler(db_name)
+            conversation_id = handler.create_conversation("benchmark")
+            if name == "legacy":
+                # The legacy path ran with the default rollback journal
+                handler.connection.execute("PRAGMA journal_mode=DELETE")
+                handler.close()
+
+            start = time.perf_counter()
+            for i in range(entries):
+                if name == "legacy":
+                    legacy_save(db_name, conversation_id, f"original {i}", results)
+                else:
+                    handler.save_optimization(conversation_id, f"original {i}", len(results), results)
+            insert_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if name == "legacy":
+                legacy_delete(db_name, conversation_id)
+            else:
+                handler.delete_conversation(conversation_id)
+            delete_seconds = time.perf_counter() - start
+            handler.close()
+
+            timings[name] = {
+                'insert_rows_per_second': rows / insert_seconds,
+                'delete_rows_per_second': rows / delete_seconds
+            }
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--results-per-entry", type=int, default=5)
+    args = parser.parse_args()
+
+    timings = run(args.entries, args.results_per_entry)
+    for name, numbers in timings.items():
+        print(f"{name:>7}: insert {numbers['insert_rows_per_second']:>10.0f} rows/s, "
+              f"delete {numbers['delete_rows_per_second']:>10.0f} rows/s")
@@ -1,34 +1,79 @@
+import os
 import sqlite3
+import json
+import time
+import queue
+import atexit
+import weakref
+import threading
+from concurrent.futures import Future
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Union
+
+# Applied to every pooled connection: WAL lets readers proceed while one writer commits,
+# NORMAL synchronous is durable under WAL except on power loss, and a 16 MB page cache
+# keeps the history tables hot for repeated reads
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000"
+]
+
+class _ThreadConnection:
+    """A thread's pooled connection. Only the thread-local holds it, so the connection is closed once its thread exits"""
+
+    def __init__(self, db_name: str):
+        # check_same_thread is off so close() and the finalizer can release it from any thread
+        self.conn = sqlite3.connect(db_name, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
+        self.cursor = None
+        self._finalizer = weakref.finalize(self, self.conn.close)
+
+    def close(self):
+        self._finalizer()
 
 class DatabaseHandler:
     def __init__(self, db_name: str = "code_optimizer.db"):
         self.db_name = db_name
+        # One connection per thread, created lazily and reused while the thread lives; connections of
+        # threads that exited are closed and drop out of the weak set
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
         self.init_database()
-        self._connection = None
-        self._cursor = None
 
-    property
-    def connection(self):
-        if self._connection is None:
-            self._connection = sqlite3.connect(self.db_name)
-            self._connection.row_factory = sqlite3.Row
-        return self._connection
+    def _thread_connection(self) -> _ThreadConnection:
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = _ThreadConnection(self.db_name)
+            self._local.holder = holder
+            with self._connections_lock:
+                self._connections.add(holder)
+        return holder
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._thread_connection().conn
 
     @property
-    def cursor(self):
-        if self._cursor is None:
-            self._cursor = self.connection.cursor()
-        return self._cursor
+    def cursor(self) -> sqlite3.Cursor:
+        holder = self._thread_connection()
+        if holder.cursor is None:
+            holder.cursor = holder.conn.cursor()
+        return holder.cursor
 
     def close(self):
-        if self._cursor:
-            self._cursor.close()
-            self._cursor = None
-        if self._connection:
-            self._connection.close()
-            self._connection = None
+        with self._connections_lock:
+            holders = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for holder in holders:
+            holder.close()
+        self._local = threading.local()
 
     def __enter__(self):
         return self
@@ -38,7 +83,7 @@ class DatabaseHandler:
 
     def init_database(self):
         """Initialize the database with required tables"""
-        with sqlite3.connect(self.db_name) as conn:
+        with self.connection as conn:
             cursor = conn.cursor()
             
             # Add indexes for better query performance
@@ -70,11 +115,85 @@ class DatabaseHandler:
                     execution_time FLOAT,
                     memory_usage FLOAT,
                     techniques TEXT,
+                    limit_exceeded TEXT,
+                    eliminated_in INTEGER,
                     FOREIGN KEY (entry_id) REFERENCES optimization_entries (id) ON DELETE CASCADE
                 )
             """)
+            # Databases created before runs recorded which resource limit stopped them and which
+            # tournament round eliminated them
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(optimization_results)")]
+            for column, column_type in [('limit_exceeded', "TEXT"), ('eliminated_in', "INTEGER")]:
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE optimization_results ADD COLUMN {column} {column_type}")
             
+            # MinHash signatures of original_code and their LSH buckets, for near-duplicate lookup
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS code_signatures (
+                    entry_id INTEGER PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    FOREIGN KEY (entry_id) REFERENCES optimization_entries (id) ON DELETE CASCADE
+                )
+            """)
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS code_lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    entry_id INTEGER NOT NULL,
+                    FOREIGN KEY (entry_id) REFERENCES optimization_entries (id) ON DELETE CASCADE
+                )
+            """)
+
+            # Cached sample inputs, keyed by a hash of the normalized code they were generated for
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS benchmark_samples (
+                    code_hash TEXT PRIMARY KEY,
+                    sample_input TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Memoized benchmark reports, keyed by code, sample input and environment fingerprint
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS benchmark_results (
+                    key TEXT PRIMARY KEY,
+                    code_hash TEXT NOT NULL,
+                    sample_hash TEXT NOT NULL,
+                    environment TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Profiles of benchmarked code, keyed like benchmark_results; pstats and folded stacks are exportable as files
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS benchmark_profiles (
+                    key TEXT PRIMARY KEY,
+                    code_hash TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    pstats BLOB,
+                    folded TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
             # Add indexes
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_lsh_band_bucket
+                ON code_lsh_buckets(band, bucket)
+            """)
+
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_lsh_entry
+                ON code_lsh_buckets(entry_id)
+            """)
+
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_benchmark_results_code
+                ON benchmark_results(code_hash)
+            """)
+
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_conversation_created 
                 ON conversations(created_at)
@@ -110,52 +229,55 @@ class DatabaseHandler:
 
     def create_conversation(self, title: str) -> int:
         """Create a new conversation and return its ID"""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO conversations (title) VALUES (?)",
-                (title,)
-            )
-            conn.commit()
-            return cursor.lastrowid
+        with self.connection as conn:
+            return self._insert_conversation(conn.cursor(), title)
+
+    def _insert_conversation(self, cursor: sqlite3.Cursor, title: str) -> int:
+        cursor.execute(
+            "INSERT INTO conversations (title) VALUES (?)",
+            (title,)
+        )
+        return cursor.lastrowid
 
     def save_optimization(self, conversation_id: int, original_code: str, 
                          num_techniques: int, results: List[Dict]) -> int:
         """Save optimization entry and its results"""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            
-            # Save optimization entry
-            cursor.execute("""
-                INSERT INTO optimization_entries 
-                (conversation_id, original_code, num_techniques)
-                VALUES (?, ?, ?)
-            """, (conversation_id, original_code, num_techniques))
-            
-            entry_id = cursor.lastrowid
-            
-            # Save all results
-            for result in results:
-                cursor.execute("""
-                    INSERT INTO optimization_results 
-                    (entry_id, improved_code, output, execution_time, memory_usage, techniques)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    entry_id,
-                    result['code'],
-                    result['output'],
-                    result['execution_time'],
-                    result['memory_usage'],  # Insert memory_usage
-                    result['techniques']
-                ))
-            
-            conn.commit()
-            return entry_id
+        with self.connection as conn:
+            return self._insert_optimization(conn.cursor(), conversation_id, original_code, num_techniques, results)
+
+    def _insert_optimization(self, cursor: sqlite3.Cursor, conversation_id: int, original_code: str,
+                             num_techniques: int, results: List[Dict]) -> int:
+        """Insert an optimization entry and its results within the caller's transaction"""
+        # Save optimization entry
+        cursor.execute("""
+            INSERT INTO optimization_entries 
+            (conversation_id, original_code, num_techniques)
+            VALUES (?, ?, ?)
+        """, (conversation_id, original_code, num_techniques))
+        
+        entry_id = cursor.lastrowid
+        
+        # Save all results in one statement
+        cursor.executemany("""
+            INSERT INTO optimization_results 
+            (entry_id, improved_code, output, execution_time, memory_usage, techniques, limit_exceeded, eliminated_in)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            entry_id,
+            result['code'],
+            result['output'],
+            result['execution_time'],
+            result['memory_usage'],
+            result['techniques'],
+            result.get('limit_exceeded'),
+            result.get('eliminated_in')
+        ) for result in results])
+        
+        return entry_id
 
     def get_conversations(self) -> List[Dict]:
         """Get all conversations"""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connection as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, title, created_at
@@ -166,8 +288,7 @@ class DatabaseHandler:
 
     def get_conversation_entries(self, conversation_id: int) -> List[Dict]:
         """Get all entries for a specific conversation"""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connection as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, original_code, num_techniques, created_at
@@ -179,11 +300,10 @@ class DatabaseHandler:
 
     def get_entry_results(self, entry_id: int) -> List[Dict]:
         """Get all results for a specific entry"""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connection as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT improved_code, output, execution_time, memory_usage, techniques
+                SELECT improved_code, output, execution_time, memory_usage, techniques, limit_exceeded, eliminated_in
                 FROM optimization_results
                 WHERE entry_id = ?
             """, (entry_id,))
@@ -194,35 +314,12 @@ class DatabaseHandler:
         Delete a specific conversation and all its associated entries and results
         """
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                
-                # Get all entry IDs for this conversation
-                cursor.execute(
-                    "SELECT id FROM optimization_entries WHERE conversation_id = ?",
-                    (conversation_id,)
-                )
-                entry_ids = [row[0] for row in cursor.fetchall()]
-                
-                # Delete all results for these entries
-                for entry_id in entry_ids:
-                    cursor.execute(
-                        "DELETE FROM optimization_results WHERE entry_id = ?",
-                        (entry_id,)
-                    )
-                
-                # Delete all entries for this conversation
-                cursor.execute(
-                    "DELETE FROM optimization_entries WHERE conversation_id = ?",
-                    (conversation_id,)
-                )
-                
-                # Finally delete the conversation itself
-                cursor.execute(
+            with self.connection as conn:
+                # Entries and their results are removed by ON DELETE CASCADE
+                conn.execute(
                     "DELETE FROM conversations WHERE id = ?",
                     (conversation_id,)
                 )
-                conn.commit()
         except Exception as e:
             print(f"Error deleting conversation: {e}")
             raise
@@ -232,7 +329,7 @@ class DatabaseHandler:
         Delete all conversations and their associated entries and results
         """
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self.connection as conn:
                 cursor = conn.cursor()
                 
                 # Delete all results first
@@ -247,3 +344,271 @@ class DatabaseHandler:
         except Exception as e:
             print(f"Error clearing all conversations: {e}")
             raise
+
+    def save_code_signature(self, entry_id: int, signature: bytes, buckets: List[str]) -> None:
+        """Store the MinHash signature and LSH buckets of an entry's original code"""
+        with self.connection as conn:
+            self._insert_code_signature(conn.cursor(), entry_id, signature, buckets)
+
+    def _insert_code_signature(self, cursor: sqlite3.Cursor, entry_id: int, signature: bytes, buckets: List[str]) -> None:
+        cursor.execute(
+            "INSERT OR REPLACE INTO code_signatures (entry_id, signature) VALUES (?, ?)",
+            (entry_id, signature)
+        )
+        cursor.execute("DELETE FROM code_lsh_buckets WHERE entry_id = ?", (entry_id,))
+        cursor.executemany(
+            "INSERT INTO code_lsh_buckets (band, bucket, entry_id) VALUES (?, ?, ?)",
+            [(band, bucket, entry_id) for band, bucket in enumerate(buckets)]
+        )
+
+    def find_entries_by_buckets(self, buckets: List[str]) -> List[Dict]:
+        """Get entries sharing at least one LSH bucket, with their signature and original code"""
+        with self.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT e.id AS entry_id, e.original_code, s.signature
+                FROM optimization_entries e
+                JOIN code_signatures s ON s.entry_id = e.id
+                WHERE e.id IN (
+                    SELECT entry_id FROM code_lsh_buckets
+                    WHERE {" OR ".join("(band = ? AND bucket = ?)" for _ in buckets)}
+                )
+            """, [value for band, bucket in enumerate(buckets) for value in (band, bucket)])
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_sample(self, code_hash: str) -> Optional[str]:
+        """Get the cached sample input generated for a piece of code"""
+        with self.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT sample_input FROM benchmark_samples WHERE code_hash = ?",
+                (code_hash,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def save_sample(self, code_hash: str, sample_input: str) -> None:
+        """Cache the sample input generated for a piece of code"""
+        with self.connection as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO benchmark_samples (code_hash, sample_input) VALUES (?, ?)",
+                (code_hash, sample_input)
+            )
+            conn.commit()
+
+    def get_benchmark(self, key: str) -> Optional[Dict]:
+        """Get a memoized benchmark report"""
+        with self.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT report FROM benchmark_results WHERE key = ?",
+                (key,)
+            )
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row else None
+
+    def save_benchmark(self, key: str, code_hash: str, sample_hash: str, environment: str, report: Dict) -> None:
+        """Memoize a benchmark report"""
+        with self.connection as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO benchmark_results
+                (key, code_hash, sample_hash, environment, report)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, code_hash, sample_hash, environment, json.dumps(report)))
+            conn.commit()
+
+    def get_profile(self, key: str) -> Optional[Dict]:
+        """Get a stored profile as a dict with summary, pstats (bytes) and folded (collapsed stacks)"""
+        with self.connection as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT summary, pstats, folded FROM benchmark_profiles WHERE key = ?",
+                (key,)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'summary': json.loads(row[0]), 'pstats': row[1], 'folded': row[2]}
+
+    def save_profile(self, key: str, code_hash: str, summary: Dict, pstats: Optional[bytes], folded: Optional[str]) -> None:
+        """Store the profile of a piece of code"""
+        with self.connection as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO benchmark_profiles
+                (key, code_hash, summary, pstats, folded)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, code_hash, json.dumps(summary), pstats, folded))
+            conn.commit()
+
+    def invalidate_benchmarks(self, code_hash: Optional[str] = None, sample_key: Optional[str] = None) -> None:
+        """
+        Delete memoized benchmark reports and profiles of the code with code_hash and the sample input stored
+        under sample_key (the key passed to save_sample), or everything when neither is given
+        """
+        with self.connection as conn:
+            if code_hash is None and sample_key is None:
+                conn.execute("DELETE FROM benchmark_results")
+                conn.execute("DELETE FROM benchmark_profiles")
+                conn.execute("DELETE FROM benchmark_samples")
+            if code_hash is not None:
+                conn.execute("DELETE FROM benchmark_results WHERE code_hash = ?", (code_hash,))
+                conn.execute("DELETE FROM benchmark_profiles WHERE code_hash = ?", (code_hash,))
+            if sample_key is not None:
+                conn.execute("DELETE FROM benchmark_samples WHERE code_hash = ?", (sample_key,))
+            conn.commit()
+
+
+class WriteBehindQueue:
+    """Asynchronous persistence for a DatabaseHandler.
+
+    Callers enqueue write jobs and get a Future back immediately. A single writer thread drains the
+    bounded queue, runs up to max_batch jobs in one transaction and resolves their futures after the
+    commit. Sharing one queue per database file (see for_database) means concurrent sessions never
+    compete for SQLite's write lock. Pending jobs are flushed at interpreter exit; once close() has
+    started, submit() rejects new jobs.
+    """
+
+    _instances: Dict[str, "WriteBehindQueue"] = {}
+    _instances_lock = threading.Lock()
+    _STOP = object()
+
+    def __init__(self, db: DatabaseHandler, max_size: int = 1000, max_batch: int = 64):
+        self.db = db
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stats_lock = threading.Lock()
+        self.flushed_batches = 0
+        self.flushed_jobs = 0
+        self.failed_jobs = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+        self._closed = False
+        # Orders submit() against close(), so no job can land behind the stop marker
+        self._submit_lock = threading.Lock()
+        # Results of the jobs of the batch being written, for later jobs of the same batch (see result_of)
+        self._batch_results: Dict[Future, Any] = {}
+        self._thread = threading.Thread(target=self._run, name=f"write-behind:{db.db_name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def for_database(cls, db_name: str) -> "WriteBehindQueue":
+        """The process-wide queue for a database file"""
+        path = os.path.abspath(db_name)
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(DatabaseHandler(db_name))
+            return cls._instances[path]
+
+    def submit(self, job: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """Enqueue job(cursor); it runs on the writer thread inside a batch transaction. Blocks only if the queue is full"""
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("WriteBehindQueue is closed")
+            future = Future()
+            self._queue.put((job, future))
+        return future
+
+    def result_of(self, future: Future) -> Any:
+        """For use inside a job: the result of a job submitted before it, committed or earlier in the same batch"""
+        if future.done():
+            return future.result()
+        return self._batch_results[future]
+
+    def create_conversation(self, title: str) -> Future:
+        """Enqueue a new conversation; the future yields its id and can be passed to save_optimization right away"""
+        return self.submit(lambda cursor: self.db._insert_conversation(cursor, title))
+
+    def save_optimization(self, conversation_id: Union[int, Future], original_code: str, num_techniques: int,
+                          results: List[Dict], signature: Optional[bytes] = None,
+                          buckets: Optional[List[str]] = None) -> Future:
+        """Enqueue an optimization entry, its results and optionally its code signature; the future yields the entry id.
+
+        conversation_id may be the future of a create_conversation call.
+        """
+        def job(cursor: sqlite3.Cursor) -> int:
+            conversation = self.result_of(conversation_id) if isinstance(conversation_id, Future) else conversation_id
+            entry_id = self.db._insert_optimization(cursor, conversation, original_code, num_techniques, results)
+            if signature is not None:
+                self.db._insert_code_signature(cursor, entry_id, signature, buckets)
+            return entry_id
+        return self.submit(job)
+
+    def flush(self) -> None:
+        """Block until every job enqueued so far has been committed"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush pending jobs and stop the writer thread"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put((self._STOP, None))
+        self._thread.join()
+        self.db.close()
+
+    def metrics(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'flushed_batches': self.flushed_batches,
+                'flushed_jobs': self.flushed_jobs,
+                'failed_jobs': self.failed_jobs,
+                'last_flush_latency': self.last_flush_latency,
+                'max_flush_latency': self.max_flush_latency,
+                'avg_flush_latency': self._total_flush_latency / self.flushed_batches if self.flushed_batches else 0.0
+            }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            jobs = [item for item in batch if item[0] is not self._STOP]
+            stopping = len(jobs) != len(batch)
+            if jobs:
+                self._write_batch(jobs)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, jobs: List[tuple]):
+        start = time.perf_counter()
+        conn = self.db.connection
+        try:
+            with conn:
+                cursor = conn.cursor()
+                for job, future in jobs:
+                    self._batch_results[future] = job(cursor)
+            for _, future in jobs:
+                future.set_result(self._batch_results[future])
+            failed = 0
+        except Exception:
+            # Isolate the failing job: replay each one in its own transaction
+            self._batch_results.clear()
+            failed = 0
+            for job, future in jobs:
+                try:
+                    with conn:
+                        future.set_result(job(conn.cursor()))
+                except Exception as e:
+                    print(f"Error in write-behind job: {e}")
+                    future.set_exception(e)
+                    failed += 1
+        finally:
+            self._batch_results.clear()
+
+        latency = time.perf_counter() - start
+        with self._stats_lock:
+            self.flushed_batches += 1
+            self.flushed_jobs += len(jobs) - failed
+            self.failed_jobs += failed
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self._total_flush_latency += latency
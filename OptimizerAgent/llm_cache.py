@@ -0,0 +1,220 @@
+import os
+import atexit
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+# Shared by the Streamlit app and the headless scripts, regardless of their working directory
+DEFAULT_CACHE_PATH = os.getenv('MARCO_LLM_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.db"))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+# Lookups only buffer the hit/miss counters and the access times of hits; the buffer is written in one
+# transaction once it holds this many lookups or is this many seconds old
+ACCESS_FLUSH_BATCH = 64
+ACCESS_FLUSH_SECONDS = 5.0
+
+class LLMCache:
+    """Disk-backed, content-addressed cache of LLM responses.
+
+    Entries are keyed by a hash of (namespace, model, temperature, prompt). The cache is bounded by
+    total response size (least recently used entries are evicted first) and by age (entries older
+    than ttl_seconds are dropped). Every operation uses its own short-lived connection, and writes
+    run in IMMEDIATE transactions on a WAL database, so several threads and processes can share one file.
+    Lookups do not write: access times and hit/miss counts are buffered and flushed in batches, and
+    before every set() so eviction sees them.
+    """
+
+    def __init__(self, db_name: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.db_name = db_name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}
+        self._pending_counts = {'hits': 0, 'misses': 0}
+        self._last_flush = time.monotonic()
+        self.init_database()
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_name, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_database(self):
+        """Initialize the cache tables"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_name)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    temperature FLOAT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at FLOAT NOT NULL,
+                    accessed_at FLOAT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed
+                ON llm_responses(accessed_at)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_stats (name, value) VALUES ('hits', 0), ('misses', 0)")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], prompt: str, namespace: str = "llm") -> str:
+        """Content address of a request"""
+        payload = json.dumps([namespace, model, temperature, hashlib.sha256(prompt.encode()).hexdigest()])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _record(self, name: str, key: Optional[str] = None, now: Optional[float] = None) -> bool:
+        """Count a hit or miss (and a hit's access time) in the buffer; True when the buffer is due for a flush"""
+        with self._lock:
+            if name == 'hits':
+                self.hits += 1
+                self._pending_access[key] = now
+            else:
+                self.misses += 1
+            self._pending_counts[name] += 1
+            pending = self._pending_counts['hits'] + self._pending_counts['misses']
+            return pending >= ACCESS_FLUSH_BATCH or time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS
+
+    def _take_pending(self) -> tuple:
+        with self._lock:
+            access, counts = self._pending_access, self._pending_counts
+            self._pending_access, self._pending_counts = {}, {'hits': 0, 'misses': 0}
+            self._last_flush = time.monotonic()
+            return access, counts
+
+    def _restore_pending(self, access: Dict[str, float], counts: Dict[str, int]) -> None:
+        """Put back a buffer whose write failed, so the next flush retries it"""
+        with self._lock:
+            for key, accessed_at in access.items():
+                self._pending_access[key] = max(accessed_at, self._pending_access.get(key, accessed_at))
+            for name, value in counts.items():
+                self._pending_counts[name] += value
+
+    @staticmethod
+    def _write_pending(conn: sqlite3.Connection, access: Dict[str, float], counts: Dict[str, int]) -> None:
+        conn.executemany("UPDATE llm_responses SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                         [(accessed_at, key) for key, accessed_at in access.items()])
+        conn.executemany("UPDATE cache_stats SET value = value + ? WHERE name = ?",
+                         [(value, name) for name, value in counts.items() if value])
+
+    def flush(self) -> None:
+        """Write the buffered access times and hit/miss counts"""
+        access, counts = self._take_pending()
+        if not access and not any(counts.values()):
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._write_pending(conn, access, counts)
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            print(f"Error writing LLM cache access times: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._restore_pending(access, counts)
+        finally:
+            conn.close()
+
+    def get(self, model: str, temperature: Optional[float], prompt: str, namespace: str = "llm") -> Optional[str]:
+        """Return the cached response, or None on a miss or an expired entry"""
+        key = self.make_key(model, temperature, prompt, namespace)
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            print(f"Error reading LLM cache: {e}")
+            return None
+        finally:
+            conn.close()
+        hit = row is not None and now - row[1] <= self.ttl_seconds
+        if self._record('hits' if hit else 'misses', key, now):
+            self.flush()
+        return row[0] if hit else None
+
+    def set(self, model: str, temperature: Optional[float], prompt: str, response: str, namespace: str = "llm") -> None:
+        """Store a response and evict expired and least recently used entries"""
+        key = self.make_key(model, temperature, prompt, namespace)
+        now = time.time()
+        access, counts = self._take_pending()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._write_pending(conn, access, counts)
+            conn.execute("""
+                INSERT OR REPLACE INTO llm_responses
+                (key, model, temperature, response, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, model, temperature, response, len(response.encode()), now, now))
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            print(f"Error writing LLM cache: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._restore_pending(access, counts)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk entries from least to most recently used until enough bytes are freed
+        excess = total - self.max_bytes
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM llm_responses ORDER BY accessed_at ASC"):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM llm_responses WHERE key = ?", evicted)
+
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM llm_responses")
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process and across all processes, plus current cache size"""
+        self.flush()
+        conn = self._connect()
+        try:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+            persisted = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+        finally:
+            conn.close()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'total_hits': persisted.get('hits', 0),
+            'total_misses': persisted.get('misses', 0),
+            'entries': entries,
+            'bytes': total
+        }
@@ -0,0 +1,219 @@
+import math
+import time
+import asyncio
+import threading
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+# Keep-alive pool shared by every client created on one event loop
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120)
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+class CircuitBreaker:
+    """Per-model circuit breaker.
+
+    closed    - requests flow; consecutive failures are counted
+    open      - requests are rejected until the cooldown (or the provider's Retry-After) has passed
+    half_open - a single probe request is let through; success closes the breaker, failure reopens it
+                with a doubled cooldown (capped at max_cooldown)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, max_cooldown: float = 600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._state = self.CLOSED
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self.clock() >= self.open_until:
+                self._state = self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """True if a request may be sent now; in half-open state only one probe is allowed at a time"""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None, trip: bool = False) -> None:
+        """Count a failure. trip opens the breaker immediately, e.g. on a rate limit; retry_after overrides the cooldown"""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if trip or retry_after is not None or self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                cooldown = min(self.cooldown * (2 ** self.trips), self.max_cooldown)
+                if retry_after is not None:
+                    cooldown = retry_after
+                self.trips += 1
+                self.open_until = self.clock() + cooldown
+                self._state = self.OPEN
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot that ended without a verdict, e.g. a cancelled request"""
+        with self._lock:
+            self._probe_in_flight = False
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from a provider error's HTTP response, if present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class LatencyHistogram:
+    """Latency histogram with logarithmically spaced buckets (10 per decade, 10 ms to ~30 minutes)"""
+
+    BUCKETS_PER_DECADE = 10
+    MIN_LATENCY = 0.01
+    NUM_BUCKETS = 53
+
+    def __init__(self):
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.MIN_LATENCY:
+            return 0
+        index = int(math.log10(seconds / self.MIN_LATENCY) * self.BUCKETS_PER_DECADE) + 1
+        return min(index, self.NUM_BUCKETS - 1)
+
+    def _upper_bound(self, index: int) -> float:
+        return self.MIN_LATENCY * 10 ** (index / self.BUCKETS_PER_DECADE)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[self._bucket(seconds)] += 1
+            self.count += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given fraction of samples, or None without samples"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            threshold = fraction * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= threshold:
+                    return self._upper_bound(index)
+            return self._upper_bound(self.NUM_BUCKETS - 1)
+
+class ClientRegistry:
+    """Long-lived chat clients, one per model, with a pooled async HTTP connection for clients that accept one.
+
+    client_factory(model, http_client) builds the client for a model; passing a factory that points at a
+    local fake provider makes the fallback logic testable offline. httpx connections are bound to the event
+    loop that opened them, so clients and their shared pool are kept per running loop and reused by every
+    call made on that loop. Whoever runs the loop owns them and calls aclose() before the loop ends;
+    client_closer(client) releases any connections a client keeps outside the shared pool.
+    """
+
+    def __init__(self, client_factory: Callable[[str, httpx.AsyncClient], Any],
+                 breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+                 client_closer: Optional[Callable[[Any], Awaitable[None]]] = None):
+        self.client_factory = client_factory
+        self.breaker_factory = breaker_factory
+        self.client_closer = client_closer
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyHistogram] = {}
+        self._loop_state = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _state_for_loop(self) -> Dict:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = asyncio.get_event_loop()
+        with self._lock:
+            state = self._loop_state.get(loop)
+            if state is None:
+                state = {'http_client': httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT), 'clients': {}}
+                self._loop_state[loop] = state
+            return state
+
+    def get(self, model: str) -> Any:
+        """The client for a model on the current event loop, created on first use"""
+        state = self._state_for_loop()
+        with self._lock:
+            client = state['clients'].get(model)
+            if client is None:
+                client = self.client_factory(model, state['http_client'])
+                state['clients'][model] = client
+            return client
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = self.breaker_factory()
+            return self._breakers[model]
+
+    def latency(self, model: str) -> LatencyHistogram:
+        """Latency histogram of successful requests to a model"""
+        with self._lock:
+            if model not in self._latencies:
+                self._latencies[model] = LatencyHistogram()
+            return self._latencies[model]
+
+    def breaker_states(self) -> Dict[str, str]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {model: breaker.state for model, breaker in breakers.items()}
+
+    async def aclose(self) -> None:
+        """Close the clients and pooled HTTP connections of the current event loop; the next get() starts afresh"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_state.pop(loop, None)
+        if state is None:
+            return
+        if self.client_closer is not None:
+            for client in state['clients'].values():
+                try:
+                    await self.client_closer(client)
+                except Exception as e:
+                    print(f"Error closing client: {str(e)}")
+        await state['http_client'].aclose()
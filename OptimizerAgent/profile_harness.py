@@ -0,0 +1,178 @@
+"""Profiling harness for benchmarked code.
+
+testing_agent.profile_version runs this file as the child process:
+
+    python profile_harness.py <candidate.py> '<json config>'
+
+The candidate (code + sample input) is executed once as __main__, like timing_harness does. Its
+zero-argument benchmark_target is then profiled three ways, one after another so they do not
+distort each other:
+  - cProfile, for the self time of every function
+  - a sampling profiler on ITIMER_PROF, for the self time of source lines and for call stacks
+  - tracemalloc, for the source lines holding the most memory at the end of a call
+The summary is printed on a single line prefixed with PROFILE_MARKER. The pstats dump and the
+collapsed stacks (one "caller;callee count" line per stack, the input format of flamegraph.pl
+and speedscope) are written to pstats_path and folded_path.
+"""
+import contextlib
+import cProfile
+import json
+import linecache
+import os
+import pstats
+import runpy
+import signal
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+PROFILE_MARKER = "__MARCO_PROFILE__ "
+TARGET_NAME = "benchmark_target"
+# Frames of the candidate file are labelled with this instead of its temporary path
+CANDIDATE_LABEL = "<candidate>"
+
+DEFAULT_CONFIG = {
+    'top': 10,                  # entries kept per hotspot list
+    'sample_interval': 0.001,   # seconds of CPU time between stack samples
+    'sample_seconds': 1.0,      # keep calling the target under the sampler for at least this long
+    'max_stacks': 200,          # distinct stacks kept in the summary (all of them go to folded_path)
+    'pstats_path': None,
+    'folded_path': None
+}
+
+def _location(filename: str, candidate_path: str) -> str:
+    return CANDIDATE_LABEL if filename == candidate_path else os.path.basename(filename)
+
+def profile_functions(target, candidate_path: str, config: Dict) -> tuple:
+    """One call under cProfile; returns (total self time, top functions by self time)."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        target()
+    finally:
+        profiler.disable()
+    stats = pstats.Stats(profiler)
+    if config['pstats_path']:
+        stats.dump_stats(config['pstats_path'])
+
+    total = sum(entry[2] for entry in stats.stats.values())
+    functions = []
+    for (filename, line, name), (_, calls, self_time, cumulative_time, _) in stats.stats.items():
+        if filename == "~":
+            location = name  # a builtin or C extension function, e.g. <built-in method numpy...>
+        else:
+            location = f"{name} ({_location(filename, candidate_path)}:{line})"
+        functions.append({'function': location, 'self_time': self_time, 'cumulative_time': cumulative_time,
+                          'calls': calls})
+    functions.sort(key=lambda entry: -entry['self_time'])
+    return total, functions[:config['top']]
+
+def sample_stacks(target, candidate_path: str, config: Dict) -> tuple:
+    """Call target repeatedly under a CPU-time sampler; returns (sample count, line counts, stack counts).
+
+    Only frames from the target's own frame inward are kept. Time spent in C code (e.g. BLAS) is
+    attributed to the innermost Python line, which is the line that called into it.
+    """
+    target_code = getattr(target, "__code__", None)
+    lines = Counter()
+    stacks = Counter()
+
+    def on_sample(signum, frame):
+        labels = []
+        innermost = frame
+        while frame is not None:
+            labels.append(f"{frame.f_code.co_name} ({_location(frame.f_code.co_filename, candidate_path)})")
+            if frame.f_code is target_code:
+                break
+            frame = frame.f_back
+        if frame is None:
+            return  # the sample landed in the harness, between calls
+        lines[(innermost.f_code.co_filename, innermost.f_lineno, innermost.f_code.co_name)] += 1
+        stacks[";".join(reversed(labels))] += 1
+
+    signal.signal(signal.SIGPROF, on_sample)
+    signal.setitimer(signal.ITIMER_PROF, config['sample_interval'], config['sample_interval'])
+    try:
+        deadline = time.perf_counter() + config['sample_seconds']
+        target()
+        while time.perf_counter() < deadline:
+            target()
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+    return sum(stacks.values()), lines, stacks
+
+def allocation_sites(target, candidate_path: str, config: Dict) -> tuple:
+    """One call under tracemalloc; returns (peak bytes, top lines by memory still held when the call returns).
+
+    The returned value is kept alive until the snapshot, so allocations that make up the result count.
+    """
+    tracemalloc.start()
+    try:
+        result = target()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, "<frozen *>")])
+    sites = []
+    for stat in snapshot.statistics('lineno')[:config['top']]:
+        frame = stat.traceback[0]
+        sites.append({'location': f"{_location(frame.filename, candidate_path)}:{frame.lineno}",
+                      'source': linecache.getline(frame.filename, frame.lineno).strip(),
+                      'size': stat.size, 'count': stat.count})
+    return peak, sites
+
+def profile_target(target, candidate_path: str, config: Dict) -> Dict:
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        total_self_time, functions = profile_functions(target, candidate_path, config)
+        samples, lines, stacks = sample_stacks(target, candidate_path, config)
+        peak, sites = allocation_sites(target, candidate_path, config)
+
+    if config['folded_path']:
+        with open(config['folded_path'], 'w') as folded:
+            for stack, count in stacks.most_common():
+                folded.write(f"{stack} {count}\n")
+
+    hot_lines = [{
+        'location': f"{_location(filename, candidate_path)}:{line}",
+        'function': name,
+        'source': linecache.getline(filename, line).strip(),
+        'samples': count,
+        'fraction': count / samples
+    } for (filename, line, name), count in lines.most_common(config['top'])]
+
+    return {
+        'total_self_time': total_self_time,
+        'functions': functions,
+        'samples': samples,
+        'sample_interval': config['sample_interval'],
+        'lines': hot_lines,
+        'stacks': stacks.most_common(config['max_stacks']),
+        'peak_traced_bytes': peak,
+        'allocations': sites
+    }
+
+def main(argv: List[str]) -> None:
+    candidate_path = os.path.abspath(argv[1])
+    config = dict(DEFAULT_CONFIG)
+    if len(argv) > 2:
+        config.update(json.loads(argv[2]))
+
+    # Make the candidate look like it was started directly
+    sys.argv = [candidate_path]
+    sys.path[0] = os.path.dirname(candidate_path)
+    namespace = runpy.run_path(candidate_path, run_name="__main__")
+
+    target = namespace.get(TARGET_NAME)
+    if callable(target):
+        summary = profile_target(target, candidate_path, config)
+        sys.stdout.flush()
+        print(PROFILE_MARKER + json.dumps(summary), flush=True)
+
+if __name__ == "__main__":
+    main(sys.argv)
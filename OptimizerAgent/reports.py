@@ -0,0 +1,41 @@
+"""Benchmark reports and the output conventions of measured runs.
+
+Kept free of LLM clients and stores, so readers of stored results (e.g. similarity_index) can use them
+without importing testing_agent.
+"""
+from typing import Dict, Optional
+
+# Resource usage fields collected for every benchmarked child process
+RESOURCE_FIELDS = ['wall_time', 'cpu_user_time', 'cpu_system_time', 'voluntary_context_switches',
+                   'involuntary_context_switches', 'major_page_faults', 'minor_page_faults']
+
+# Output prefixes of runs that failed rather than produced results
+FAILURE_PREFIXES = ("Error", "Exception occurred")
+
+# Output reported for a run that was stopped by the sandbox or the harness call timeout
+LIMIT_MESSAGES = {
+    'wall': "Stopped: wall-clock limit exceeded",
+    'cpu': "Stopped: CPU time limit exceeded",
+    'memory': "Stopped: memory limit exceeded",
+    'call': "Stopped: a benchmark_target call exceeded its time limit"
+}
+
+def generate_report(code_output: str, execution_time: float, peak_memory: float, complexity_analysis: str,
+                    resource_usage: Optional[Dict] = None, timing: Optional[Dict] = None,
+                    limit_exceeded: Optional[str] = None) -> Dict:
+    """Generate a comprehensive report for the code execution."""
+    resource_usage = resource_usage or {}
+    report = {
+        'output': code_output,
+        'execution_time': execution_time,
+        'memory_usage': peak_memory // 1024,
+        'complexity_analysis': complexity_analysis,
+        'timing': timing,
+        'limit_exceeded': limit_exceeded
+    }
+    for field in RESOURCE_FIELDS:
+        report[field] = resource_usage.get(field, 0)
+    return report
+
+def is_failure(output: str) -> bool:
+    return output.startswith(FAILURE_PREFIXES)
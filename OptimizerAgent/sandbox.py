@@ -0,0 +1,143 @@
+import os
+import sys
+import signal
+import threading
+import subprocess
+import time
+from typing import Dict, List, Optional, Set
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Limits applied to every benchmarked candidate. cpu_seconds defaults to wall_seconds per pinned core.
+DEFAULT_LIMITS = {
+    'wall_seconds': 300.0,
+    'cpu_seconds': None,
+    'memory_bytes': 8 * 1024 ** 3
+}
+
+def _limit_child(pid: int, cpu_cores: Optional[Set[int]], cpu_seconds: Optional[float],
+                 memory_bytes: Optional[int]) -> None:
+    """Pin a just-started child and cap its CPU time and address space from the parent.
+
+    This replaces a preexec_fn, which is unsafe while other threads run (test_code starts children
+    from a thread pool). The child is still starting the interpreter when the limits land; RLIMIT_CPU
+    counts from process start either way. prlimit is Linux-only, so elsewhere only the wall-clock
+    limit applies.
+    """
+    if cpu_cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(pid, cpu_cores)
+    if resource is not None and hasattr(resource, "prlimit"):
+        if cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL one second later if it is ignored
+            seconds = int(cpu_seconds) + 1
+            resource.prlimit(pid, resource.RLIMIT_CPU, (seconds, seconds + 1))
+        if memory_bytes:
+            resource.prlimit(pid, resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+def _kill_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _wait(process: subprocess.Popen) -> tuple:
+    """Reap the child and return (exit status, rusage); rusage is None where wait4 is unavailable"""
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        # The child is reaped, so tell Popen its exit code instead of letting it wait again
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode, usage
+    return process.wait(), None
+
+def run_sandboxed(command: List[str], limits: Optional[Dict] = None, cpu_cores: Optional[Set[int]] = None) -> Dict:
+    """Run a command with wall-clock, CPU-time and memory limits, in its own process group.
+
+    Returns a dict with returncode, stdout, stderr, wall_time, peak_rss (bytes), resource_usage and
+    limit_exceeded, which is None or one of "wall", "cpu", "memory". When the wall-clock limit
+    expires, the whole process group is killed, so subprocesses started by the candidate die too.
+    """
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    cpu_seconds = limits['cpu_seconds']
+    if cpu_seconds is None and limits['wall_seconds']:
+        cpu_seconds = limits['wall_seconds'] * (len(cpu_cores) if cpu_cores else (os.cpu_count() or 1))
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True
+    )
+    try:
+        _limit_child(process.pid, cpu_cores, cpu_seconds, limits['memory_bytes'])
+    except OSError:
+        # The child already exited (e.g. a missing interpreter); its status is collected below
+        pass
+
+    # Read the pipes on helper threads so a chatty child cannot block on a full pipe buffer
+    streams = {}
+    def drain(name, pipe):
+        streams[name] = pipe.read()
+    readers = [threading.Thread(target=drain, args=(name, pipe), daemon=True)
+               for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr))]
+    for reader in readers:
+        reader.start()
+
+    wall_expired = threading.Event()
+    def on_wall_limit():
+        wall_expired.set()
+        _kill_group(process.pid)
+    timer = threading.Timer(limits['wall_seconds'], on_wall_limit) if limits['wall_seconds'] else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    try:
+        returncode, usage = _wait(process)
+    finally:
+        if timer:
+            timer.cancel()
+        # Take down anything the candidate left running in its group
+        _kill_group(process.pid)
+    wall_time = time.perf_counter() - start
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+
+    stderr = streams.get('stderr', '')
+    limit_exceeded = None
+    if wall_expired.is_set():
+        limit_exceeded = "wall"
+    elif returncode in (-signal.SIGXCPU, -signal.SIGKILL) and usage and usage.ru_utime + usage.ru_stime >= (cpu_seconds or float("inf")):
+        limit_exceeded = "cpu"
+    elif returncode != 0 and "MemoryError" in stderr:
+        limit_exceeded = "memory"
+
+    resource_usage = {'wall_time': wall_time}
+    peak_rss = 0
+    if usage is not None:
+        # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        resource_usage.update({
+            'cpu_user_time': usage.ru_utime,
+            'cpu_system_time': usage.ru_stime,
+            'voluntary_context_switches': usage.ru_nvcsw,
+            'involuntary_context_switches': usage.ru_nivcsw,
+            'major_page_faults': usage.ru_majflt,
+            'minor_page_faults': usage.ru_minflt
+        })
+
+    return {
+        'returncode': returncode,
+        'stdout': streams.get('stdout', ''),
+        'stderr': stderr,
+        'wall_time': wall_time,
+        'peak_rss': peak_rss,
+        'resource_usage': resource_usage,
+        'limit_exceeded': limit_exceeded
+    }
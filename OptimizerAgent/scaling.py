@@ -0,0 +1,74 @@
+import math
+from typing import Dict, List, Optional
+
+# Exponents within this distance of an integer are reported as that integer power
+EXPONENT_SNAP = 0.15
+# Below this exponent the measured cost is treated as constant
+CONSTANT_EXPONENT = 0.1
+
+def fit_power_law(sizes: List[float], values: List[float]) -> Optional[Dict]:
+    """Least-squares fit of log(value) = exponent * log(size) + intercept.
+
+    Points with a non-positive size or value are ignored. Returns a dict with exponent, r_squared and
+    points (the number of points used), or None when fewer than three points remain.
+    """
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if size > 0 and value and value > 0]
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    if sxx == 0:
+        return None
+    exponent = sxy / sxx
+    # A perfectly flat series has no variance to explain, which is a perfect fit of exponent 0
+    r_squared = 1.0 if syy == 0 else (sxy * sxy) / (sxx * syy)
+    return {'exponent': exponent, 'r_squared': r_squared, 'points': n}
+
+def is_reliable(fit: Optional[Dict], min_r_squared: float) -> bool:
+    """True when a fit explains enough of the variance, or is flat enough to call constant.
+
+    A constant cost leaves only noise to explain, so its R² is low even though the fit is right.
+    """
+    if fit is None:
+        return False
+    return fit['r_squared'] >= min_r_squared or abs(fit['exponent']) < CONSTANT_EXPONENT
+
+def complexity_label(fit: Optional[Dict]) -> str:
+    """Big-O label for a fitted exponent, e.g. "O(n^3) (n^2.93, R²=0.998)"."""
+    if fit is None:
+        return "N/A"
+    exponent = fit['exponent']
+    if exponent < CONSTANT_EXPONENT:
+        big_o = "O(1)"
+    elif abs(exponent - round(exponent)) <= EXPONENT_SNAP:
+        power = int(round(exponent))
+        big_o = "O(n)" if power == 1 else f"O(n^{power})"
+    else:
+        return f"O(n^{exponent:.2f}) (R²={fit['r_squared']:.3f})"
+    return f"{big_o} (n^{exponent:.2f}, R²={fit['r_squared']:.3f})"
+
+def summarize_scaling(scales: List[float], times: List[float], memory: List[float]) -> Dict:
+    """Fit time and memory against input scale and describe both in the estimate_complexity JSON layout.
+
+    The result has time_complexity, space_complexity and justification like the LLM estimate, plus
+    time_fit and space_fit with the raw fits (None when there were too few usable points).
+    """
+    time_fit = fit_power_law(scales, times)
+    space_fit = fit_power_law(scales, memory)
+    # Input sizes are proportional to the scale, so the exponent against the scale is the exponent against n
+    justification = (f"Measured at input scales {', '.join(f'{scale:g}' for scale in scales)} of the sample: "
+                     f"time ~ n^{time_fit['exponent']:.2f} (R²={time_fit['r_squared']:.3f})" if time_fit else
+                     "Too few usable timings to fit the time scaling")
+    if space_fit:
+        justification += f", peak allocated memory ~ n^{space_fit['exponent']:.2f} (R²={space_fit['r_squared']:.3f})"
+    return {
+        'time_complexity': complexity_label(time_fit),
+        'space_complexity': complexity_label(space_fit),
+        'justification': justification,
+        'time_fit': time_fit,
+        'space_fit': space_fit
+    }
@@ -0,0 +1,103 @@
+import re
+import random
+import hashlib
+from array import array
+from typing import List, Dict, Optional
+
+from db_manager import DatabaseHandler
+from reports import FAILURE_PREFIXES
+
+# MinHash signature length and LSH banding. With 16 bands of 4 rows, two snippets become
+# candidates with probability 1 - (1 - J^4)^16: ~99% at Jaccard similarity 0.7, ~1% at 0.2.
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 5
+# Matches at or above this estimated similarity are offered for reuse
+DEFAULT_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 61) - 1
+# Fixed seed so signatures stored by one process can be compared in another
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+_COMMENT_PATTERN = re.compile(r"#[^\n]*|//[^\n]*|/\*.*?\*/", re.S)
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_]\w*|\d+\.?\d*|\S")
+
+def tokenize(code: str) -> List[str]:
+    """Split code into identifier, number and symbol tokens, ignoring comments and whitespace."""
+    return _TOKEN_PATTERN.findall(_COMMENT_PATTERN.sub(" ", code))
+
+def shingles(code: str, size: int = SHINGLE_SIZE) -> set:
+    tokens = tokenize(code)
+    if len(tokens) < size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+def compute_signature(code: str) -> List[int]:
+    """MinHash signature of the code's token shingles."""
+    hashed = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+              for shingle in shingles(code)]
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashed) if hashed else _MAX_HASH
+            for a, b in _PERMUTATIONS]
+
+def lsh_buckets(signature: List[int]) -> List[str]:
+    """One bucket id per band; near-duplicates share at least one bucket with high probability."""
+    return [hashlib.blake2b(array('Q', signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]).tobytes(),
+                            digest_size=8).hexdigest()
+            for band in range(LSH_BANDS)]
+
+def estimated_similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / NUM_PERMUTATIONS
+
+class SimilarityIndex:
+    """MinHash/LSH index over original_code of stored optimization entries."""
+
+    def __init__(self, db: DatabaseHandler):
+        self.db = db
+
+    @staticmethod
+    def signature_record(code: str) -> tuple:
+        """(packed signature, LSH buckets) as stored for an entry"""
+        signature = compute_signature(code)
+        return array('Q', signature).tobytes(), lsh_buckets(signature)
+
+    def add(self, entry_id: int, code: str) -> None:
+        """Index the original code of an optimization entry"""
+        self.db.save_code_signature(entry_id, *self.signature_record(code))
+
+    def query(self, code: str, threshold: float = DEFAULT_THRESHOLD, limit: int = 3) -> List[Dict]:
+        """Return the most similar stored entries, best first, as dicts with entry_id, similarity and original_code"""
+        signature = compute_signature(code)
+        matches = []
+        for candidate in self.db.find_entries_by_buckets(lsh_buckets(signature)):
+            candidate_signature = array('Q')
+            candidate_signature.frombytes(candidate['signature'])
+            similarity = estimated_similarity(signature, list(candidate_signature))
+            if similarity >= threshold:
+                matches.append({
+                    'entry_id': candidate['entry_id'],
+                    'similarity': similarity,
+                    'original_code': candidate['original_code']
+                })
+        matches.sort(key=lambda match: (-match['similarity'], -match['entry_id']))
+        return matches[:limit]
+
+    def best_results(self, entry_id: int) -> List[Dict]:
+        """Stored results of an entry, fastest first, skipping runs that failed, were stopped by a limit or were
+        eliminated in a reduced-scale tournament round"""
+        results = [result for result in self.db.get_entry_results(entry_id)
+                   if result['execution_time'] and not result['limit_exceeded'] and not result['eliminated_in']
+                   and not str(result['output']).startswith(FAILURE_PREFIXES)]
+        return sorted(results, key=lambda result: result['execution_time'])
+
+    def find_best_match(self, code: str, threshold: float = DEFAULT_THRESHOLD) -> Optional[Dict]:
+        """The most similar stored entry that has usable results, with those results attached"""
+        for match in self.query(code, threshold):
+            results = self.best_results(match['entry_id'])
+            if results:
+                return dict(match, results=results)
+        return None
@@ -1,19 +1,102 @@
 import os
+import math
 import time
 import subprocess
 import tempfile
 import json
-import tracemalloc
 import re
-from typing import List, Dict
+import sys
+import ast
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Set
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
+from timing_harness import TIMING_MARKER, TARGET_NAME, DEFAULT_CONFIG
+from profile_harness import PROFILE_MARKER, DEFAULT_CONFIG as PROFILE_DEFAULTS
+from db_manager import DatabaseHandler
+from sandbox import run_sandboxed, DEFAULT_LIMITS
+from scaling import summarize_scaling, is_reliable
+from reports import RESOURCE_FIELDS, LIMIT_MESSAGES, generate_report, is_failure
 
 load_dotenv()
 
 # Initialize LLM
 llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), model_name='gpt-4o-mini')
 
+# Measurement modes for test_code:
+#   "fast"  - code versions are benchmarked in parallel, each worker slot pinned to its own
+#             disjoint set of CPU cores
+#   "quiet" - code versions are benchmarked one after another, pinned to a single core set
+#   "tournament" - successive halving: candidates race on growing fractions of the sample input and only the
+#             fastest advance, so many candidates cost little more than a few full-size runs
+MEASUREMENT_MODES = ["fast", "quiet", "tournament"]
+# Number of cores reserved for each benchmark worker slot
+CORES_PER_SLOT = 1
+
+# The timing harness is the child's entry point; it runs the candidate and times benchmark_target
+TIMING_HARNESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timing_harness.py")
+# Warmup, precision and budget used by the timing harness, see timing_harness.DEFAULT_CONFIG
+TIMING_CONFIG = dict(DEFAULT_CONFIG)
+
+# The profiling harness runs the candidate under cProfile, a stack sampler and tracemalloc
+PROFILE_HARNESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile_harness.py")
+PROFILE_CONFIG = dict(PROFILE_DEFAULTS)
+# Profile every version measured at full size, so each one gets its own hotspots and flame summary
+PROFILE_VERSIONS = True
+
+# Wall-clock, CPU-time and memory limits of every benchmark run, see sandbox.DEFAULT_LIMITS
+SANDBOX_LIMITS = dict(DEFAULT_LIMITS)
+# Once the original is measured, candidates are stopped when they run this many times longer than it
+CUTOFF_FACTOR = 5
+# Floors for the adaptive cutoff, so interpreter startup and timer jitter on tiny targets do not trip it
+MIN_CUTOFF_SECONDS = 30.0
+MIN_CALL_TIMEOUT = 0.1
+
+# Tournament mode: input scale of each round (the last one is the full-size sample) and the fraction of
+# candidates that advances after each elimination round. The original always advances as the baseline.
+TOURNAMENT_SCALES = [0.05, 0.25, 1.0]
+TOURNAMENT_KEEP = 0.5
+# Wall-clock budget for the elimination rounds; once it is spent, the survivors go to the full-size round
+TOURNAMENT_BUDGET_SECONDS = 120.0
+# Elimination rounds only need a ranking, so their timing runs stop sooner
+TOURNAMENT_ROUND_TIMING = {'max_seconds': 2.0, 'precision': 0.05}
+
+# Source of the Time/Space Complexity of each version:
+#   "measured" - log-log fit of time and peak allocation over a SAMPLE_SCALE sweep (see scaling.py)
+#   "llm"      - the LLM's Big-O estimate (estimate_complexity)
+COMPLEXITY_SOURCE = "measured"
+# Sweep scales below the full-size run, which supplies the last point of the fit
+COMPLEXITY_SWEEP_SCALES = [0.0625, 0.125, 0.25, 0.5]
+# Sweep runs only need a rough median
+COMPLEXITY_SWEEP_TIMING = {'max_seconds': 1.0, 'precision': 0.05}
+# Ask the LLM instead when the sweep fails or its time fit is worse than MIN_R_SQUARED
+COMPLEXITY_LLM_FALLBACK = True
+MIN_R_SQUARED = 0.9
+
+# Memoized sample inputs and benchmark reports
+BENCHMARK_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_optimizer.db")
+result_store = DatabaseHandler(BENCHMARK_DB_PATH)
+# Bump when the create_sample prompt changes, so samples generated by older prompts are not reused
+SAMPLE_PROMPT_VERSION = 3
+
+# Printed by the benchmark interpreter to describe itself; numpy is optional
+ENVIRONMENT_PROBE = """
+import json, platform, sys
+info = {'python': sys.version, 'executable': sys.executable, 'machine': platform.machine()}
+try:
+    import contextlib, io, numpy
+    info['numpy'] = numpy.__version__
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        numpy.show_config()
+    info['numpy_config'] = buffer.getvalue()
+except ImportError:
+    info['numpy'] = None
+print(json.dumps(info, sort_keys=True))
+"""
+
 def estimate_complexity(code: str) -> str:
     """Estimate time and space complexity of a given code snippet."""
     prompt = f"""Analyze the following Python Function:
@@ -50,6 +133,11 @@ def create_sample(code: str) -> str:
             4. Defines sample inputs
             5. Calls the functions needed with those inputs
             6. Prints those results clearly
+            7. Wraps only the call(s) to the function(s) being measured in a zero-argument function named {TARGET_NAME}
+               that returns their results. Define it after the inputs are created, so that input creation is not part of it,
+               and do not print inside it. Call {TARGET_NAME}() once at the end and print what it returns.
+            8. Sizes every input by SAMPLE_SCALE, a float in (0, 1] that is already defined when the script runs
+               (1.0 is the full-size input), e.g. n = max(1, int(100000 * SAMPLE_SCALE)). Do not define SAMPLE_SCALE.
         - Format the input as a **runnable Python script** (fully executable if appended to the function).
         - Output only the generated code, **without any additional text**.
         Ensure that when this code is appended to any function it does not cause indentation errors
@@ -58,49 +146,79 @@ def create_sample(code: str) -> str:
     response = llm.invoke(prompt)
     return response.content.strip()
 
-def get_metrics(temp_file_path: str) -> tuple:
-    """Execute the code and collect performance metrics."""
-    process = None
+def partition_cores(cores_per_slot: int = CORES_PER_SLOT) -> List[Set[int]]:
+    """Split the CPU cores available to this process into disjoint core sets, one per worker slot."""
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    cores_per_slot = max(1, cores_per_slot)
+    slots = [set(available[i:i + cores_per_slot]) for i in range(0, len(available), cores_per_slot)]
+    # Drop a trailing partial slot so every slot gets the same amount of compute
+    if len(slots) > 1 and len(slots[-1]) < cores_per_slot:
+        slots.pop()
+    return slots
+
+def extract_timing(stdout: str) -> tuple:
+    """Split the timing harness summary line from the candidate's own output."""
+    timing = None
+    output_lines = []
+    for line in stdout.splitlines():
+        if line.startswith(TIMING_MARKER):
+            timing = json.loads(line[len(TIMING_MARKER):])
+        else:
+            output_lines.append(line)
+    return "\n".join(output_lines), timing
+
+def get_metrics(temp_file_path: str, cpu_cores: Optional[Set[int]] = None, timing_config: Optional[Dict] = None,
+                limits: Optional[Dict] = None) -> tuple:
+    """Execute the code in the sandbox and collect performance metrics.
+
+    If cpu_cores is given, the child process is pinned to those cores; limits overrides SANDBOX_LIMITS. Returns
+    (output, execution_time, peak_memory, resource_usage, timing, limit_exceeded) where peak_memory is the child's
+    peak RSS in bytes and resource_usage holds the RESOURCE_FIELDS of the child. timing is the harness
+    summary of benchmark_target (median, min, IQR, CI) and execution_time is its median; if the sample
+    defined no benchmark_target, timing is None and execution_time falls back to the wall-clock run time.
+    With a timing summary, the CPU, context switch and page fault counters are those of one
+    benchmark_target call, averaged by the harness; otherwise they cover the whole run.
+    limit_exceeded is None, or "wall", "cpu", "memory" or "call" when the run was stopped.
+    """
     output = ""
     execution_time = 0.0
     peak_memory = 0.0
+    resource_usage = {}
+    timing = None
+    limit_exceeded = None
+    timing_config = timing_config or TIMING_CONFIG
 
-    try: 
-        tracemalloc.start()
-
-        start_time = time.time()
-
-        process = subprocess.Popen(
-                ['python', temp_file_path], 
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-        stdout, stderr = process.communicate()
-        execution_time = time.time() - start_time
+    try:
+        run = run_sandboxed(['python', TIMING_HARNESS_PATH, temp_file_path, json.dumps(timing_config)],
+                            dict(SANDBOX_LIMITS, **(limits or {})), cpu_cores)
+        resource_usage = run['resource_usage']
+        peak_memory = run['peak_rss']
+        execution_time = run['wall_time']
+        limit_exceeded = run['limit_exceeded']
 
-        _, peak_memory = tracemalloc.get_traced_memory()
-        tracemalloc.stop()
+        stdout, timing = extract_timing(run['stdout'])
+        if timing and timing.get('timed_out'):
+            limit_exceeded = limit_exceeded or "call"
+            timing = None
+        elif timing:
+            execution_time = timing['median']
+            # The child ran the target as often as the harness chose, so only per-call counters compare across versions
+            resource_usage = dict(resource_usage, **timing.get('per_call_usage', {}))
 
-        if process.returncode == 0:
+        if limit_exceeded:
+            output = LIMIT_MESSAGES[limit_exceeded]
+        elif run['returncode'] == 0:
             output = stdout.strip()
         else:
-            output = f"Error:\n{stderr.strip()}"
-    
+            output = f"Error:\n{run['stderr'].strip()}"
+
     except Exception as e:
         output = f"Exception occurred: {str(e)}"
 
     finally:
-        # Kill process if needed
-        if process:
-            try:
-                process.stdout.close()
-                process.stderr.close()
-                if process.poll() is None:
-                    process.kill()
-            except:
-                pass
-        
         # Clear space of tempFile
         if temp_file_path and os.path.exists(temp_file_path):
             try:
@@ -118,42 +236,389 @@ def get_metrics(temp_file_path: str) -> tuple:
     if len(output) > MAX_CHARACTERS:
         output = output[:MAX_CHARACTERS] + "...\n"
 
-    return output, execution_time, peak_memory
+    return output, execution_time, peak_memory, resource_usage, timing, limit_exceeded
 
-def generate_report(code_output: str, execution_time: float, peak_memory: float, complexity_analysis: str) -> Dict:
-    """Generate a comprehensive report for the code execution."""
-    return {
-        'output': code_output,
-        'execution_time': execution_time,
-        'memory_usage': peak_memory // 1024,
-        'complexity_analysis': complexity_analysis
-    }
+def cutoff_for(baseline: Optional[Dict]) -> tuple:
+    """(limits, timing_config) that stop a candidate once it runs CUTOFF_FACTOR times longer than the baseline report."""
+    limits = dict(SANDBOX_LIMITS)
+    timing_config = dict(TIMING_CONFIG)
+    if not baseline or baseline.get('limit_exceeded'):
+        return limits, timing_config
+    if baseline.get('wall_time'):
+        limits['wall_seconds'] = min(limits['wall_seconds'],
+                                     max(MIN_CUTOFF_SECONDS, CUTOFF_FACTOR * baseline['wall_time']))
+    if baseline.get('timing'):
+        timing_config['call_timeout'] = max(MIN_CALL_TIMEOUT, CUTOFF_FACTOR * baseline['timing']['median'])
+    return limits, timing_config
 
-def test_code(code: List[str]) -> List[Dict]:
-    """Main function to test multiple code snippets."""
-    reports = []
+def normalize_code(code: str) -> str:
+    """Normalize code so formatting and comment-only edits map to the same benchmark key."""
+    try:
+        return ast.unparse(ast.parse(code))
+    except (SyntaxError, ValueError):
+        return "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
 
-    # Generate a single sample input for the first code snippet
-    sample_input = create_sample(code[0])
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
 
-    for i, c in enumerate(code):
-        # Estimate complexity for each code snippet
-        complexity_analysis = estimate_complexity(c)
+@lru_cache(maxsize=1)
+def environment_fingerprint() -> str:
+    """Describe the interpreter that runs the benchmarks: Python version plus the numpy/BLAS build."""
+    try:
+        probe = subprocess.run(['python', '-c', ENVIRONMENT_PROBE], capture_output=True, text=True, timeout=60)
+        return probe.stdout.strip() or probe.stderr.strip()
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return f"unknown: {e}"
 
-        # Combine code with sample input
-        full_code = f"{c}\n\n{sample_input}"
+def sample_key_for(code: str) -> str:
+    return hash_text(f"{SAMPLE_PROMPT_VERSION}\n{normalize_code(code)}")
 
-        # Create a temporary file with the full code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-            temp_file.write(full_code)
-            temp_file_path = temp_file.name 
+def measurement_setup(mode: str, core_slots: List[Set[int]]) -> str:
+    """What besides code, sample and interpreter decides a report: the mode, the timing config and the core layout.
 
-        # Get metrics for the code
-        code_output, execution_time, peak_memory = get_metrics(temp_file_path)
-        
-        # Generate report
-        report = generate_report(code_output, execution_time, peak_memory, complexity_analysis)
-        
-        reports.append(report)
+    Reports from before the resource counters were taken per call carry no 'usage' entry and are not reused.
+    """
+    return json.dumps({'mode': mode, 'timing': TIMING_CONFIG, 'cores_per_slot': CORES_PER_SLOT,
+                       'slots': len(core_slots), 'usage': "per_call"}, sort_keys=True, default=str)
+
+def benchmark_key(code: str, sample_input: str, measurement: str = "") -> tuple:
+    """(key, code_hash, sample_hash) under which reports and profiles of code on sample_input are stored.
+
+    measurement (see measurement_setup) separates reports taken under different measurement setups.
+    """
+    code_hash = hash_text(normalize_code(code))
+    sample_hash = hash_text(sample_input)
+    return hash_text(f"{code_hash}\n{sample_hash}\n{environment_fingerprint()}\n{measurement}"), code_hash, sample_hash
+
+def get_sample_input(code: str) -> str:
+    """Return the stored sample input for this code, generating and storing one on a miss."""
+    sample_key = sample_key_for(code)
+    sample_input = result_store.get_sample(sample_key)
+    if sample_input is None:
+        sample_input = create_sample(code)
+        result_store.save_sample(sample_key, sample_input)
+    return sample_input
+
+def invalidate_code(code: str, include_sample: bool = False) -> None:
+    """Forget the memoized reports and profiles of code and, with include_sample, the sample input generated for it."""
+    result_store.invalidate_benchmarks(hash_text(normalize_code(code)), sample_key_for(code) if include_sample else None)
+
+def write_temp_code(full_code: str) -> str:
+    """Write code to a temporary file and return its path."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
+        temp_file.write(full_code)
+        return temp_file.name
+
+def candidate_source(code: str, sample_input: str, scale: float = 1.0) -> str:
+    """The code followed by its sample input, with the input sized by SAMPLE_SCALE."""
+    return f"{code}\n\nSAMPLE_SCALE = {scale}\n{sample_input}"
+
+def measure_version(i: int, temp_file_path: str, cores: Set[int], baseline: Optional[Dict],
+                    timing_overrides: Optional[Dict] = None) -> tuple:
+    """Run version i with get_metrics; versions after the original are cut off relative to the baseline report."""
+    limits, timing_config = cutoff_for(baseline if i > 0 else None)
+    timing_config.update(timing_overrides or {})
+    metrics = get_metrics(temp_file_path, cores, timing_config, limits)
+    if i > 0 and baseline and metrics[5] in ("wall", "cpu", "call"):
+        metrics = (f"Timed out at >{CUTOFF_FACTOR}x slower than the original",) + metrics[1:]
+    return metrics
+
+def measure_scaling(code: str, sample_input: str, full_size: tuple, cores: Set[int],
+                    baseline: Optional[Dict] = None) -> Optional[Dict]:
+    """Run the code at COMPLEXITY_SWEEP_SCALES and fit its time and peak allocation against the input scale.
+
+    full_size is the get_metrics result of the full-size run, which supplies the point at scale 1. The sweep
+    runs are stopped with the cutoff_for(baseline) limits. Returns scaling.summarize_scaling's dict, or None
+    when a run fails or has no timing summary.
+    """
+    scales, times, memory = [], [], []
+    limits, timing_config = cutoff_for(baseline)
+    sweep_config = dict(timing_config, **COMPLEXITY_SWEEP_TIMING)
+    for scale in COMPLEXITY_SWEEP_SCALES:
+        metrics = get_metrics(write_temp_code(candidate_source(code, sample_input, scale)), cores, sweep_config, limits)
+        if metrics[5] or not metrics[4]:
+            return None
+        scales.append(scale)
+        times.append(metrics[4]['median'])
+        memory.append(metrics[4].get('peak_traced_bytes'))
+    scales.append(1.0)
+    times.append(full_size[4]['median'])
+    memory.append(full_size[4].get('peak_traced_bytes'))
+    return summarize_scaling(scales, times, memory)
+
+def analyze_complexity(code: str, sample_input: str, metrics: tuple, cores: Set[int],
+                       baseline: Optional[Dict] = None) -> str:
+    """complexity_analysis JSON of a measured version, from the source selected by COMPLEXITY_SOURCE.
+
+    baseline is the report whose cutoff bounds the input-size sweep, see measure_scaling.
+    """
+    if COMPLEXITY_SOURCE == "measured":
+        scaling = (measure_scaling(code, sample_input, metrics, cores, baseline)
+                   if metrics[4] and not metrics[5] else None)
+        if scaling and (is_reliable(scaling['time_fit'], MIN_R_SQUARED) or not COMPLEXITY_LLM_FALLBACK):
+            return json.dumps(scaling)
+        if not COMPLEXITY_LLM_FALLBACK:
+            return json.dumps({'time_complexity': "N/A", 'space_complexity': "N/A",
+                               'justification': "The input-size sweep did not produce a usable fit"})
+    return estimate_complexity(code)
+
+def report_from_metrics(metrics: tuple, complexity_analysis: str) -> Dict:
+    code_output, execution_time, peak_memory, resource_usage, timing, limit_exceeded = metrics
+    return generate_report(code_output, execution_time, peak_memory, complexity_analysis,
+                           resource_usage, timing, limit_exceeded)
+
+def profile_version(code: str, sample_input: str, cores: Optional[Set[int]] = None) -> Optional[str]:
+    """Profile the code on its full-size sample and store the profile; returns its key, or None if profiling failed.
+
+    Profiles are stored under the benchmark key, so unchanged code on the same sample is profiled once.
+    """
+    key, code_hash, _ = benchmark_key(code, sample_input)
+    if result_store.get_profile(key) is not None:
+        return key
+
+    temp_file_path = write_temp_code(candidate_source(code, sample_input))
+    with tempfile.TemporaryDirectory() as artifacts:
+        config = dict(PROFILE_CONFIG, pstats_path=os.path.join(artifacts, "profile.pstats"),
+                      folded_path=os.path.join(artifacts, "stacks.folded"))
+        try:
+            run = run_sandboxed(['python', PROFILE_HARNESS_PATH, temp_file_path, json.dumps(config)],
+                                SANDBOX_LIMITS, cores)
+        finally:
+            os.remove(temp_file_path)
+        summary = None
+        for line in run['stdout'].splitlines():
+            if line.startswith(PROFILE_MARKER):
+                summary = json.loads(line[len(PROFILE_MARKER):])
+        if run['returncode'] != 0 or summary is None:
+            print(f"Profiling failed: {run['limit_exceeded'] or run['stderr'].strip()[-500:] or 'no benchmark_target'}")
+            return None
+
+        pstats_data = folded = None
+        if os.path.exists(config['pstats_path']):
+            with open(config['pstats_path'], 'rb') as pstats_file:
+                pstats_data = pstats_file.read()
+        if os.path.exists(config['folded_path']):
+            with open(config['folded_path']) as folded_file:
+                folded = folded_file.read()
+
+    result_store.save_profile(key, code_hash, summary, pstats_data, folded)
+    return key
+
+def load_profile(key: str) -> Optional[Dict]:
+    """Stored profile as a dict with summary, pstats (bytes) and folded (collapsed stacks text)."""
+    return result_store.get_profile(key)
+
+def profile_code(code: str) -> Optional[Dict]:
+    """Profile summary of code on its sample input, generating the sample if needed."""
+    key = profile_version(code, get_sample_input(code), partition_cores()[0])
+    return load_profile(key)['summary'] if key else None
+
+def format_hotspots(summary: Dict, top: int = 5) -> str:
+    """Plain-text list of the top functions, lines and allocation sites of a profile summary, for LLM prompts."""
+    lines = ["Functions by self time (cProfile, one call):"]
+    total_self_time = summary['total_self_time'] or 1.0
+    for function in summary['functions'][:top]:
+        lines.append(f"  {function['self_time'] / total_self_time:6.1%}  {function['function']} ({function['calls']} calls)")
+    if summary['lines']:
+        lines.append(f"Source lines by sampled CPU time ({summary['samples']} samples):")
+        for line in summary['lines'][:top]:
+            lines.append(f"  {line['fraction']:6.1%}  {line['location']} in {line['function']}: {line['source']}")
+    # Sites holding less than a kilobyte are noise for the prompt
+    allocations = [site for site in summary['allocations'] if site['size'] >= 1024]
+    if allocations:
+        lines.append(f"Allocation sites by memory held when the call returns (peak {summary['peak_traced_bytes'] / 1024:.0f} KB):")
+        for site in allocations[:top]:
+            lines.append(f"  {site['size'] / 1024:8.0f} KB  {site['location']}: {site['source']}")
+    return "\n".join(lines)
+
+def flame_summary(summary: Dict, min_fraction: float = 0.02, max_depth: int = 8) -> str:
+    """Call tree of the sampled stacks with a bar per frame, a flame graph turned on its side.
+
+    Frames below min_fraction of the samples are left out.
+    """
+    total = summary['samples']
+    if not total:
+        return "No samples were taken; the target ran for less than one sampling interval."
+    tree = {}
+    for stack, count in summary['stacks']:
+        node = tree
+        for frame in stack.split(";")[:max_depth]:
+            entry = node.setdefault(frame, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    lines = []
+    def walk(node: Dict, depth: int):
+        for frame, (count, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+            fraction = count / total
+            if fraction < min_fraction:
+                continue
+            lines.append(f"{'█' * max(1, round(fraction * 20)):<20} {fraction:6.1%}  {'  ' * depth}{frame}")
+            walk(children, depth + 1)
+    walk(tree, 0)
+    return "\n".join(lines)
+
+def measure_and_analyze(i: int, code: str, sample_input: str, cores: Set[int], baseline: Optional[Dict]) -> Dict:
+    """Report of version i at full size, with its complexity analysed and its profile taken on the same cores.
+
+    The input-size sweep of a candidate is cut off relative to the baseline report, the sweep of the original
+    relative to its own full-size run.
+    """
+    metrics = measure_version(i, write_temp_code(candidate_source(code, sample_input)), cores, baseline)
+    sweep_baseline = baseline if i > 0 else report_from_metrics(metrics, "{}")
+    report = report_from_metrics(metrics, analyze_complexity(code, sample_input, metrics, cores, sweep_baseline))
+    if PROFILE_VERSIONS and metrics[4] and not metrics[5]:
+        report['profile_key'] = profile_version(code, sample_input, cores)
+    return report
+
+def measure_full_size(code: List[str], sample_input: str, pending: List[int], save_report: Callable,
+                      reports: List[Optional[Dict]], core_slots: List[Set[int]]) -> None:
+    """Measure the pending versions in parallel; the original sets the cutoff for the others, so it goes first."""
+    if 0 in pending:
+        save_report(0, measure_and_analyze(0, code[0], sample_input, core_slots[0], None))
+    results = run_on_slots(core_slots, {
+        i: (lambda cores, i=i: measure_and_analyze(i, code[i], sample_input, cores, reports[0]))
+        for i in pending if i > 0
+    })
+    for i, report in results.items():
+        save_report(i, report)
+
+def run_on_slots(core_slots: List[Set[int]], jobs: Dict[int, Callable[[Set[int]], object]]) -> Dict[int, object]:
+    """Run jobs in parallel; each worker slot owns one core set and picks up the next job once its run finishes."""
+    free_slots = list(core_slots)
+    with ThreadPoolExecutor(max_workers=len(core_slots)) as run_pool:
+        def run_on_free_slot(job: Callable[[Set[int]], object]) -> object:
+            cores = free_slots.pop()
+            try:
+                return job(cores)
+            finally:
+                free_slots.append(cores)
+
+        futures = {i: run_pool.submit(run_on_free_slot, job) for i, job in jobs.items()}
+        return {i: future.result() for i, future in futures.items()}
+
+def run_tournament(code: List[str], sample_input: str, reports: List[Optional[Dict]], save_report: Callable,
+                   core_slots: List[Set[int]]) -> List[Dict]:
+    """Successive halving over TOURNAMENT_SCALES; fills reports and returns it.
+
+    Every round measures the original first, then the other contenders in parallel with the usual cutoff.
+    Versions that fail or are stopped are eliminated, and of the rest only the fastest TOURNAMENT_KEEP
+    fraction advances. Finalists are measured on the full-size sample and memoized as usual. Eliminated
+    versions get a report with eliminated_in set to the round they lost and no measurements, since that
+    round ran on a reduced input; their round times are in the output text and the 'tournament' entry.
+    Each report carries a 'tournament' entry with the per-round rank of that version and the round it was
+    eliminated in (None for finalists).
+    """
+    start = time.perf_counter()
+    rounds = {i: [] for i in range(len(code))}
+    eliminated = {}
+    # Versions with a memoized full-size report skip the elimination rounds
+    alive = [i for i in range(len(code)) if i == 0 or reports[i] is None]
+
+    for round_number, scale in enumerate(TOURNAMENT_SCALES[:-1], start=1):
+        contenders = [i for i in alive if i > 0]
+        if len(contenders) < 2 or time.perf_counter() - start > TOURNAMENT_BUDGET_SECONDS:
+            break
+
+        temp_file_paths = {i: write_temp_code(candidate_source(code[i], sample_input, scale)) for i in alive}
+        baseline_metrics = measure_version(0, temp_file_paths[0], core_slots[0], None, TOURNAMENT_ROUND_TIMING)
+        baseline = report_from_metrics(baseline_metrics, "{}")
+        results = run_on_slots(core_slots, {
+            i: (lambda cores, i=i: measure_version(i, temp_file_paths[i], cores, baseline, TOURNAMENT_ROUND_TIMING))
+            for i in contenders
+        })
+
+        failed = [i for i in contenders if results[i][5] or is_failure(results[i][0])]
+        ranked = sorted((i for i in contenders if i not in failed), key=lambda i: results[i][1])
+        survivors = ranked[:max(1, math.ceil(len(contenders) * TOURNAMENT_KEEP))]
+        fastest = results[ranked[0]][1] if ranked else None
+
+        for rank, i in enumerate(ranked + failed, start=1):
+            rounds[i].append({'round': round_number, 'scale': scale, 'execution_time': results[i][1],
+                              'rank': rank, 'of': len(contenders), 'advanced': i in survivors})
+            if i in survivors:
+                continue
+            code_output, execution_time = results[i][:2]
+            if i in ranked:
+                code_output = (f"Eliminated in round {round_number} at input scale {scale:g}: ranked {rank}/{len(contenders)}, "
+                               f"{execution_time:.3g}s vs fastest {fastest:.3g}s (original {baseline_metrics[1]:.3g}s)")
+            else:
+                code_output = f"Eliminated in round {round_number} at input scale {scale:g}: {code_output}"
+            eliminated[i] = round_number
+            report = report_from_metrics((code_output,) + results[i][1:], "{}")
+            # Reduced-scale measurements must not be compared with full-size ones
+            report.update(dict.fromkeys(['execution_time', 'memory_usage', 'timing'] + RESOURCE_FIELDS),
+                          eliminated_in=round_number)
+            reports[i] = report
+        alive = [0] + survivors
+
+    # Full-size round: complexity is only analysed for the finalists
+    measure_full_size(code, sample_input, [i for i in alive if reports[i] is None], save_report, reports, core_slots)
+
+    for i, report in enumerate(reports):
+        report['tournament'] = {'rounds': rounds[i], 'eliminated_in': eliminated.get(i)}
+    return reports
+
+def test_code(code: List[str], mode: str = "quiet", force_remeasure: bool = False) -> List[Dict]:
+    """Main function to test multiple code snippets.
+
+    mode selects one of MEASUREMENT_MODES: "fast" benchmarks versions in parallel on disjoint
+    core sets, "quiet" benchmarks them serially on a single pinned core set and "tournament"
+    eliminates slow versions on smaller inputs first (see run_tournament).
+
+    Reports are memoized by normalized code, sample input, environment fingerprint and measurement setup
+    (mode, timing config and core layout), so unchanged versions are not measured again under the same
+    setup. Failed and stopped runs are not memoized. force_remeasure first drops the memoized reports and
+    profiles of every version (see invalidate_code), so all of them are measured and profiled again.
+
+    Every run is sandboxed (see SANDBOX_LIMITS). The original (code[0]) is measured first, and any other
+    version that runs CUTOFF_FACTOR times longer than it is stopped and reported as timed out.
+    """
+    if mode not in MEASUREMENT_MODES:
+        raise ValueError(f"Unknown measurement mode '{mode}', expected one of {MEASUREMENT_MODES}")
+
+    if force_remeasure:
+        for c in code:
+            invalidate_code(c)
+
+    core_slots = partition_cores()
+    environment = environment_fingerprint()
+
+    def lookup_reports(sample_input: str) -> tuple:
+        measurement = measurement_setup(mode, core_slots)
+        keys, code_hashes, sample_hashes = zip(*(benchmark_key(c, sample_input, measurement) for c in code))
+        sample_hash = sample_hashes[0]
+        reports = [result_store.get_benchmark(key) for key in keys]
+
+        def save_report(i: int, report: Dict):
+            # A stopped run depends on the limits it ran under and a failed one may be flaky, so both are
+            # reported but not memoized
+            if not report.get('limit_exceeded') and not is_failure(report.get('output', "")):
+                result_store.save_benchmark(keys[i], code_hashes[i], sample_hash, environment, report)
+            reports[i] = report
+
+        return reports, save_report
+
+    if mode == "quiet":
+        # Generate a single sample input for the first code snippet
+        sample_input = get_sample_input(code[0])
+        reports, save_report = lookup_reports(sample_input)
+        for i, c in enumerate(code):
+            if reports[i] is not None:
+                continue
+
+            # Combine code with sample input and run it pinned to the same cores every time
+            save_report(i, measure_and_analyze(i, c, sample_input, core_slots[0], reports[0]))
+        return reports
+
+    if mode == "tournament":
+        sample_input = get_sample_input(code[0])
+        reports, save_report = lookup_reports(sample_input)
+        return run_tournament(code, sample_input, reports, save_report, core_slots)
 
-    return reports
\ No newline at end of file
+    # Fast mode: versions are benchmarked in parallel, each followed by its complexity sweep on the same cores
+    sample_input = get_sample_input(code[0])
+    reports, save_report = lookup_reports(sample_input)
+    measure_full_size(code, sample_input, [i for i, report in enumerate(reports) if report is None],
+                      save_report, reports, core_slots)
+    return reports
@@ -0,0 +1,201 @@
+"""In-process timing harness for benchmarked code.
+
+get_metrics runs this file as the child process instead of the candidate itself:
+
+    python timing_harness.py <candidate.py> '<json config>'
+
+The candidate (code + sample input) is executed once as __main__, exactly as before, so its
+printed output is unchanged. If the sample defined a zero-argument benchmark_target function,
+only that call is then timed with perf_counter_ns: a few warmup calls followed by repeated
+measurements until the confidence interval of the median is narrow enough. A call that runs
+longer than call_timeout aborts the run. One more call is traced to report its peak allocation.
+The rusage counters of the measured calls are averaged into per_call_usage, so they describe one
+call no matter how many iterations the harness chose.
+The summary is printed on a single line prefixed with TIMING_MARKER, which get_metrics strips
+from the output.
+"""
+import contextlib
+import json
+import math
+import os
+import runpy
+import signal
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TIMING_MARKER = "__MARCO_TIMING__ "
+TARGET_NAME = "benchmark_target"
+
+DEFAULT_CONFIG = {
+    'warmup': 3,             # untimed calls before measuring
+    'precision': 0.02,       # stop once the 95% CI half-width is within 2% of the median
+    'min_iterations': 7,
+    'max_iterations': 1000,
+    'max_seconds': 10.0,     # time budget for the measured calls
+    'call_timeout': None,    # abort the run when a single call takes longer than this many seconds
+    'trace_memory': True     # after timing, make one call under tracemalloc and report its peak allocation
+}
+
+# Resource usage fields reported per call, and the rusage attribute each one is read from
+USAGE_FIELDS = {
+    'cpu_user_time': 'ru_utime',
+    'cpu_system_time': 'ru_stime',
+    'voluntary_context_switches': 'ru_nvcsw',
+    'involuntary_context_switches': 'ru_nivcsw',
+    'major_page_faults': 'ru_majflt',
+    'minor_page_faults': 'ru_minflt'
+}
+
+# Exit status of the harness when a call exceeded call_timeout
+TIMEOUT_EXIT_CODE = 3
+
+class CallTimeout(Exception):
+    pass
+
+# z value for a two-sided 95% confidence interval
+Z_95 = 1.96
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Linearly interpolated percentile of an already sorted list."""
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize_samples(samples_ns: List[int]) -> Dict:
+    """Summarize timing samples (in nanoseconds) as median, min, IQR and a 95% CI of the median, in seconds.
+
+    The confidence interval is distribution-free: it uses the order statistics
+    n/2 -/+ 1.96 * sqrt(n) / 2 of the sorted samples.
+    """
+    values = sorted(sample / 1e9 for sample in samples_ns)
+    n = len(values)
+    half_width = Z_95 * math.sqrt(n) / 2
+    lower_rank = max(0, math.floor(n / 2 - half_width))
+    upper_rank = min(n - 1, math.ceil(n / 2 + half_width) - 1)
+    q1 = _percentile(values, 0.25)
+    q3 = _percentile(values, 0.75)
+    return {
+        'iterations': n,
+        'median': _percentile(values, 0.5),
+        'min': values[0],
+        'iqr': q3 - q1,
+        'ci_low': values[lower_rank],
+        'ci_high': values[upper_rank]
+    }
+
+def precision_reached(summary: Dict, precision: float) -> bool:
+    """True when the CI half-width relative to the median is within precision."""
+    if summary['median'] <= 0:
+        return True
+    return (summary['ci_high'] - summary['ci_low']) / 2 / summary['median'] <= precision
+
+def is_significant_difference(baseline: Optional[Dict], candidate: Optional[Dict]) -> bool:
+    """True when two timing summaries have non-overlapping confidence intervals of the median."""
+    if not baseline or not candidate:
+        return False
+    return candidate['ci_high'] < baseline['ci_low'] or candidate['ci_low'] > baseline['ci_high']
+
+def _on_call_timeout(signum, frame):
+    raise CallTimeout()
+
+def _usage() -> Dict[str, float]:
+    """USAGE_FIELDS of this process plus the subprocesses it has reaped"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {field: getattr(own, name) + getattr(children, name) for field, name in USAGE_FIELDS.items()}
+
+def time_target(target, config: Dict) -> Dict:
+    """Call target repeatedly and return its timing summary.
+
+    With call_timeout set, every call runs under an interval timer and CallTimeout is raised
+    as soon as one call exceeds it. Where the resource module exists, the summary also holds
+    per_call_usage: the USAGE_FIELDS of the measured calls divided by their number.
+    """
+    call_timeout = config.get('call_timeout')
+    if call_timeout:
+        signal.signal(signal.SIGALRM, _on_call_timeout)
+    usage_totals = dict.fromkeys(USAGE_FIELDS, 0)
+
+    def call(record_usage: bool = True) -> int:
+        """Run target once and return its duration in nanoseconds, excluding the timer and rusage syscalls"""
+        if call_timeout:
+            signal.setitimer(signal.ITIMER_REAL, call_timeout)
+        try:
+            before = _usage() if record_usage and resource is not None else None
+            start = time.perf_counter_ns()
+            target()
+            elapsed = time.perf_counter_ns() - start
+            if before is not None:
+                for field, value in _usage().items():
+                    usage_totals[field] += value - before[field]
+            return elapsed
+        finally:
+            if call_timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(config['warmup']):
+            call(record_usage=False)
+
+        samples = []
+        deadline = time.perf_counter() + config['max_seconds']
+        while True:
+            samples.append(call())
+
+            if len(samples) >= config['max_iterations'] or time.perf_counter() > deadline:
+                break
+            if len(samples) >= config['min_iterations'] and precision_reached(summarize_samples(samples), config['precision']):
+                break
+
+    summary = summarize_samples(samples)
+    if resource is not None:
+        summary['per_call_usage'] = {field: total / len(samples) for field, total in usage_totals.items()}
+    return summary
+
+def traced_peak(target) -> int:
+    """Peak bytes allocated during one call of target, as seen by tracemalloc.
+
+    Only allocations made during the call count, and numpy reports its array buffers to tracemalloc,
+    so unlike peak RSS this excludes the interpreter and imported modules.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        tracemalloc.start()
+        try:
+            target()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+def main(argv: List[str]) -> None:
+    candidate_path = argv[1]
+    config = dict(DEFAULT_CONFIG)
+    if len(argv) > 2:
+        config.update(json.loads(argv[2]))
+
+    # Make the candidate look like it was started directly
+    sys.argv = [candidate_path]
+    sys.path[0] = os.path.dirname(os.path.abspath(candidate_path))
+    namespace = runpy.run_path(candidate_path, run_name="__main__")
+
+    target = namespace.get(TARGET_NAME)
+    if callable(target):
+        try:
+            summary = time_target(target, config)
+        except CallTimeout:
+            print(TIMING_MARKER + json.dumps({'timed_out': True, 'call_timeout': config['call_timeout']}), flush=True)
+            sys.exit(TIMEOUT_EXIT_CODE)
+        if config['trace_memory']:
+            summary['peak_traced_bytes'] = traced_peak(target)
+        sys.stdout.flush()
+        print(TIMING_MARKER + json.dumps(summary), flush=True)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,34 +1,49 @@
-from OptimizerAgent.agent_functions import cached_get_optimization_techniques, cached_improve_code
-from OptimizerAgent.testing_agent import test_code
+import os
+import sys
+
+# The OptimizerAgent modules import each other by module name, as when the Streamlit app is started from that folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "OptimizerAgent"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "svd"))
+
+from agent_functions import cached_get_optimization_techniques, cached_improve_code
+from testing_agent import test_code, profile_code, format_hotspots
 import numpy as np
+from svd_engine import svd
+from dataset_store import DatasetStore
 
 def svd_example(matrix):
-    """Perform SVD using NumPy's LAPACK interface."""
-    u, s, vh = np.linalg.svd(matrix, full_matrices=False)
+    """Perform a thin SVD through the engine, which picks the fastest LAPACK driver for the shape."""
+    u, s, vh = svd(matrix, want="thin")
     return u, s, vh
 
-# Example matrix
-matrix = np.random.rand(100, 100)
+# Example matrix from the test corpus (see svd/dataset_store.py). open() checks the file against its manifest
+# entry; the benchmarked code then memory-maps the same file
+dataset = DatasetStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test", "svd_dataset"))
+dataset.open("random_matrix")
 
 # Convert the SVD function to a string of code
-svd_code = """
+svd_code = f"""
 import numpy as np
 
 def svd_example(matrix):
     u, s, vh = np.linalg.svd(matrix, full_matrices=False)
     return u, s, vh
 
-matrix = np.random.rand(100, 100)
+matrix = np.load({dataset.path("random_matrix")!r}, mmap_mode="r")
 svd_example(matrix)
 """
 
+# Profile the original so the techniques target its measured hotspots
+baseline_profile = profile_code(svd_code)
+hotspots = format_hotspots(baseline_profile) if baseline_profile else None
+
 # Generate optimization techniques
-optimization_techniques = cached_get_optimization_techniques(svd_code, 3)
+optimization_techniques = cached_get_optimization_techniques(svd_code, 3, hotspots)
 
 # Apply optimization techniques
 optimized_versions = [svd_code]
 for technique in optimization_techniques:
-    improved_code = cached_improve_code(svd_code, [technique])
+    improved_code = cached_improve_code(svd_code, [technique], hotspots)
     if improved_code:
         optimized_versions.append(improved_code)
 
@@ -37,4 +52,6 @@ test_results = test_code(optimized_versions)
 
 # Display results
 for i, result in enumerate(test_results):
-    print(f"Version {i}: Execution Time = {result['execution_time']}, Memory Usage = {result['memory_usage']}")
\ No newline at end of file
+    print(f"Version {i}: Execution Time = {result['execution_time']}, Peak RSS (KB) = {result['memory_usage']}, "
+          f"CPU User/Sys = {result['cpu_user_time']:.3f}/{result['cpu_system_time']:.3f}, "
+          f"Page Faults (major/minor) = {result['major_page_faults']}/{result['minor_page_faults']}")
\ No newline at end of file
@@ -0,0 +1,349 @@
+"""Regression benchmarks for the SVD paths and the test_code pipeline, run with one command:
+
+    python benchmark_suite.py                   # run, store, compare with this machine's baseline
+    python benchmark_suite.py --save-baseline   # run and make this run the baseline
+    python benchmark_suite.py --only batched engine
+    python benchmark_suite.py --machine ci-large  # keep this runner's baselines apart
+
+Every benchmark is timed REPEATS times after a warmup. Each sample loops the benchmark until it took
+at least MIN_SAMPLE_SECONDS, and the median and the noise (1.4826 * median absolute deviation,
+relative to the median) are stored in BENCHMARK_DB with a fingerprint of the environment. Machines
+also drift between runs (frequency scaling, neighbours on shared hosts), so once a few earlier
+baselines are stored, the spread of their medians counts as noise too. Baselines in which a
+benchmark had regressed are left out of its spread.
+
+Baselines are looked up by machine (hardware and core count, plus the --machine label), not by
+software or host name, so CI runners and rebuilt containers of the same kind share them. A numpy,
+scipy or BLAS upgrade is then compared against the numbers from before it, and the report lists
+what changed. A benchmark regresses when its median grew by more than max(MIN_REGRESSION,
+NOISE_FACTOR * combined noise) of the baseline. The exit status is 1 if any benchmark regressed.
+
+Covered:
+  - svd_engine.svd (values, thin, full) on the test/svd_dataset matrices, memory-mapped
+  - randomized_svd and adaptive_svd on the same matrices
+  - BatchedSVD and ParallelSVD on svd/datasets/svd_dataset_1000.csv with seed-addressed matrices
+  - an IncrementalSVD rank-1 update of a 1000 x 1000 rank-10 factorization
+  - test_code in quiet mode on two versions of the SVD example, with a stubbed LLM and a fresh result
+    store per sample, so sampling, sandboxed timing, the complexity sweep and profiling all run
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "OptimizerAgent"))
+sys.path.insert(0, os.path.join(ROOT, "svd"))
+
+import numpy as np
+
+from batched_svd import BatchedSVD
+from dataset_store import DatasetStore
+from datasetgen import Corpus
+from incremental_svd import IncrementalSVD
+from parallel_svd import ParallelSVD
+from svd_engine import SVDEngine, host_fingerprint
+from truncated_svd import randomized_svd, adaptive_svd
+
+BENCHMARK_DB = os.environ.get("MARCO_BENCHMARK_DB", os.path.join(ROOT, "benchmarks.db"))
+REPEATS = 7
+MIN_SAMPLE_SECONDS = 0.05
+# Slowdowns below this fraction are never reported, however quiet the measurements were
+MIN_REGRESSION = 0.05
+# A slowdown must also exceed this many times the combined relative noise of both runs
+NOISE_FACTOR = 3.0
+# Earlier baselines on this machine whose medians measure the noise between runs, which samples within one run miss
+HISTORY_RUNS = 10
+MIN_HISTORY_RUNS = 3
+
+TEST_CORPUS = os.path.join(ROOT, "test", "svd_dataset")
+SHAPES_CSV = os.path.join(ROOT, "svd", "datasets", "svd_dataset_1000.csv")
+
+# The SVD example of SVD_optimizer.py and a second version of it, as test_code receives them
+PIPELINE_CODE = [
+    """
+import numpy as np
+
+def svd_example(matrix):
+    u, s, vh = np.linalg.svd(matrix, full_matrices=False)
+    return u, s, vh
+""",
+    """
+import numpy as np
+
+def svd_example(matrix):
+    return np.linalg.svd(matrix, compute_uv=False)
+"""
+]
+# What the stubbed LLM answers to create_sample and estimate_complexity
+STUB_SAMPLE = """
+rng = np.random.default_rng(0)
+size = max(2, int(200 * SAMPLE_SCALE))
+matrix = rng.random((size, size))
+
+def benchmark_target():
+    return svd_example(matrix)
+
+print(benchmark_target()[0][:3])
+"""
+STUB_COMPLEXITY = json.dumps({'time_complexity': "O(n^3)", 'space_complexity': "O(n^2)",
+                              'justification': "Stubbed LLM answer"})
+
+def stub_llm():
+    """Stand-in for testing_agent.llm: canned answers, so the pipeline is measured without network latency."""
+    def invoke(prompt: str):
+        return SimpleNamespace(content=STUB_SAMPLE if "Runnable Sample Input" in prompt else STUB_COMPLEXITY)
+    return SimpleNamespace(invoke=invoke)
+
+def engine_benchmark(want: str) -> Callable[[], None]:
+    store = DatasetStore(TEST_CORPUS)
+    matrices = [store.open(name) for name in store.names()]
+    engine = SVDEngine()
+    return lambda: [engine.svd(matrix, want) for matrix in matrices]
+
+def truncated_benchmark(adaptive: bool) -> Callable[[], None]:
+    store = DatasetStore(TEST_CORPUS)
+    matrices = [store.open(name) for name in store.names()]
+    if adaptive:
+        return lambda: [adaptive_svd(matrix, 1e-6) for matrix in matrices]
+    return lambda: [randomized_svd(matrix, 10) for matrix in matrices]
+
+def batched_benchmark(want: str) -> Callable[[], None]:
+    corpus = Corpus.from_csv(SHAPES_CSV)
+    engine = BatchedSVD(corpus.shapes(), want)
+    return lambda: engine.run(corpus.fill)
+
+def parallel_benchmark() -> Callable[[], None]:
+    corpus = Corpus.from_csv(SHAPES_CSV)
+    return lambda: ParallelSVD(corpus, "values").run()
+
+def incremental_benchmark() -> Callable[[], None]:
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((1000, 10)) @ rng.standard_normal((10, 1000))
+    start = IncrementalSVD.from_matrix(matrix)
+    x, y = rng.standard_normal(1000), rng.standard_normal(1000)
+    # Every sample updates the same starting factorization, so the rank does not grow between samples
+    return lambda: IncrementalSVD(start.u, start.s, start.vt).update(x, y)
+
+def pipeline_benchmark() -> Callable[[], None]:
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+    import testing_agent
+    from db_manager import DatabaseHandler
+    testing_agent.llm = stub_llm()
+
+    def run():
+        with tempfile.TemporaryDirectory() as directory:
+            testing_agent.result_store = DatabaseHandler(os.path.join(directory, "benchmark.db"))
+            try:
+                reports = testing_agent.test_code(PIPELINE_CODE, mode="quiet")
+            finally:
+                testing_agent.result_store.close()
+        if any(report is None or report.get('limit_exceeded') for report in reports):
+            raise RuntimeError(f"test_code did not measure every version: {reports}")
+    return run
+
+# name -> (setup returning the zero-argument benchmark, repeats)
+BENCHMARKS = {
+    "engine_values_test_corpus": (lambda: engine_benchmark("values"), REPEATS),
+    "engine_thin_test_corpus": (lambda: engine_benchmark("thin"), REPEATS),
+    "engine_full_test_corpus": (lambda: engine_benchmark("full"), REPEATS),
+    "randomized_rank10_test_corpus": (lambda: truncated_benchmark(False), REPEATS),
+    "adaptive_tol1e-6_test_corpus": (lambda: truncated_benchmark(True), REPEATS),
+    "batched_values_svd_dataset_1000": (lambda: batched_benchmark("values"), REPEATS),
+    "batched_full_svd_dataset_1000": (lambda: batched_benchmark("full"), REPEATS),
+    "parallel_values_svd_dataset_1000": (parallel_benchmark, 3),
+    "incremental_rank1_update_1000": (incremental_benchmark, REPEATS),
+    "test_code_quiet_stubbed_llm": (pipeline_benchmark, 3)
+}
+
+def measure(function: Callable[[], object], repeats: int, min_sample_seconds: float = MIN_SAMPLE_SECONDS) -> Dict:
+    """Seconds per call: median, relative noise and the samples, after one warmup call."""
+    start = time.perf_counter()
+    function()
+    warmup = time.perf_counter() - start
+    loops = max(1, math.ceil(min_sample_seconds / warmup)) if warmup > 0 else 1
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        samples.append((time.perf_counter() - start) / loops)
+    return {'median': float(np.median(samples)), 'noise': relative_noise(samples), 'samples': samples, 'loops': loops}
+
+def environment(label: Optional[str] = None) -> Dict:
+    """Machine and software description of this run; only the machine part, with label, selects the baseline."""
+    machine = {'machine': platform.machine(), 'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+    if label:
+        machine['label'] = label
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        commit = None
+    software = {'python': platform.python_version(), 'numpy': np.__version__, 'svd_host': host_fingerprint(),
+                'commit': commit}
+    try:
+        import scipy
+        software['scipy'] = scipy.__version__
+    except ImportError:
+        software['scipy'] = None
+    try:
+        software['blas'] = json.dumps(np.show_config(mode="dicts")['Build Dependencies'].get('blas'), sort_keys=True)
+    except (TypeError, KeyError):
+        software['blas'] = None
+    return {'machine': machine, 'software': software,
+            'machine_fingerprint': json.dumps(machine, sort_keys=True)}
+
+class BenchmarkStore:
+    """Runs and their per-benchmark results in SQLite."""
+
+    def __init__(self, db_path: str = BENCHMARK_DB):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS benchmark_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    machine TEXT NOT NULL,
+                    environment TEXT NOT NULL,
+                    is_baseline INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS benchmark_measurements (
+                    run_id INTEGER NOT NULL,
+                    benchmark TEXT NOT NULL,
+                    median FLOAT NOT NULL,
+                    noise FLOAT NOT NULL,
+                    samples TEXT NOT NULL,
+                    verdict TEXT,
+                    PRIMARY KEY (run_id, benchmark),
+                    FOREIGN KEY (run_id) REFERENCES benchmark_runs (id) ON DELETE CASCADE
+                )
+            """)
+            # Stores created before measurements recorded their verdict against the baseline
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(benchmark_measurements)")]
+            if 'verdict' not in columns:
+                conn.execute("ALTER TABLE benchmark_measurements ADD COLUMN verdict TEXT")
+
+    def save_run(self, env: Dict, results: Dict[str, Dict], is_baseline: bool) -> int:
+        with self.connection as conn:
+            cursor = conn.execute("INSERT INTO benchmark_runs (machine, environment, is_baseline) VALUES (?, ?, ?)",
+                                  (env['machine_fingerprint'], json.dumps(env), int(is_baseline)))
+            run_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO benchmark_measurements (run_id, benchmark, median, noise, samples, verdict) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, name, result['median'], result['noise'], json.dumps(result['samples']), result.get('verdict'))
+                 for name, result in results.items()])
+        return run_id
+
+    def baseline(self, machine: str) -> Optional[Dict]:
+        """Latest baseline run on this machine: its environment and results per benchmark."""
+        row = self.connection.execute(
+            "SELECT id, environment FROM benchmark_runs WHERE machine = ? AND is_baseline = 1 ORDER BY id DESC LIMIT 1",
+            (machine,)).fetchone()
+        if row is None:
+            return None
+        results = {measurement['benchmark']: {'median': measurement['median'], 'noise': measurement['noise']}
+                   for measurement in self.connection.execute(
+                       "SELECT benchmark, median, noise FROM benchmark_measurements WHERE run_id = ?", (row['id'],))}
+        return {'id': row['id'], 'environment': json.loads(row['environment']), 'results': results}
+
+    def history(self, machine: str, benchmark: str, exclude_run: Optional[int] = None,
+                limit: int = HISTORY_RUNS) -> List[float]:
+        """Medians of a benchmark in the latest baselines on this machine, other than exclude_run.
+
+        Baselines where the benchmark had regressed are skipped, so a slowdown saved as a baseline does not
+        widen the noise that later runs are judged by.
+        """
+        return [row['median'] for row in self.connection.execute(
+            "SELECT m.median FROM benchmark_measurements m JOIN benchmark_runs r ON r.id = m.run_id "
+            "WHERE r.machine = ? AND r.is_baseline = 1 AND r.id != ? AND m.benchmark = ? "
+            "AND (m.verdict IS NULL OR m.verdict != 'regression') ORDER BY r.id DESC LIMIT ?",
+            (machine, exclude_run if exclude_run is not None else -1, benchmark, limit))]
+
+    def close(self) -> None:
+        self.connection.close()
+
+def relative_noise(values: List[float]) -> float:
+    """1.4826 * median absolute deviation relative to the median, a robust estimate of the relative spread."""
+    median = float(np.median(values))
+    return 1.4826 * float(np.median(np.abs(np.array(values) - median))) / median if median else 0.0
+
+def compare(current: Dict, baseline: Dict, history: Optional[List[float]] = None) -> Dict:
+    """change (relative slowdown of the median), threshold and verdict (regression, improvement or ok).
+
+    history holds the medians of earlier baselines; with at least MIN_HISTORY_RUNS of them, their spread
+    replaces the baseline's own noise when it is larger.
+    """
+    change = current['median'] / baseline['median'] - 1
+    baseline_noise = baseline['noise']
+    if history and len(history) >= MIN_HISTORY_RUNS:
+        baseline_noise = max(baseline_noise, relative_noise(history))
+    threshold = max(MIN_REGRESSION, NOISE_FACTOR * math.hypot(current['noise'], baseline_noise))
+    verdict = "regression" if change > threshold else "improvement" if change < -threshold else "ok"
+    return {'change': change, 'threshold': threshold, 'verdict': verdict}
+
+def run_suite(names: List[str], store: BenchmarkStore, save_baseline: bool = False,
+              machine_label: Optional[str] = None) -> int:
+    """Run the benchmarks, store the run and print the comparison; returns the number of regressions."""
+    env = environment(machine_label)
+    baseline = store.baseline(env['machine_fingerprint'])
+    results = {}
+    regressions = 0
+    print(f"{'benchmark':<36} {'median':>11} {'noise':>6} {'baseline':>11} {'change':>8}  verdict")
+    for name in names:
+        setup, repeats = BENCHMARKS[name]
+        result = measure(setup(), repeats)
+        results[name] = result
+        line = f"{name:<36} {result['median'] * 1e3:>8.3f} ms {result['noise']:>6.1%}"
+        previous = baseline['results'].get(name) if baseline else None
+        if previous:
+            comparison = compare(result, previous, store.history(env['machine_fingerprint'], name, baseline['id']))
+            result['verdict'] = comparison['verdict']
+            regressions += comparison['verdict'] == "regression"
+            line += (f" {previous['median'] * 1e3:>8.3f} ms {comparison['change']:>+8.1%}  {comparison['verdict']}"
+                     f" (threshold {comparison['threshold']:.1%})")
+        print(line, flush=True)
+
+    if baseline:
+        changed = {key: (baseline['environment']['software'].get(key), value)
+                   for key, value in env['software'].items() if baseline['environment']['software'].get(key) != value}
+        for key, (old, new) in changed.items():
+            print(f"  {key} changed since the baseline: {old} -> {new}")
+    else:
+        print("No baseline for this machine yet; this run becomes the baseline")
+    run_id = store.save_run(env, results, save_baseline or baseline is None)
+    print(f"Run {run_id} stored in {BENCHMARK_DB}; {regressions} regression(s)")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="run only benchmarks starting with these")
+    parser.add_argument("--save-baseline", action="store_true", help="make this run the baseline for this machine")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--machine", metavar="LABEL", help="label added to the machine fingerprint, to keep "
+                        "baselines of same-looking but different machines apart")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        sys.exit(0)
+    names = [name for name in BENCHMARKS if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    store = BenchmarkStore()
+    try:
+        regressions = run_suite(names, store, args.save_baseline, args.machine)
+    finally:
+        store.close()
+    sys.exit(1 if regressions else 0)
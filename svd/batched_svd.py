@@ -0,0 +1,215 @@
+"""Batched SVD of many small matrices, as in the datasets/svd_dataset_*.csv workloads.
+
+The C drivers (svd/*/test-*.c) allocate a, s, u, vt and superb for every matrix and call LAPACK one
+matrix at a time. For the smaller matrices the per-call overhead is a large share of the work, so
+here matrices of the same shape are stacked into one 3-D array and factored by a single np.linalg.svd
+call, which loops over the stack in C. Towards 200 x 200 the factorization itself dominates and
+batching gains little; --loop prints the one-at-a-time reference for comparison.
+
+  - A wide matrix is stored transposed, so (m, n) and (n, m) share a bucket; its factors are swapped
+    back (A.T = U S Vt gives A = Vt.T S U.T).
+  - With pad > 1 (singular values only), shapes are rounded up to a multiple of pad and zero-padded,
+    which merges nearby shapes into larger stacks. Zero padding only adds zero singular values.
+  - The input stack, the staging area for transposed and padded matrices and the output array of
+    singular values are allocated once, sized for the largest batch, and reused for every bucket.
+  - Singular values are returned in the original CSV order, concatenated, with offsets per matrix.
+
+    python batched_svd.py datasets/svd_dataset_10000.csv --want full --loop
+    python batched_svd.py datasets/svd_corpus_100000.npz --want values
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from datasetgen import Corpus
+from svd_engine import read_shapes
+
+WANTS = ("values", "thin", "full")
+# Largest stack factored by one call, bounding the workspace at MAX_BATCH * max(m) * max(n) doubles
+MAX_BATCH = 256
+
+def random_filler(seed: int = 0) -> Callable[[np.ndarray, np.ndarray], None]:
+    """fill(indices, out) that writes uniform [0, 1) matrices, like rand() / RAND_MAX in the C drivers."""
+    rng = np.random.default_rng(seed)
+    def fill(indices: np.ndarray, out: np.ndarray) -> None:
+        rng.random(out=out)
+    return fill
+
+def plan_buckets(shapes: List[Tuple[int, int]], pad: int = 1, max_batch: int = MAX_BATCH) -> List[Dict]:
+    """Group matrix indices into batches of one (tall, padded) bucket shape.
+
+    Each batch is a dict with shape (the stacked (M, N), M >= N) and groups, a list of
+    ((m, n), indices) of the original shapes it holds, in stack order.
+    """
+    buckets: Dict[Tuple[int, int], Dict[Tuple[int, int], List[int]]] = {}
+    for index, (m, n) in enumerate(shapes):
+        tall = (max(m, n), min(m, n))
+        bucket = (-(-tall[0] // pad) * pad, -(-tall[1] // pad) * pad)
+        buckets.setdefault(bucket, {}).setdefault((m, n), []).append(index)
+
+    batches = []
+    for bucket, groups in sorted(buckets.items()):
+        batch = {'shape': bucket, 'groups': []}
+        size = 0
+        for shape, indices in sorted(groups.items()):
+            while indices:
+                take = indices[:max_batch - size]
+                indices = indices[len(take):]
+                batch['groups'].append((shape, take))
+                size += len(take)
+                if size == max_batch:
+                    batches.append(batch)
+                    batch = {'shape': bucket, 'groups': []}
+                    size = 0
+        if batch['groups']:
+            batches.append(batch)
+    return batches
+
+class BatchedSVD:
+    """Factors a workload of matrix shapes bucket by bucket, reusing one preallocated workspace."""
+
+    def __init__(self, shapes: List[Tuple[int, int]], want: str = "values", pad: int = 1,
+                 max_batch: int = MAX_BATCH, keep_factors: bool = False):
+        if want not in WANTS:
+            raise ValueError(f"Unknown want '{want}', expected one of {WANTS}")
+        if pad > 1 and want != "values":
+            raise ValueError("Zero padding changes the factors, so pad > 1 requires want='values'")
+        self.shapes = list(shapes)
+        self.want = want
+        self.keep_factors = keep_factors
+        self.batches = plan_buckets(self.shapes, pad, max_batch)
+
+        # Singular values of matrix i end up in singular_values[offsets[i]:offsets[i + 1]] of each run's result
+        ranks = np.array([min(m, n) for m, n in self.shapes], dtype=np.int64)
+        self.offsets = np.zeros(len(self.shapes) + 1, dtype=np.int64)
+        np.cumsum(ranks, out=self.offsets[1:])
+
+        largest_stack = max((sum(len(indices) for _, indices in batch['groups']) * batch['shape'][0] * batch['shape'][1]
+                             for batch in self.batches), default=0)
+        largest_group = max((len(indices) * shape[0] * shape[1]
+                             for batch in self.batches for shape, indices in batch['groups']), default=0)
+        self.workspace = np.empty(largest_stack)
+        self.staging = np.empty(largest_group)
+
+    def _stack(self, batch: Dict, fill: Callable[[np.ndarray, np.ndarray], None]) -> np.ndarray:
+        """Fill the workspace with the batch's matrices in tall orientation and return it as a (b, M, N) view."""
+        big_m, big_n = batch['shape']
+        size = sum(len(indices) for _, indices in batch['groups'])
+        stack = self.workspace[:size * big_m * big_n].reshape(size, big_m, big_n)
+
+        if len(batch['groups']) == 1 and batch['groups'][0][0] == (big_m, big_n):
+            # One exact tall shape: generate straight into the stack
+            fill(np.asarray(batch['groups'][0][1]), stack)
+            return stack
+
+        if any(shape not in ((big_m, big_n), (big_n, big_m)) for shape, _ in batch['groups']):
+            stack.fill(0.0)
+        start = 0
+        for (m, n), indices in batch['groups']:
+            count = len(indices)
+            staged = self.staging[:count * m * n].reshape(count, m, n)
+            fill(np.asarray(indices), staged)
+            if m >= n:
+                stack[start:start + count, :m, :n] = staged
+            else:
+                stack[start:start + count, :n, :m] = staged.transpose(0, 2, 1)
+            start += count
+        return stack
+
+    def run(self, fill: Optional[Callable[[np.ndarray, np.ndarray], None]] = None) -> Dict:
+        """Factor every matrix; fill(indices, out) writes the matrices with those indices into out (k, m, n).
+
+        Returns a dict with singular_values and offsets (original order), u and vt (lists in original
+        order, only with keep_factors), and timing: fill_seconds, svd_seconds and matrices_per_second
+        over the whole run. singular_values is a new array on every run; only the workspace is reused.
+        """
+        fill = fill or random_filler()
+        singular_values = np.empty(int(self.offsets[-1]))
+        u_all = [None] * len(self.shapes) if self.keep_factors else None
+        vt_all = [None] * len(self.shapes) if self.keep_factors else None
+        fill_seconds = svd_seconds = 0.0
+        start_run = time.perf_counter()
+
+        for batch in self.batches:
+            start = time.perf_counter()
+            stack = self._stack(batch, fill)
+            middle = time.perf_counter()
+            if self.want == "values":
+                s = np.linalg.svd(stack, compute_uv=False)
+            else:
+                u, s, vt = np.linalg.svd(stack, full_matrices=self.want == "full")
+            svd_seconds += time.perf_counter() - middle
+            fill_seconds += middle - start
+
+            position = 0
+            for (m, n), indices in batch['groups']:
+                rank = min(m, n)
+                rows = slice(position, position + len(indices))
+                # Scatter each matrix's leading singular values back to its original position
+                targets = self.offsets[indices][:, None] + np.arange(rank)
+                singular_values[targets] = s[rows, :rank]
+                if self.keep_factors:
+                    for j, index in enumerate(indices, start=position):
+                        if m >= n:
+                            u_all[index], vt_all[index] = u[j], vt[j]
+                        else:
+                            u_all[index], vt_all[index] = vt[j].T, u[j].T
+                position += len(indices)
+
+        total_seconds = time.perf_counter() - start_run
+        return {
+            'singular_values': singular_values,
+            'offsets': self.offsets,
+            'u': u_all,
+            'vt': vt_all,
+            'batches': len(self.batches),
+            'fill_seconds': fill_seconds,
+            'svd_seconds': svd_seconds,
+            'matrices_per_second': len(self.shapes) / total_seconds if total_seconds else float("inf")
+        }
+
+def run_loop(shapes: List[Tuple[int, int]], want: str = "values",
+             fill: Optional[Callable[[np.ndarray, np.ndarray], None]] = None) -> Dict:
+    """Reference: one allocation and one np.linalg.svd call per matrix, as the C drivers do."""
+    fill = fill or random_filler()
+    svd_seconds = 0.0
+    start_run = time.perf_counter()
+    for index, (m, n) in enumerate(shapes):
+        matrix = np.empty((1, m, n))
+        fill(np.array([index]), matrix)
+        start = time.perf_counter()
+        if want == "values":
+            np.linalg.svd(matrix[0], compute_uv=False)
+        else:
+            np.linalg.svd(matrix[0], full_matrices=want == "full")
+        svd_seconds += time.perf_counter() - start
+    total_seconds = time.perf_counter() - start_run
+    return {'svd_seconds': svd_seconds,
+            'matrices_per_second': len(shapes) / total_seconds if total_seconds else float("inf")}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workload", help="svd_dataset_*.csv file with the (m, n) shapes, or a datasetgen.py .npz corpus")
+    parser.add_argument("--want", choices=WANTS, default="full",
+                        help="full matches the C drivers' LAPACKE_dgesvd('A', 'A') job")
+    parser.add_argument("--pad", type=int, default=1, help="round shapes up to a multiple of this (values only)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--loop", action="store_true", help="also time the one-matrix-at-a-time reference")
+    args = parser.parse_args()
+
+    if args.workload.endswith(".npz"):
+        # Seed-addressed matrices, identical on every run and backend
+        corpus = Corpus.load(args.workload)
+        shapes, fill = corpus.shapes(), corpus.fill
+    else:
+        shapes, fill = read_shapes(args.workload), None
+    engine = BatchedSVD(shapes, args.want, args.pad, args.max_batch)
+    result = engine.run(fill)
+    print(f"batched: {result['matrices_per_second']:10.1f} matrices/s "
+          f"({len(shapes)} matrices in {result['batches']} batches, "
+          f"svd {result['svd_seconds']:.3f} s, fill {result['fill_seconds']:.3f} s)")
+    if args.loop:
+        reference = run_loop(shapes, args.want, fill)
+        print(f"   loop: {reference['matrices_per_second']:10.1f} matrices/s (svd {reference['svd_seconds']:.3f} s)")
@@ -0,0 +1,230 @@
+"""Memory-mapped store of .npy matrices, such as test/svd_dataset and larger production matrices.
+
+test/svd_eval.c used to skip a fixed 128-byte header and read every file into a fresh buffer. Here:
+  - the .npy header is parsed (format versions 1.0 to 3.0), so dtype, shape, memory order and the
+    data offset come from the file itself
+  - the data is memory-mapped read-only, so opening a multi-GB matrix costs nothing up front and
+    pages are read from the page cache only as the SVD touches them; nothing is duplicated in RAM
+  - manifest.json in the store's directory records each matrix's shape, dtype, order, size and
+    SHA-256 of the data, so a changed or truncated file is detected before it is benchmarked
+
+open() returns an np.memmap, which is a contiguous ndarray view of the file. It can be passed
+straight to svd_engine.svd(). LAPACK overwrites its input, so a full SVD still copies the matrix
+into its own workspace once. truncated_svd only multiplies by the matrix and never copies it.
+
+    python dataset_store.py ../test/svd_dataset --build
+    python dataset_store.py ../test/svd_dataset --verify --svd
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import resource
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"\x93NUMPY"
+# Format version -> (struct format of the header length, header text encoding)
+HEADER_FORMATS = {1: ("<H", "latin1"), 2: ("<I", "latin1"), 3: ("<I", "utf8")}
+MANIFEST_NAME = "manifest.json"
+# Bytes hashed per step, so checksums of large files never hold more than this in memory
+CHECKSUM_CHUNK = 64 * 1024 * 1024
+
+def read_npy_header(path: str) -> Dict:
+    """Parse the header of an .npy file.
+
+    Returns a dict with version, dtype (a numpy dtype string such as '<f8'), shape, fortran_order
+    and offset (where the data starts). Raises ValueError for anything that is not a plain .npy array.
+    """
+    with open(path, 'rb') as file:
+        prefix = file.read(len(MAGIC) + 2)
+        if len(prefix) < len(MAGIC) + 2 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an .npy file")
+        major = prefix[len(MAGIC)]
+        if major not in HEADER_FORMATS:
+            raise ValueError(f"{path} has unsupported .npy format version {major}.{prefix[len(MAGIC) + 1]}")
+        length_format, encoding = HEADER_FORMATS[major]
+        length_bytes = file.read(struct.calcsize(length_format))
+        (header_length,) = struct.unpack(length_format, length_bytes)
+        header_text = file.read(header_length)
+        offset = file.tell()
+    if len(header_text) < header_length:
+        raise ValueError(f"{path} has a truncated .npy header")
+
+    try:
+        header = ast.literal_eval(header_text.decode(encoding))
+    except (SyntaxError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"{path} has a malformed .npy header: {str(e)}")
+    if not isinstance(header, dict) or set(header) != {'descr', 'fortran_order', 'shape'}:
+        raise ValueError(f"{path} has an unexpected .npy header: {header!r}")
+    dtype = np.dtype(header['descr'])
+    if dtype.hasobject:
+        raise ValueError(f"{path} holds Python objects, which cannot be memory-mapped")
+    return {
+        'version': major,
+        'dtype': dtype.str,
+        'shape': tuple(int(dim) for dim in header['shape']),
+        'fortran_order': bool(header['fortran_order']),
+        'offset': offset
+    }
+
+def data_bytes(header: Dict) -> int:
+    return int(np.prod(header['shape'], dtype=np.int64)) * np.dtype(header['dtype']).itemsize
+
+def map_npy(path: str, header: Optional[Dict] = None) -> np.memmap:
+    """Read-only memory map of an .npy file's data, in the file's own memory order."""
+    header = header or read_npy_header(path)
+    expected = header['offset'] + data_bytes(header)
+    actual = os.path.getsize(path)
+    if actual < expected:
+        raise ValueError(f"{path} is truncated: {actual} bytes, the header describes {expected}")
+    return np.memmap(path, dtype=header['dtype'], mode='r', offset=header['offset'], shape=header['shape'],
+                     order='F' if header['fortran_order'] else 'C')
+
+def checksum(array: np.ndarray) -> str:
+    """SHA-256 of an array's data in memory order, hashed in CHECKSUM_CHUNK pieces."""
+    flat = array.reshape(-1, order='A')
+    step = max(1, CHECKSUM_CHUNK // max(array.itemsize, 1))
+    digest = hashlib.sha256()
+    for start in range(0, flat.size, step):
+        digest.update(memoryview(np.ascontiguousarray(flat[start:start + step])).cast('B'))
+    return digest.hexdigest()
+
+class DatasetStore:
+    """The .npy matrices of one directory, described by its manifest.json."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        self.entries: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self) -> bool:
+        if not os.path.exists(self.manifest_path):
+            return False
+        try:
+            with open(self.manifest_path) as file:
+                self.entries = json.load(file).get('matrices', {})
+        except (OSError, ValueError) as e:
+            print(f"Error reading dataset manifest {self.manifest_path}: {str(e)}")
+            return False
+        return True
+
+    def save(self) -> None:
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({'matrices': self.entries}, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def names(self) -> List[str]:
+        return sorted(self.entries)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.npy")
+
+    def describe(self, name: str) -> Dict:
+        """Manifest entry for the matrix file as it is on disk now; hashes all of its data."""
+        path = self.path(name)
+        header = read_npy_header(path)
+        return {
+            'shape': list(header['shape']),
+            'dtype': header['dtype'],
+            'fortran_order': header['fortran_order'],
+            'offset': header['offset'],
+            'bytes': data_bytes(header),
+            'file_size': os.path.getsize(path),
+            'sha256': checksum(map_npy(path, header))
+        }
+
+    def build(self) -> Dict[str, Dict]:
+        """(Re)describe every .npy file of the directory and save the manifest."""
+        names = sorted(entry[:-len(".npy")] for entry in os.listdir(self.root) if entry.endswith(".npy"))
+        self.entries = {name: self.describe(name) for name in names}
+        self.save()
+        return self.entries
+
+    def add(self, name: str, array: np.ndarray) -> np.memmap:
+        """Save an array as name.npy, record it in the manifest and return it memory-mapped."""
+        np.save(self.path(name), array)
+        self.entries[name] = self.describe(name)
+        self.save()
+        return self.open(name)
+
+    def create(self, name: str, shape: Tuple[int, ...], dtype: str = "<f8") -> np.memmap:
+        """Writable memory map of a new name.npy, for matrices too large to build in RAM first.
+
+        Call commit(name) once it is filled to add it to the manifest.
+        """
+        return np.lib.format.open_memmap(self.path(name), mode='w+', dtype=np.dtype(dtype), shape=tuple(shape))
+
+    def commit(self, name: str) -> Dict:
+        self.entries[name] = self.describe(name)
+        self.save()
+        return self.entries[name]
+
+    def open(self, name: str, verify: bool = False) -> np.memmap:
+        """Read-only memory map of a matrix in the manifest.
+
+        The header and file size are always checked against the manifest, which is cheap; verify=True
+        also re-hashes the data, which reads the whole file.
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            raise KeyError(f"{name} is not in {self.manifest_path}")
+        path = self.path(name)
+        header = read_npy_header(path)
+        if (list(header['shape']) != entry['shape'] or header['dtype'] != entry['dtype']
+                or header['fortran_order'] != entry['fortran_order'] or os.path.getsize(path) != entry['file_size']):
+            raise ValueError(f"{path} no longer matches its manifest entry; rebuild the manifest")
+        matrix = map_npy(path, header)
+        if verify and checksum(matrix) != entry['sha256']:
+            raise ValueError(f"{path} fails its checksum")
+        return matrix
+
+    def verify(self) -> Dict[str, bool]:
+        """Whether every matrix in the manifest still matches its checksum."""
+        results = {}
+        for name in self.names():
+            try:
+                self.open(name, verify=True)
+                results[name] = True
+            except (OSError, ValueError) as e:
+                print(f"Error verifying {name}: {str(e)}")
+                results[name] = False
+        return results
+
+def _peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="directory of .npy matrices")
+    parser.add_argument("--build", action="store_true", help="(re)write manifest.json from the files")
+    parser.add_argument("--verify", action="store_true", help="re-hash every matrix against the manifest")
+    parser.add_argument("--svd", action="store_true", help="time svd_engine.svd(want='values') on each mapped matrix")
+    args = parser.parse_args()
+
+    store = DatasetStore(args.root)
+    if args.build or not store.entries:
+        store.build()
+        print(f"{len(store.entries)} matrices described in {store.manifest_path}")
+    for name in store.names():
+        entry = store.entries[name]
+        print(f"{name:>20}: {'x'.join(map(str, entry['shape']))} {entry['dtype']}"
+              f"{' (Fortran order)' if entry['fortran_order'] else ''}, {entry['bytes'] / 1024:.0f} KB, "
+              f"sha256 {entry['sha256'][:12]}")
+    if args.verify:
+        failed = [name for name, ok in store.verify().items() if not ok]
+        print(f"{len(store.entries) - len(failed)}/{len(store.entries)} matrices verified")
+    if args.svd:
+        from svd_engine import svd
+        for name in store.names():
+            matrix = store.open(name)
+            start = time.perf_counter()
+            s = svd(matrix, want="values")
+            seconds = time.perf_counter() - start
+            print(f"{name:>20}: sigma_max {s[0]:.6f}, {seconds * 1e3:.2f} ms, peak RSS {_peak_rss_kb()} KB")
@@ -1,25 +1,180 @@
-import csv
-import random
+"""Seed-addressed SVD workloads: (m, n) shapes plus the matrices themselves, generated on demand.
+
+A corpus is three columns, m, n and family, stored as one uncompressed .npz of uint16/uint8 arrays
+(about 5 bytes per matrix, where the CSV rows take 8 to 9) together with its seed. Matrix i is never
+stored; matrix(i) regenerates it from its own generator seeded with (seed, i), so every run and
+every backend decomposes exactly the same data, in any order and from any process, and a 100,000
+matrix workload is never held in memory.
+
+Families follow test/datasetgen.py, for any (m, n) with k = min(m, n):
+  - uniform: entries in [0, 1), like rand() / RAND_MAX in the C drivers
+  - gaussian: standard normal entries (random_matrix.npy)
+  - low_rank: product of m x r and r x n standard normal factors, r = min(10, k)
+  - diagonal: singular values spread evenly over [1, 100] on the diagonal
+  - perturbed_identity: identity + 0.01 * standard normal noise
+  - noisy: diagonal + 0.05 * standard normal noise
+
+    python datasetgen.py                        # datasets/svd_corpus_{2000..6000}.npz
+    python datasetgen.py --samples 100000 --families uniform low_rank --csv
+    python datasetgen.py --from-csv datasets/svd_dataset_100000.csv
+"""
+import argparse
 import os
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FAMILIES = ("uniform", "gaussian", "low_rank", "diagonal", "perturbed_identity", "noisy")
+DEFAULT_SEED = 2025
+LOW_RANK = 10
+
+def _uniform(rng: np.random.Generator, out: np.ndarray) -> None:
+    rng.random(out=out)
+
+def _gaussian(rng: np.random.Generator, out: np.ndarray) -> None:
+    rng.standard_normal(out=out)
+
+def _low_rank(rng: np.random.Generator, out: np.ndarray) -> None:
+    m, n = out.shape
+    rank = min(LOW_RANK, m, n)
+    np.matmul(rng.standard_normal((m, rank)), rng.standard_normal((rank, n)), out=out)
+
+def _diagonal(rng: np.random.Generator, out: np.ndarray) -> None:
+    out.fill(0.0)
+    k = min(out.shape)
+    out[np.arange(k), np.arange(k)] = np.linspace(1, 100, k)
+
+def _perturbed_identity(rng: np.random.Generator, out: np.ndarray) -> None:
+    rng.standard_normal(out=out)
+    out *= 0.01
+    k = min(out.shape)
+    out[np.arange(k), np.arange(k)] += 1.0
+
+def _noisy(rng: np.random.Generator, out: np.ndarray) -> None:
+    rng.standard_normal(out=out)
+    out *= 0.05
+    k = min(out.shape)
+    out[np.arange(k), np.arange(k)] += np.linspace(1, 100, k)
+
+# Family name -> function writing one matrix into out (m, n) from its generator; indexed by the family column
+GENERATORS: Dict[str, Callable[[np.random.Generator, np.ndarray], None]] = {
+    "uniform": _uniform,
+    "gaussian": _gaussian,
+    "low_rank": _low_rank,
+    "diagonal": _diagonal,
+    "perturbed_identity": _perturbed_identity,
+    "noisy": _noisy
+}
+
+def generate_shapes(num_samples: int, seed: int = DEFAULT_SEED, m_range: Tuple[int, int] = (10, 200),
+                    n_range: Tuple[int, int] = (10, 200)) -> Tuple[np.ndarray, np.ndarray]:
+    """m and n columns of num_samples shapes drawn uniformly from the inclusive ranges, in one call each."""
+    rng = np.random.default_rng([seed, num_samples])
+    m = rng.integers(m_range[0], m_range[1], size=num_samples, endpoint=True, dtype=np.uint16)
+    n = rng.integers(n_range[0], n_range[1], size=num_samples, endpoint=True, dtype=np.uint16)
+    return m, n
+
+class Corpus:
+    """A workload of matrix shapes and families whose matrix i is generated from (seed, i)."""
 
-def generate_dataset(filename, num_samples, m_range=(10, 200), n_range=(10, 200)):
-    """Generate a dataset of (m, n) pairs and save it as a CSV file."""
-    with open(filename, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["m", "n"])  # Write header
-        
-        for _ in range(num_samples):
-            m = random.randint(*m_range)
-            n = random.randint(*n_range)
-            writer.writerow([m, n])
+    def __init__(self, m: np.ndarray, n: np.ndarray, family: Optional[np.ndarray] = None,
+                 seed: int = DEFAULT_SEED, families: Sequence[str] = FAMILIES):
+        unknown = [name for name in families if name not in GENERATORS]
+        if unknown:
+            raise ValueError(f"Unknown families {unknown}, expected some of {FAMILIES}")
+        self.m = np.asarray(m, dtype=np.uint16)
+        self.n = np.asarray(n, dtype=np.uint16)
+        self.family = (np.zeros(len(self.m), dtype=np.uint8) if family is None
+                       else np.asarray(family, dtype=np.uint8))
+        self.seed = int(seed)
+        self.families = tuple(families)
+
+    @classmethod
+    def generate(cls, num_samples: int, seed: int = DEFAULT_SEED, families: Sequence[str] = ("uniform",),
+                 m_range: Tuple[int, int] = (10, 200), n_range: Tuple[int, int] = (10, 200)) -> "Corpus":
+        """Random shapes, with the families assigned round-robin so each gets the same share."""
+        m, n = generate_shapes(num_samples, seed, m_range, n_range)
+        family = (np.arange(num_samples) % len(families)).astype(np.uint8)
+        return cls(m, n, family, seed, families)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, seed: int = DEFAULT_SEED, families: Sequence[str] = ("uniform",)) -> "Corpus":
+        """The shapes of an existing svd_dataset_*.csv file."""
+        columns = np.loadtxt(csv_path, delimiter=",", skiprows=1, dtype=np.uint16, ndmin=2)
+        family = (np.arange(len(columns)) % len(families)).astype(np.uint8)
+        return cls(columns[:, 0], columns[:, 1], family, seed, families)
+
+    @classmethod
+    def load(cls, path: str) -> "Corpus":
+        with np.load(path) as data:
+            return cls(data['m'], data['n'], data['family'], int(data['seed']), [str(name) for name in data['families']])
+
+    def save(self, path: str) -> None:
+        np.savez(path, m=self.m, n=self.n, family=self.family, seed=np.int64(self.seed),
+                 families=np.array(self.families))
+
+    def save_csv(self, path: str) -> None:
+        """The shapes in the svd_dataset_*.csv layout read by the C drivers and svd_engine.read_shapes."""
+        np.savetxt(path, np.column_stack([self.m, self.n]), fmt="%d", delimiter=",", header="m,n", comments="")
+
+    def __len__(self) -> int:
+        return len(self.m)
+
+    def shapes(self) -> List[Tuple[int, int]]:
+        return list(zip(self.m.tolist(), self.n.tolist()))
+
+    def generator(self, index: int) -> np.random.Generator:
+        """The generator of matrix index alone; independent of every other index and of call order."""
+        return np.random.default_rng([self.seed, int(index)])
+
+    def matrix(self, index: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Matrix index, written into out (a C-contiguous float64 (m, n) array) when given."""
+        shape = (int(self.m[index]), int(self.n[index]))
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape:
+            raise ValueError(f"Matrix {index} has shape {shape}, out has {out.shape}")
+        GENERATORS[self.families[self.family[index]]](self.generator(index), out)
+        return out
+
+    def fill(self, indices: np.ndarray, out: np.ndarray) -> None:
+        """fill(indices, out) for BatchedSVD.run: matrix indices[j] into out[j] of a (k, m, n) stack."""
+        for j, index in enumerate(indices):
+            self.matrix(index, out[j])
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        """Matrices in order, generated one at a time."""
+        return (self.matrix(index) for index in range(len(self)))
+
+    def chunks(self, size: int) -> Iterator[Tuple[np.ndarray, List[np.ndarray]]]:
+        """(indices, matrices) in consecutive chunks of at most size matrices."""
+        for start in range(0, len(self), size):
+            indices = np.arange(start, min(start + size, len(self)))
+            yield indices, [self.matrix(index) for index in indices]
 
 if __name__ == "__main__":
-    os.makedirs("datasets", exist_ok=True)  # Ensure the directory exists
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, nargs="+", default=[1000 * exponent for exponent in range(2, 7)])
+    parser.add_argument("--from-csv", nargs="+", metavar="CSV", help="convert existing shape files instead")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--families", nargs="+", choices=FAMILIES, default=["uniform"])
+    parser.add_argument("--output", default="datasets")
+    parser.add_argument("--csv", action="store_true", help="also write the shapes as svd_dataset_*.csv")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)  # Ensure the directory exists
+    if args.from_csv:
+        corpora = [(os.path.splitext(os.path.basename(path))[0].replace("svd_dataset_", ""),
+                    Corpus.from_csv(path, args.seed, args.families)) for path in args.from_csv]
+    else:
+        corpora = [(str(samples), Corpus.generate(samples, args.seed, args.families)) for samples in args.samples]
 
-    for i, exponent in enumerate(range(2, 7)):  
-        num_samples = 1000 * exponent
-        filename = f"datasets/svd_dataset_{num_samples}.csv"
-        print(f"Generating {filename} with {num_samples} samples...")
-        generate_dataset(filename, num_samples)
+    for label, corpus in corpora:
+        path = os.path.join(args.output, f"svd_corpus_{label}.npz")
+        corpus.save(path)
+        print(f"{path}: {len(corpus)} matrices, seed {corpus.seed}, families {', '.join(corpus.families)}, "
+              f"{os.path.getsize(path)} bytes")
+        if args.csv:
+            corpus.save_csv(os.path.join(args.output, f"svd_dataset_{label}.csv"))
 
     print("All datasets have been generated.")
@@ -0,0 +1,229 @@
+"""Incremental SVD: keep a thin factorization A = U diag(s) Vt current under small changes (Brand, 2006).
+
+test/datasetgen.py's perturbed_identity and noisy_matrix are small perturbations of known matrices,
+and production matrices change the same way: low-rank corrections, new rows or columns, dropped
+ones. Refactoring from scratch costs O(m n min(m, n)) each time. With A of rank r, a change
+A + X Y.T of rank c only needs:
+
+  - the parts of X and Y outside the current bases, P Ra = (I - U U.T) X and Q Rb = (I - V V.T) Y
+  - the SVD of the small (r + c) x (r + c) core
+        K = [diag(s) 0; 0 0] + [U.T X; Ra] [V.T Y; Rb].T = U' diag(s') V'.T
+  - the rotated bases [U P] U' and [V Q] V'
+
+which is O((m + n)(r + c)^2 + (r + c)^3). Appending rows or columns is an update of the matrix
+padded with zeros. Removing rows or columns is an update that zeroes them, after which they are
+dropped. Singular values below rel_tol * s[0] are truncated after every step.
+
+Rounding slowly erodes the orthogonality of U and V, so every reorthogonalize_every updates they are
+re-orthonormalized by QR and the core is re-diagonalized. check() compares the factorization with
+a full recompute of the actual matrix.
+
+    python incremental_svd.py --size 2000 --rank 10 --steps 50
+"""
+import argparse
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from svd_engine import svd
+
+# Singular values below this fraction of the largest are dropped; the default keeps the numerical rank
+DEFAULT_REL_TOL = 1e-12
+DEFAULT_REORTHOGONALIZE_EVERY = 20
+
+def _complement(basis: np.ndarray, block: np.ndarray):
+    """(basis.T block, Q, R) with Q R the part of block orthogonal to basis, projected out twice for stability."""
+    coefficients = basis.T @ block
+    residual = block - basis @ coefficients
+    correction = basis.T @ residual
+    residual -= basis @ correction
+    q, r = np.linalg.qr(residual)
+    return coefficients + correction, q, r
+
+class IncrementalSVD:
+    """A thin SVD u diag(s) vt kept current under low-rank updates and row/column appends and removals."""
+
+    def __init__(self, u: np.ndarray, s: np.ndarray, vt: np.ndarray, max_rank: Optional[int] = None,
+                 rel_tol: float = DEFAULT_REL_TOL, reorthogonalize_every: int = DEFAULT_REORTHOGONALIZE_EVERY):
+        self.u = u
+        self.s = s
+        self.vt = vt
+        self.max_rank = max_rank
+        self.rel_tol = rel_tol
+        self.reorthogonalize_every = reorthogonalize_every
+        self.updates = 0
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, max_rank: Optional[int] = None, **options) -> "IncrementalSVD":
+        """Start from the exact thin SVD of matrix, truncated to max_rank.
+
+        The randomized truncated SVD is not used for max_rank: its error would be carried into every update.
+        """
+        u, s, vt = svd(matrix, want="thin")
+        factorization = cls(u, s, vt, max_rank, **options)
+        factorization._truncate()
+        return factorization
+
+    @property
+    def shape(self):
+        return self.u.shape[0], self.vt.shape[1]
+
+    @property
+    def rank(self) -> int:
+        return len(self.s)
+
+    def matrix(self) -> np.ndarray:
+        return (self.u * self.s) @ self.vt
+
+    def _truncate(self) -> None:
+        keep = int(np.count_nonzero(self.s > self.rel_tol * self.s[0])) if len(self.s) and self.s[0] > 0 else 0
+        if self.max_rank is not None:
+            keep = min(keep, self.max_rank)
+        self.u, self.s, self.vt = self.u[:, :keep], self.s[:keep], self.vt[:keep]
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> None:
+        """A <- A + x y.T for x (m, c) and y (n, c); a 1-D x and y is a rank-1 update."""
+        x = x.reshape(len(x), -1)
+        y = y.reshape(len(y), -1)
+        v = self.vt.T
+        ux, p, ra = _complement(self.u, x)
+        vy, q, rb = _complement(v, y)
+
+        r, c = len(self.s), x.shape[1]
+        core = np.zeros((r + c, r + c))
+        core[np.arange(r), np.arange(r)] = self.s
+        core += np.vstack([ux, ra]) @ np.vstack([vy, rb]).T
+        core_u, self.s, core_vt = np.linalg.svd(core)
+
+        self.u = np.hstack([self.u, p]) @ core_u
+        self.vt = core_vt @ np.vstack([self.vt, q.T])
+        self._truncate()
+
+        self.updates += 1
+        if self.reorthogonalize_every and self.updates % self.reorthogonalize_every == 0:
+            self.reorthogonalize()
+
+    def append_rows(self, rows: np.ndarray) -> None:
+        """A <- [A; rows] for rows (k, n)."""
+        rows = np.atleast_2d(rows)
+        m, k = self.shape[0], len(rows)
+        self.u = np.vstack([self.u, np.zeros((k, self.rank))])
+        selector = np.zeros((m + k, k))
+        selector[m + np.arange(k), np.arange(k)] = 1.0
+        self.update(selector, rows.T)
+
+    def append_columns(self, columns: np.ndarray) -> None:
+        """A <- [A, columns] for columns (m, k); a 1-D array is one column."""
+        columns = columns.reshape(len(columns), -1)
+        n, k = self.shape[1], columns.shape[1]
+        self.vt = np.hstack([self.vt, np.zeros((self.rank, k))])
+        selector = np.zeros((n + k, k))
+        selector[n + np.arange(k), np.arange(k)] = 1.0
+        self.update(columns, selector)
+
+    def remove_rows(self, indices: Sequence[int]) -> None:
+        """Downdate: drop rows of A. They are zeroed by an update first, so U has no weight left on them."""
+        indices = np.asarray(indices)
+        selector = np.zeros((self.shape[0], len(indices)))
+        selector[indices, np.arange(len(indices))] = -1.0
+        # Current rows of A, read from the factorization
+        self.update(selector, ((self.u[indices] * self.s) @ self.vt).T)
+        self.u = np.delete(self.u, indices, axis=0)
+
+    def remove_columns(self, indices: Sequence[int]) -> None:
+        """Downdate: drop columns of A."""
+        indices = np.asarray(indices)
+        selector = np.zeros((self.shape[1], len(indices)))
+        selector[indices, np.arange(len(indices))] = -1.0
+        self.update((self.u * self.s) @ self.vt[:, indices], selector)
+        self.vt = np.delete(self.vt, indices, axis=1)
+
+    def reorthogonalize(self) -> None:
+        """Restore orthonormal U and V: U = Qu Ru, V = Qv Rv, then re-diagonalize Ru diag(s) Rv.T."""
+        qu, ru = np.linalg.qr(self.u)
+        qv, rv = np.linalg.qr(self.vt.T)
+        core_u, self.s, core_vt = np.linalg.svd((ru * self.s) @ rv.T)
+        self.u = qu @ core_u
+        self.vt = core_vt @ qv.T
+        self._truncate()
+
+    def orthogonality_error(self) -> float:
+        """Largest deviation of U.T U and V.T V from the identity."""
+        identity = np.eye(self.rank)
+        return float(max(np.abs(self.u.T @ self.u - identity).max(initial=0.0),
+                         np.abs(self.vt @ self.vt.T - identity).max(initial=0.0)))
+
+    def check(self, matrix: np.ndarray) -> Dict:
+        """Accuracy against a full recompute of the matrix the updates should have produced.
+
+        Returns relative_error (Frobenius, of the reconstruction), singular_value_error (largest
+        difference to the leading exact singular values, relative to the largest), the truncation
+        floor (relative Frobenius norm of the exact singular values beyond the kept rank, which is
+        the best any rank-r factorization can do) and orthogonality_error.
+        """
+        exact = np.linalg.svd(matrix, compute_uv=False)
+        norm = np.linalg.norm(exact)
+        k = min(self.rank, len(exact))
+        return {
+            'rank': self.rank,
+            'relative_error': float(np.linalg.norm(matrix - self.matrix()) / norm) if norm else 0.0,
+            'singular_value_error': float(np.max(np.abs(self.s[:k] - exact[:k])) / exact[0]) if k and exact[0] else 0.0,
+            'truncation_floor': float(np.linalg.norm(exact[self.rank:]) / norm) if norm else 0.0,
+            'orthogonality_error': self.orthogonality_error()
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--rank", type=int, default=10, help="rank of the starting matrix")
+    parser.add_argument("--steps", type=int, default=30, help="changes applied, cycling through the kinds")
+    parser.add_argument("--check-every", type=int, default=10)
+    parser.add_argument("--reorthogonalize-every", type=int, default=DEFAULT_REORTHOGONALIZE_EVERY)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((args.size, args.rank)) @ rng.standard_normal((args.rank, args.size))
+    factorization = IncrementalSVD.from_matrix(matrix, reorthogonalize_every=args.reorthogonalize_every)
+    incremental_seconds = full_seconds = 0.0
+
+    for step in range(1, args.steps + 1):
+        kind = ("update", "append_rows", "append_columns", "remove_rows", "remove_columns")[step % 5]
+        m, n = matrix.shape
+        start = time.perf_counter()
+        if kind == "update":
+            x, y = rng.standard_normal((m, 1)), rng.standard_normal((n, 1))
+            factorization.update(x, y)
+            matrix = matrix + x @ y.T
+        elif kind == "append_rows":
+            rows = rng.standard_normal((2, args.rank)) @ factorization.vt[:args.rank]
+            factorization.append_rows(rows)
+            matrix = np.vstack([matrix, rows])
+        elif kind == "append_columns":
+            columns = factorization.u[:, :args.rank] @ rng.standard_normal((args.rank, 2))
+            factorization.append_columns(columns)
+            matrix = np.hstack([matrix, columns])
+        elif kind == "remove_rows":
+            indices = rng.choice(m, 2, replace=False)
+            factorization.remove_rows(indices)
+            matrix = np.delete(matrix, indices, axis=0)
+        else:
+            indices = rng.choice(n, 2, replace=False)
+            factorization.remove_columns(indices)
+            matrix = np.delete(matrix, indices, axis=1)
+        incremental_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        np.linalg.svd(matrix, full_matrices=False)
+        full_seconds += time.perf_counter() - start
+
+        if step % args.check_every == 0 or step == args.steps:
+            check = factorization.check(matrix)
+            print(f"step {step:>4} ({kind:>14}): {matrix.shape[0]}x{matrix.shape[1]}, rank {check['rank']}, "
+                  f"error {check['relative_error']:.1e} (floor {check['truncation_floor']:.1e}), "
+                  f"singular values {check['singular_value_error']:.1e}, "
+                  f"orthogonality {check['orthogonality_error']:.1e}")
+
+    print(f"{args.steps} changes: incremental {incremental_seconds * 1e3 / args.steps:.2f} ms each, "
+          f"full recompute {full_seconds * 1e3 / args.steps:.2f} ms each "
+          f"({full_seconds / incremental_seconds:.0f}x)")
@@ -0,0 +1,241 @@
+"""Multi-core throughput for SVD workloads: a process pool over a seed-addressed corpus.
+
+LAPACK's own threading does little for the 10 to 200 sized matrices of datasets/svd_dataset_*.csv;
+the BLAS threads mostly contend. Here the workload is split into shards across a process pool
+instead, each worker with its BLAS pinned to one thread:
+
+  - Workers regenerate their matrices from the corpus seed (datasetgen.Corpus), so only index
+    lists and singular values cross process boundaries.
+  - Indices are sorted by shape and cut into shards of equal estimated cost (m * n * min(m, n)),
+    largest first, so each shard factors few distinct shapes with BatchedSVD and the pool finishes
+    evenly. Shards are handed out as workers free up.
+  - Large matrices do gain from threaded BLAS. calibrate() times square SVDs at startup with 1, 2,
+    4, ... BLAS threads and finds the size from which fewer workers with more threads each have
+    the higher throughput. Matrices from that size on run in a second pool configured that way.
+
+BLAS reads its thread count when it is loaded, so pools are started with the spawn method while the
+thread environment variables are set; the parent's own BLAS is not affected.
+
+    python parallel_svd.py datasets/svd_dataset_10000.csv --scaling
+    python parallel_svd.py datasets/svd_corpus_100000.npz --workers 8 --want thin
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batched_svd import BatchedSVD, WANTS
+from datasetgen import Corpus
+
+# Read by OpenBLAS, MKL, BLIS, Apple Accelerate and OpenMP builds when BLAS is loaded
+BLAS_THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS",
+                         "VECLIB_MAXIMUM_THREADS")
+# Shards per worker; more balance the load better, fewer batch more matrices per np.linalg.svd call
+SHARDS_PER_WORKER = 4
+CALIBRATION_SIZES = (64, 128, 256, 512, 1024)
+CALIBRATION_REPEATS = 3
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+@contextlib.contextmanager
+def blas_threads(threads: int):
+    """Set the BLAS thread variables for processes started inside the block."""
+    saved = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in BLAS_THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+# Corpus of the worker process, set once by _init_worker
+worker_corpus = None
+
+def _init_worker(m: np.ndarray, n: np.ndarray, family: np.ndarray, seed: int, families: Tuple[str, ...]) -> None:
+    global worker_corpus
+    worker_corpus = Corpus(m, n, family, seed, families)
+
+def _run_shard(indices: np.ndarray, want: str) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Factor the corpus matrices of one shard; returns (indices, their concatenated singular values, svd seconds)."""
+    shapes = [(int(worker_corpus.m[index]), int(worker_corpus.n[index])) for index in indices]
+    engine = BatchedSVD(shapes, want)
+    result = engine.run(lambda local, out: worker_corpus.fill(indices[local], out))
+    return indices, result['singular_values'], result['svd_seconds']
+
+def _time_sizes(sizes: Sequence[int], repeats: int) -> List[float]:
+    """Best time of a thin SVD of a random square matrix per size, in this process's BLAS configuration."""
+    rng = np.random.default_rng(0)
+    times = []
+    for size in sizes:
+        matrix = rng.standard_normal((size, size))
+        np.linalg.svd(matrix, full_matrices=False)  # warmup
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            np.linalg.svd(matrix, full_matrices=False)
+            best = min(best, time.perf_counter() - start)
+        times.append(best)
+    return times
+
+def calibrate(cores: Optional[int] = None, sizes: Sequence[int] = CALIBRATION_SIZES,
+              repeats: int = CALIBRATION_REPEATS) -> Dict:
+    """Measure which BLAS thread count gives the most throughput per matrix size on all cores.
+
+    With t threads, cores // t workers run side by side, so the throughput is estimated as
+    (cores // t) / time(t). Returns a dict with threads (best per size), timings (per thread
+    count) and threshold: the smallest size where more than one thread wins (inf if none does).
+    """
+    cores = cores or available_cores()
+    options = [1]
+    while options[-1] * 2 <= cores:
+        options.append(options[-1] * 2)
+    context = multiprocessing.get_context("spawn")
+    timings = {}
+    for threads in options:
+        with blas_threads(threads), ProcessPoolExecutor(1, mp_context=context) as pool:
+            timings[threads] = pool.submit(_time_sizes, list(sizes), repeats).result()
+
+    best = {}
+    for position, size in enumerate(sizes):
+        best[size] = max(options, key=lambda threads: (cores // threads) / timings[threads][position])
+    threshold = next((size for size in sizes if best[size] > 1), float("inf"))
+    return {'cores': cores, 'threads': best, 'timings': timings, 'threshold': threshold}
+
+def plan_shards(corpus: Corpus, indices: np.ndarray, count: int) -> List[np.ndarray]:
+    """Cut indices, sorted by shape with the costliest first, into up to count shards of about equal cost."""
+    if not len(indices):
+        return []
+    tall = np.maximum(corpus.m[indices], corpus.n[indices]).astype(np.int64)
+    short = np.minimum(corpus.m[indices], corpus.n[indices]).astype(np.int64)
+    order = np.lexsort((short, tall))[::-1]
+    ordered = indices[order]
+    cost = np.cumsum(tall[order] * short[order] * short[order])
+    bounds = np.searchsorted(cost, cost[-1] * np.arange(1, count) / count)
+    return [shard for shard in np.split(ordered, bounds) if len(shard)]
+
+def _run_pool(corpus: Corpus, indices: np.ndarray, want: str, workers: int, threads: int,
+              singular_values: np.ndarray, offsets: np.ndarray) -> float:
+    """Factor indices on workers processes with threads BLAS threads each; returns the summed svd seconds."""
+    if not len(indices):
+        return 0.0
+    shards = plan_shards(corpus, indices, workers * SHARDS_PER_WORKER)
+    context = multiprocessing.get_context("spawn")
+    svd_seconds = 0.0
+    with blas_threads(threads), ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker,
+            initargs=(corpus.m, corpus.n, corpus.family, corpus.seed, corpus.families)) as pool:
+        futures = [pool.submit(_run_shard, shard, want) for shard in shards]
+        for future in as_completed(futures):
+            shard, values, seconds = future.result()
+            ranks = np.minimum(corpus.m[shard], corpus.n[shard]).astype(np.int64)
+            # Scatter the shard's concatenated values back to each matrix's slot
+            starts = np.repeat(offsets[shard] - np.concatenate([[0], np.cumsum(ranks)[:-1]]), ranks)
+            singular_values[starts + np.arange(len(values))] = values
+            svd_seconds += seconds
+    return svd_seconds
+
+class ParallelSVD:
+    """Runs a corpus on all cores: small matrices one BLAS thread per worker, large ones with threaded BLAS."""
+
+    def __init__(self, corpus: Corpus, want: str = "values", workers: Optional[int] = None,
+                 calibration: Optional[Dict] = None):
+        if want not in WANTS:
+            raise ValueError(f"Unknown want '{want}', expected one of {WANTS}")
+        self.corpus = corpus
+        self.want = want
+        self.workers = workers or available_cores()
+        # Without calibration, or on one core, every matrix goes to the one-thread-per-worker pool
+        self.calibration = calibration or {'threads': {}, 'threshold': float("inf")}
+        ranks = np.minimum(corpus.m, corpus.n).astype(np.int64)
+        self.offsets = np.zeros(len(corpus) + 1, dtype=np.int64)
+        np.cumsum(ranks, out=self.offsets[1:])
+
+    def split(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices for the one-thread pool, indices for the threaded pool)."""
+        # Side of the square matrix whose SVD costs about as much as each m x n one
+        sizes = np.cbrt(self.corpus.m.astype(np.float64) * self.corpus.n * np.minimum(self.corpus.m, self.corpus.n))
+        large = sizes >= self.calibration['threshold']
+        return np.flatnonzero(~large), np.flatnonzero(large)
+
+    def run(self) -> Dict:
+        """Factor every matrix; returns singular_values and offsets (corpus order) and timings.
+
+        Factors are computed for want="thin"/"full" but stay in the workers; only singular values
+        are sent back.
+        """
+        singular_values = np.empty(int(self.offsets[-1]))
+        small, large = self.split()
+        start = time.perf_counter()
+        svd_seconds = _run_pool(self.corpus, small, self.want, self.workers, 1, singular_values, self.offsets)
+        if len(large):
+            threads = max(self.calibration['threads'].values())
+            svd_seconds += _run_pool(self.corpus, large, self.want, max(1, self.workers // threads), threads,
+                                     singular_values, self.offsets)
+        seconds = time.perf_counter() - start
+        return {
+            'singular_values': singular_values,
+            'offsets': self.offsets,
+            'workers': self.workers,
+            'threaded_matrices': len(large),
+            'seconds': seconds,
+            'svd_seconds': svd_seconds,
+            'matrices_per_second': len(self.corpus) / seconds if seconds else float("inf")
+        }
+
+def scaling_report(corpus: Corpus, want: str = "values", worker_counts: Optional[Sequence[int]] = None,
+                   calibration: Optional[Dict] = None) -> List[Dict]:
+    """Throughput per worker count, with speedup and efficiency (speedup / workers) against one worker.
+
+    Pool startup is included in the time, as it is part of what a batch job pays.
+    """
+    if worker_counts is None:
+        cores = available_cores()
+        worker_counts = sorted({cores} | {2 ** power for power in range(cores.bit_length())})
+    rows = []
+    for workers in worker_counts:
+        result = ParallelSVD(corpus, want, workers, calibration).run()
+        rows.append({'workers': workers, 'seconds': result['seconds'],
+                     'matrices_per_second': result['matrices_per_second']})
+    base = rows[0]['matrices_per_second'] / rows[0]['workers']
+    for row in rows:
+        row['speedup'] = row['matrices_per_second'] / base
+        row['efficiency'] = row['speedup'] / row['workers']
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workload", help="svd_dataset_*.csv file, or a datasetgen.py .npz corpus")
+    parser.add_argument("--want", choices=WANTS, default="values")
+    parser.add_argument("--workers", type=int, default=None, help="default: all available cores")
+    parser.add_argument("--no-calibrate", action="store_true", help="keep every matrix on one BLAS thread")
+    parser.add_argument("--scaling", action="store_true", help="report throughput and efficiency per worker count")
+    args = parser.parse_args()
+
+    corpus = Corpus.load(args.workload) if args.workload.endswith(".npz") else Corpus.from_csv(args.workload)
+    calibration = None
+    if not args.no_calibrate and available_cores() > 1:
+        calibration = calibrate()
+        print(f"threaded BLAS from size {calibration['threshold']}: "
+              + ", ".join(f"{size}: {threads} threads" for size, threads in calibration['threads'].items()))
+
+    if args.scaling:
+        print(f"{'workers':>7} {'seconds':>9} {'matrices/s':>11} {'speedup':>8} {'efficiency':>10}")
+        for row in scaling_report(corpus, args.want, calibration=calibration):
+            print(f"{row['workers']:>7} {row['seconds']:>9.3f} {row['matrices_per_second']:>11.1f} "
+                  f"{row['speedup']:>8.2f} {row['efficiency']:>10.0%}")
+    else:
+        result = ParallelSVD(corpus, args.want, args.workers, calibration).run()
+        print(f"{result['matrices_per_second']:.1f} matrices/s on {result['workers']} workers "
+              f"({len(corpus)} matrices, {result['threaded_matrices']} with threaded BLAS, "
+              f"{result['seconds']:.3f} s)")
@@ -0,0 +1,232 @@
+"""SVD engine: one svd(matrix, want=...) entry point that picks the fastest LAPACK path per shape.
+
+Three things decide how long an SVD takes besides its shape:
+  - the driver: gesdd (divide and conquer, used by np.linalg.svd) or gesvd (QR iteration, via scipy)
+  - the job: singular values only, thin factors (k = min(m, n) columns) or full square factors
+  - the layout: LAPACK works on column-major data, so a C-ordered matrix is copied unless its
+    transpose is factored instead (A.T = U S Vt gives A = Vt.T S U.T)
+
+Which combination wins depends on the host's LAPACK/BLAS build, so it is measured rather than assumed.
+tune() times every combination on representative shapes of a workload, e.g. the (m, n) mixes in
+datasets/svd_dataset_*.csv, and stores the winner per shape bucket and job in a crossover table. The
+table is saved as JSON together with a fingerprint of the host and is only reused on the same host.
+
+    python svd_engine.py --tune datasets/svd_dataset_1000.csv datasets/svd_dataset_2000.csv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import platform
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from truncated_svd import randomized_svd, adaptive_svd
+
+try:
+    import scipy
+    from scipy import linalg as scipy_linalg
+except ImportError:  # gesvd is only reachable through scipy; without it every plan uses gesdd
+    scipy = scipy_linalg = None
+
+WANTS = ("values", "thin", "full")
+DRIVERS = ("gesdd", "gesvd") if scipy_linalg is not None else ("gesdd",)
+
+DEFAULT_TABLE_PATH = os.environ.get(
+    "MARCO_SVD_TABLE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "svd_crossover.json")
+)
+
+# Used for shapes and jobs the table has no entry for
+DEFAULT_PLAN = {'driver': "gesdd", 'transpose': False}
+# Another plan replaces the default only when it is at least this much faster, so timing noise does not flip plans
+WIN_MARGIN = 0.03
+
+def host_fingerprint() -> str:
+    """Hash of what decides LAPACK performance here: machine, core count and numpy/scipy/BLAS build."""
+    info = {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__ if scipy is not None else None
+    }
+    try:
+        info['blas'] = np.show_config(mode="dicts")['Build Dependencies'].get('blas')
+    except (TypeError, KeyError):
+        info['blas'] = None
+    return hashlib.sha256(json.dumps(info, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def shape_bucket(m: int, n: int) -> Tuple[int, int]:
+    """Half-octave bucket of a shape: shapes within a factor of ~1.4 per side share a plan."""
+    return int(math.log2(max(m, 1)) * 2), int(math.log2(max(n, 1)) * 2)
+
+def _table_key(want: str, bucket: Tuple[int, int]) -> str:
+    return f"{want}:{bucket[0]}x{bucket[1]}"
+
+def run_plan(matrix: np.ndarray, want: str, driver: str, transpose: bool):
+    """Compute the SVD of matrix with an explicit driver and layout; returns s, or (u, s, vt)."""
+    a = matrix.T if transpose else matrix
+    if want == "values":
+        if driver == "gesvd":
+            return scipy_linalg.svd(a, compute_uv=False, lapack_driver="gesvd")
+        return np.linalg.svd(a, compute_uv=False)
+
+    full_matrices = want == "full"
+    if driver == "gesvd":
+        u, s, vt = scipy_linalg.svd(a, full_matrices=full_matrices, lapack_driver="gesvd")
+    else:
+        u, s, vt = np.linalg.svd(a, full_matrices=full_matrices)
+    if transpose:
+        return vt.T, s, u.T
+    return u, s, vt
+
+def _best_time(matrix: np.ndarray, want: str, driver: str, transpose: bool, repeats: int) -> float:
+    run_plan(matrix, want, driver, transpose)  # warmup
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        run_plan(matrix, want, driver, transpose)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / 1e9
+
+def read_shapes(csv_path: str) -> List[Tuple[int, int]]:
+    """(m, n) pairs of an svd_dataset_*.csv file."""
+    with open(csv_path, newline='') as file:
+        return [(int(row['m']), int(row['n'])) for row in csv.DictReader(file)]
+
+class SVDEngine:
+    """Dispatches svd() calls through a crossover table of the fastest driver and layout per shape bucket."""
+
+    def __init__(self, table_path: Optional[str] = DEFAULT_TABLE_PATH):
+        self.table_path = table_path
+        self.fingerprint = host_fingerprint()
+        self.entries: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self) -> bool:
+        """Load the persisted table; a table measured on another host is ignored."""
+        if not self.table_path or not os.path.exists(self.table_path):
+            return False
+        try:
+            with open(self.table_path) as file:
+                table = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading SVD crossover table {self.table_path}: {str(e)}")
+            return False
+        if table.get('fingerprint') != self.fingerprint:
+            return False
+        self.entries = table.get('entries', {})
+        return True
+
+    def save(self) -> None:
+        if not self.table_path:
+            return
+        temp_path = f"{self.table_path}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({'fingerprint': self.fingerprint, 'entries': self.entries}, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.table_path)
+
+    def plan(self, m: int, n: int, want: str) -> Dict:
+        """Driver and layout for a shape: the tuned entry of its bucket, else of the nearest tuned bucket."""
+        bucket = shape_bucket(m, n)
+        entry = self.entries.get(_table_key(want, bucket))
+        if entry is None:
+            candidates = [(abs(value['bucket'][0] - bucket[0]) + abs(value['bucket'][1] - bucket[1]), key)
+                          for key, value in self.entries.items() if value['want'] == want]
+            if not candidates:
+                return dict(DEFAULT_PLAN)
+            entry = self.entries[min(candidates)[1]]
+        if entry['driver'] not in DRIVERS:
+            return dict(DEFAULT_PLAN)
+        return {'driver': entry['driver'], 'transpose': entry['transpose']}
+
+    def svd(self, matrix: np.ndarray, want: str = "thin", rank: Optional[int] = None, tol: Optional[float] = None):
+        """SVD of a 2-D matrix. want is "values" (returns s), "thin" or "full" (return (u, s, vt)).
+
+        With rank or tol, only the leading triplets are computed by the randomized range finder:
+        rank fixes their number, tol picks the smallest rank with relative Frobenius error <= tol.
+        """
+        if want not in WANTS:
+            raise ValueError(f"Unknown want '{want}', expected one of {WANTS}")
+        matrix = np.asarray(matrix)
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a 2-D matrix, got shape {matrix.shape}")
+        if rank is not None or tol is not None:
+            if want == "full":
+                raise ValueError("A truncated SVD has no full factors; use want='thin' or 'values'")
+            if tol is not None:
+                return adaptive_svd(matrix, tol, max_rank=rank, want=want)
+            return randomized_svd(matrix, rank, want=want)
+        plan = self.plan(matrix.shape[0], matrix.shape[1], want)
+        return run_plan(matrix, want, plan['driver'], plan['transpose'])
+
+    def tune(self, shapes: Iterable[Tuple[int, int]], wants: Iterable[str] = WANTS, repeats: int = 5,
+             seed: int = 0) -> Dict[str, Dict]:
+        """Measure every driver and layout on the median shape of each bucket the shapes fall in.
+
+        The winners are merged into the table and saved; returns the new entries.
+        """
+        buckets: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for m, n in shapes:
+            buckets.setdefault(shape_bucket(m, n), []).append((m, n))
+
+        rng = np.random.default_rng(seed)
+        measured = {}
+        for bucket, members in sorted(buckets.items()):
+            members.sort(key=lambda shape: shape[0] * shape[1])
+            m, n = members[len(members) // 2]
+            matrix = rng.standard_normal((m, n))
+            for want in wants:
+                timings = {f"{driver}{'+T' if transpose else ''}": _best_time(matrix, want, driver, transpose, repeats)
+                           for driver in DRIVERS for transpose in (False, True)}
+                fastest = min(timings, key=timings.get)
+                if timings[fastest] > timings["gesdd"] * (1 - WIN_MARGIN):
+                    fastest = "gesdd"
+                measured[_table_key(want, bucket)] = {
+                    'want': want,
+                    'bucket': list(bucket),
+                    'shape': [m, n],
+                    'driver': fastest.split("+")[0],
+                    'transpose': fastest.endswith("+T"),
+                    'timings': timings
+                }
+        self.entries.update(measured)
+        self.save()
+        return measured
+
+# Engine shared by module-level svd() calls
+default_engine = None
+
+def get_engine() -> SVDEngine:
+    global default_engine
+    if default_engine is None:
+        default_engine = SVDEngine()
+    return default_engine
+
+def svd(matrix: np.ndarray, want: str = "thin", rank: Optional[int] = None, tol: Optional[float] = None):
+    """SVD through the shared engine; see SVDEngine.svd."""
+    return get_engine().svd(matrix, want, rank, tol)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tune", nargs="+", metavar="CSV", required=True, help="svd_dataset_*.csv files to tune against")
+    parser.add_argument("--wants", nargs="+", choices=WANTS, default=list(WANTS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--table", default=DEFAULT_TABLE_PATH)
+    args = parser.parse_args()
+
+    shapes = [shape for csv_path in args.tune for shape in read_shapes(csv_path)]
+    engine = SVDEngine(args.table)
+    measured = engine.tune(shapes, args.wants, args.repeats)
+    for key, entry in sorted(measured.items(), key=lambda item: (item[1]['want'], item[1]['bucket'])):
+        default_time = entry['timings']["gesdd"]
+        best_time = min(entry['timings'].values())
+        print(f"{entry['want']:>6} {entry['shape'][0]:>5}x{entry['shape'][1]:<5} -> {entry['driver']}"
+              f"{' (transposed)' if entry['transpose'] else '':<13} {best_time * 1e6:9.1f} us "
+              f"({default_time / best_time:4.2f}x vs gesdd)")
+    print(f"{len(measured)} entries saved to {args.table}")
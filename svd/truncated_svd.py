@@ -0,0 +1,181 @@
+"""Truncated (top-k) SVD by randomized range finding.
+
+For a matrix of rank (or numerical rank) k, only the leading k singular triplets carry information,
+yet a full decomposition costs O(m n min(m, n)) time and m^2 + n^2 memory for U and Vt. The
+randomized range finder (Halko, Martinsson and Tropp) instead multiplies the matrix by a thin random
+block, orthonormalizes the result into a basis Q of its range and factors the small B = Q.T A:
+
+  - randomized_svd(A, k) samples k + oversample directions, sharpened by power_iterations rounds of
+    A A.T, which matter when the singular values decay slowly.
+  - adaptive_svd(A, tol) grows Q one block at a time until the relative Frobenius error
+    ||A - Q Q.T A|| / ||A|| drops below tol, read off for free as ||A||^2 - ||B||^2, and then keeps
+    the smallest rank that meets tol.
+
+The command line checks both against the LAPACK references that test/svd_eval.c wrote for the
+test/datasetgen.py matrices:
+
+    python truncated_svd.py --tol 1e-6
+    python truncated_svd.py --rank 10 --synthetic 4000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_OVERSAMPLE = 10
+DEFAULT_POWER_ITERATIONS = 2
+# Columns added to the basis per step of adaptive_svd
+DEFAULT_BLOCK_SIZE = 8
+# Relative energy below which a new block of adaptive_svd is taken to be rounding noise
+RESOLUTION = np.finfo(np.float64).eps
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test")
+# Matrices in the order test/svd_eval.c processes them; singular_values_<i>.txt belongs to entry i
+REFERENCE_MATRICES = ["random_matrix", "diagonal_matrix", "low_rank_matrix", "perturbed_identity", "noisy_matrix"]
+
+def _orthonormalize(block: np.ndarray, basis: Optional[np.ndarray] = None) -> np.ndarray:
+    """Orthonormal basis of block, made orthogonal to basis first (twice, for numerical stability)."""
+    if basis is not None and basis.shape[1]:
+        for _ in range(2):
+            block = block - basis @ (basis.T @ block)
+    q, _ = np.linalg.qr(block)
+    return q
+
+def _factor(q: np.ndarray, b: np.ndarray, rank: int, want: str):
+    if want == "values":
+        return np.linalg.svd(b, compute_uv=False)[:rank]
+    u_small, s, vt = np.linalg.svd(b, full_matrices=False)
+    return q @ u_small[:, :rank], s[:rank], vt[:rank]
+
+def randomized_svd(matrix: np.ndarray, rank: int, oversample: int = DEFAULT_OVERSAMPLE,
+                   power_iterations: int = DEFAULT_POWER_ITERATIONS, want: str = "thin", seed: int = 0):
+    """Leading rank singular values (want="values") or triplets (u, s, vt) of matrix."""
+    m, n = matrix.shape
+    rank = min(rank, m, n)
+    samples = min(rank + oversample, m, n)
+    rng = np.random.default_rng(seed)
+
+    q = _orthonormalize(matrix @ rng.standard_normal((n, samples)))
+    for _ in range(power_iterations):
+        # Re-orthonormalizing between the products keeps the small singular directions from being lost to rounding
+        q = _orthonormalize(matrix @ _orthonormalize(matrix.T @ q))
+    return _factor(q, q.T @ matrix, rank, want)
+
+def adaptive_svd(matrix: np.ndarray, tol: float, block_size: int = DEFAULT_BLOCK_SIZE,
+                 power_iterations: int = DEFAULT_POWER_ITERATIONS, max_rank: Optional[int] = None,
+                 want: str = "thin", seed: int = 0):
+    """Truncated SVD with the smallest rank whose relative Frobenius error is at most tol.
+
+    Returns the same as randomized_svd; the rank is len(s).
+    """
+    m, n = matrix.shape
+    max_rank = min(max_rank or min(m, n), m, n)
+    rng = np.random.default_rng(seed)
+    flat = matrix.ravel()
+    norm_squared = float(flat @ flat)
+    target = (tol ** 2) * norm_squared
+
+    q = np.empty((m, 0))
+    b = np.empty((0, n))
+    residual = norm_squared
+    while q.shape[1] < max_rank and residual > target:
+        width = min(block_size, max_rank - q.shape[1])
+        block = matrix @ rng.standard_normal((n, width))
+        for _ in range(power_iterations):
+            block = matrix @ _orthonormalize(matrix.T @ _orthonormalize(block, q))
+        q_block = _orthonormalize(block, q)
+        b_block = q_block.T @ matrix
+        energy = float(np.einsum('ij,ij->', b_block, b_block))
+        if energy <= RESOLUTION * norm_squared:
+            # The range is exhausted: the block is rounding noise, and what is left of the residual is
+            # below what ||A||^2 - ||B||^2 can resolve, so tolerances under ~1e-8 end here
+            residual = 0.0
+            break
+        q = np.hstack([q, q_block])
+        b = np.vstack([b, b_block])
+        residual = max(0.0, residual - energy)
+
+    if want == "values":
+        s = np.linalg.svd(b, compute_uv=False)
+    else:
+        u_small, s, vt = np.linalg.svd(b, full_matrices=False)
+    # Dropping trailing singular values adds their energy to the residual of the basis itself
+    tail = np.concatenate([np.cumsum((s * s)[::-1])[::-1], [0.0]])
+    rank = next(r for r in range(len(s) + 1) if r == len(s) or tail[r] + residual <= target)
+    if want == "values":
+        return s[:rank]
+    return q @ u_small[:, :rank], s[:rank], vt[:rank]
+
+def load_reference(index: int, results_dir: str = os.path.join(TEST_DIR, "svd_results")) -> np.ndarray:
+    """Singular values that test/svd_eval.c computed for REFERENCE_MATRICES[index], printed to 6 decimals."""
+    return np.loadtxt(os.path.join(results_dir, f"singular_values_{index}.txt"))
+
+def reference_error(s: np.ndarray, reference: np.ndarray) -> Dict:
+    """Error of computed leading singular values against a (longer) reference list.
+
+    max_abs_error compares the computed values with the leading reference values; the references
+    are rounded to 1e-6, which is the floor of this number. discarded is the largest reference
+    value beyond the computed rank, which bounds the spectral error of the truncation itself.
+    """
+    k = len(s)
+    return {
+        'rank': k,
+        'max_abs_error': float(np.max(np.abs(s - reference[:k]))) if k else 0.0,
+        'max_rel_error': float(np.max(np.abs(s - reference[:k]) / reference[0])) if k and reference[0] else 0.0,
+        'discarded': float(reference[k]) if k < len(reference) else 0.0
+    }
+
+def _measure(function, *args, **kwargs) -> Tuple[object, float, int]:
+    """(result, seconds, peak traced bytes) of one call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def compare_with_full(matrix: np.ndarray, rank: Optional[int], tol: Optional[float], **options) -> Dict:
+    """Time and peak memory of the truncated SVD against np.linalg.svd with full factors, as svd_eval.c runs it."""
+    (u, s, vt), seconds, peak = (_measure(adaptive_svd, matrix, tol, **options) if tol is not None
+                                 else _measure(randomized_svd, matrix, rank, **options))
+    _, full_seconds, full_peak = _measure(np.linalg.svd, matrix)
+    residual = np.linalg.norm(matrix - (u * s) @ vt) / np.linalg.norm(matrix)
+    return {'s': s, 'seconds': seconds, 'peak_bytes': peak, 'full_seconds': full_seconds,
+            'full_peak_bytes': full_peak, 'relative_residual': float(residual)}
+
+def _print_comparison(name: str, comparison: Dict, error: Optional[Dict] = None) -> None:
+    line = (f"{name:>20}: rank {len(comparison['s']):>4}, residual {comparison['relative_residual']:.1e}, "
+            f"{comparison['seconds'] * 1e3:8.2f} ms vs {comparison['full_seconds'] * 1e3:8.2f} ms full, "
+            f"{comparison['peak_bytes'] / 1024:9.0f} KB vs {comparison['full_peak_bytes'] / 1024:9.0f} KB")
+    if error:
+        line += f", max error vs reference {error['max_abs_error']:.1e} (next reference value {error['discarded']:.2e})"
+    print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rank", type=int, help="fixed rank for randomized_svd")
+    group.add_argument("--tol", type=float, help="relative Frobenius tolerance for adaptive_svd")
+    parser.add_argument("--power-iterations", type=int, default=DEFAULT_POWER_ITERATIONS)
+    parser.add_argument("--dataset", default=os.path.join(TEST_DIR, "svd_dataset"))
+    parser.add_argument("--results", default=os.path.join(TEST_DIR, "svd_results"))
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="also time an N x N matrix of rank 10, like low_rank_matrix.npy at production size")
+    args = parser.parse_args()
+
+    for index, name in enumerate(REFERENCE_MATRICES):
+        matrix = np.load(os.path.join(args.dataset, f"{name}.npy"))
+        comparison = compare_with_full(matrix, args.rank, args.tol, power_iterations=args.power_iterations)
+        _print_comparison(name, comparison, reference_error(comparison['s'], load_reference(index, args.results)))
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        matrix = rng.standard_normal((args.synthetic, 10)) @ rng.standard_normal((10, args.synthetic))
+        _print_comparison(f"low rank {args.synthetic}", compare_with_full(matrix, args.rank, args.tol,
+                                                                         power_iterations=args.power_iterations))
@@ -1,5 +1,9 @@
+// Build (the binary is not tracked, as it must match the header parsing below):
+//   gcc -O2 svd_eval.c -o svd_eval -llapacke -llapack -lblas -lm
+
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <lapacke.h>
 #include <time.h>
 #include <sys/stat.h>
@@ -9,15 +13,46 @@
 
 #define MIN(a, b) (((a) < (b)) ? (a) : (b))
 
-// Function to read an npy file (assuming double-precision, row-major order)
-void read_npy(const char *filename, double *matrix, int size) {
+// Function to read an npy file of m x n doubles into matrix (row-major, as numpy saves by default).
+// The header length depends on the .npy version and the shape's digits, so it is parsed rather than assumed.
+void read_npy(const char *filename, double *matrix, int m, int n) {
     FILE *file = fopen(filename, "rb");
     if (!file) {
         printf("Error: Cannot open %s\n", filename);
         exit(1);
     }
-    fseek(file, 128, SEEK_SET);  // Skip .npy header
-    fread(matrix, sizeof(double), size, file);
+    unsigned char prefix[8];
+    if (fread(prefix, 1, 8, file) != 8 || memcmp(prefix, "\x93NUMPY", 6) != 0) {
+        printf("Error: %s is not an .npy file\n", filename);
+        exit(1);
+    }
+    // Version 1.0 stores the header length in 2 little-endian bytes, versions 2.0 and 3.0 in 4
+    int length_bytes = prefix[6] == 1 ? 2 : 4;
+    unsigned char length_buffer[4] = {0};
+    if (fread(length_buffer, 1, length_bytes, file) != (size_t)length_bytes) {
+        printf("Error: %s has a truncated header\n", filename);
+        exit(1);
+    }
+    size_t header_length = length_buffer[0] | (length_buffer[1] << 8) | ((size_t)length_buffer[2] << 16) | ((size_t)length_buffer[3] << 24);
+    char *header = (char *)malloc(header_length + 1);
+    if (fread(header, 1, header_length, file) != header_length) {
+        printf("Error: %s has a truncated header\n", filename);
+        exit(1);
+    }
+    header[header_length] = '\0';
+
+    char expected_shape[64];
+    snprintf(expected_shape, sizeof(expected_shape), "'shape': (%d, %d)", m, n);
+    if (!strstr(header, "'descr': '<f8'") || !strstr(header, "'fortran_order': False") || !strstr(header, expected_shape)) {
+        printf("Error: %s is not a C-ordered %d x %d float64 array: %s\n", filename, m, n, header);
+        exit(1);
+    }
+    free(header);
+
+    if (fread(matrix, sizeof(double), (size_t)m * n, file) != (size_t)m * n) {
+        printf("Error: %s is truncated\n", filename);
+        exit(1);
+    }
     fclose(file);
 }
 
@@ -66,7 +101,7 @@ int main() {
         double *vt = (double *)malloc(n * n * sizeof(double));
         double *superb = (double *)malloc(MIN(m, n) * sizeof(double));
 
-        read_npy(input_file, a, m * n);  // Load dataset
+        read_npy(input_file, a, m, n);  // Load dataset
 
         // Get initial CPU usage
         struct rusage usage_before;
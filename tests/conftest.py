@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app and the SVD tools are flat script directories, imported the way their own scripts import them
+sys.path.insert(0, os.path.join(ROOT, "OptimizerAgent"))
+sys.path.insert(0, os.path.join(ROOT, "svd"))
+
+# agent_functions and testing_agent build their clients and caches on import; keep them off real keys and files
+for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(name, "test-key")
+os.environ.setdefault("MARCO_LLM_CACHE", os.path.join(tempfile.mkdtemp(prefix="marco-tests-"), "llm_cache.db"))
@@ -0,0 +1,37 @@
+"""BatchedSVD and seed-addressed corpora against per-matrix np.linalg.svd."""
+import numpy as np
+
+from batched_svd import BatchedSVD
+from datasetgen import Corpus, FAMILIES
+
+def test_batched_values_match_per_matrix_svd_in_corpus_order():
+    corpus = Corpus.generate(40, seed=7, families=FAMILIES, m_range=(3, 12), n_range=(3, 12))
+    result = BatchedSVD(corpus.shapes(), "values").run(corpus.fill)
+    for index in range(len(corpus)):
+        values = result['singular_values'][result['offsets'][index]:result['offsets'][index + 1]]
+        np.testing.assert_allclose(values, np.linalg.svd(corpus.matrix(index), compute_uv=False), atol=1e-10)
+
+def test_each_run_returns_its_own_array():
+    corpus = Corpus.generate(10, seed=3, m_range=(4, 6), n_range=(4, 6))
+    engine = BatchedSVD(corpus.shapes(), "values")
+    first = engine.run(corpus.fill)['singular_values']
+    kept = first.copy()
+    engine.run(lambda indices, out: out.fill(1.0))
+    np.testing.assert_array_equal(first, kept)
+
+def test_corpus_matrices_do_not_depend_on_generation_order():
+    corpus = Corpus.generate(20, seed=11, families=FAMILIES, m_range=(2, 9), n_range=(2, 9))
+    forward = [corpus.matrix(index) for index in range(len(corpus))]
+    backward = [corpus.matrix(index) for index in reversed(range(len(corpus)))][::-1]
+    for a, b in zip(forward, backward):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(Corpus.generate(20, seed=11, families=FAMILIES, m_range=(2, 9),
+                                                  n_range=(2, 9)).matrix(13), forward[13])
+
+def test_corpus_round_trips_through_npz(tmp_path):
+    corpus = Corpus.generate(15, seed=5, families=("gaussian", "low_rank"))
+    path = str(tmp_path / "corpus.npz")
+    corpus.save(path)
+    loaded = Corpus.load(path)
+    assert loaded.shapes() == corpus.shapes() and loaded.families == corpus.families
+    np.testing.assert_array_equal(loaded.matrix(9), corpus.matrix(9))
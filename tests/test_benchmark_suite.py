@@ -0,0 +1,34 @@
+"""Baselines, history and verdicts of the regression benchmark store."""
+import benchmark_suite
+from benchmark_suite import BenchmarkStore, compare, environment
+
+def save(store, env, median, is_baseline, verdict=None):
+    result = {'median': median, 'noise': 0.01, 'samples': [median], 'verdict': verdict}
+    return store.save_run(env, {'bench': result}, is_baseline)
+
+def test_machine_fingerprint_ignores_the_host_name_and_keeps_the_label(monkeypatch):
+    monkeypatch.setattr(benchmark_suite.platform, "node", lambda: "some-container-id")
+    env = environment("ci-large")
+    assert "some-container-id" not in env['machine_fingerprint']
+    assert env['machine']['label'] == "ci-large"
+    assert environment()['machine_fingerprint'] != env['machine_fingerprint']
+
+def test_history_holds_only_earlier_baselines_without_regressions(tmp_path):
+    store = BenchmarkStore(str(tmp_path / "benchmarks.db"))
+    env = {'machine_fingerprint': "machine", 'software': {}}
+    save(store, env, 1.0, True)
+    save(store, env, 2.0, False)
+    save(store, env, 1.5, True, verdict="regression")
+    save(store, env, 1.1, True, verdict="ok")
+    latest = save(store, env, 1.2, True, verdict="ok")
+
+    assert store.baseline("machine")['id'] == latest
+    assert store.history("machine", "bench", exclude_run=latest) == [1.1, 1.0]
+    store.close()
+
+def test_verdict_threshold_follows_the_noise():
+    baseline = {'median': 1.0, 'noise': 0.01}
+    assert compare({'median': 1.04, 'noise': 0.01}, baseline)['verdict'] == "ok"
+    assert compare({'median': 1.2, 'noise': 0.01}, baseline)['verdict'] == "regression"
+    assert compare({'median': 0.8, 'noise': 0.01}, baseline)['verdict'] == "improvement"
+    assert compare({'median': 1.2, 'noise': 0.01}, baseline, [1.0, 1.3, 0.8])['verdict'] == "ok"
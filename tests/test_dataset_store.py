@@ -0,0 +1,52 @@
+""".npy header parsing, memory mapping and manifest checks of the dataset store."""
+import numpy as np
+import pytest
+
+from dataset_store import DatasetStore, map_npy, read_npy_header
+
+def write_npy(path, array, version):
+    with open(path, 'wb') as file:
+        np.lib.format.write_array(file, array, version=version)
+
+@pytest.mark.parametrize("version", [(1, 0), (2, 0), (3, 0)])
+@pytest.mark.parametrize("order", ["C", "F"])
+def test_headers_of_every_format_version(tmp_path, version, order):
+    array = np.asarray(np.arange(35, dtype=np.float64).reshape(5, 7), order=order)
+    path = str(tmp_path / "matrix.npy")
+    write_npy(path, array, version)
+    header = read_npy_header(path)
+    assert header['version'] == version[0]
+    assert header['shape'] == (5, 7) and header['dtype'] == "<f8"
+    assert header['fortran_order'] == (order == "F")
+    np.testing.assert_array_equal(map_npy(path, header), array)
+
+def test_rejects_files_that_are_not_plain_arrays(tmp_path):
+    path = tmp_path / "not.npy"
+    path.write_bytes(b"plain text")
+    with pytest.raises(ValueError):
+        read_npy_header(str(path))
+    np.save(tmp_path / "objects.npy", np.array([{}, []], dtype=object))
+    with pytest.raises(ValueError):
+        read_npy_header(str(tmp_path / "objects.npy"))
+
+def test_truncated_data_is_detected(tmp_path):
+    path = str(tmp_path / "matrix.npy")
+    np.save(path, np.ones((10, 10)))
+    with open(path, 'r+b') as file:
+        file.truncate(200)
+    with pytest.raises(ValueError):
+        map_npy(path)
+
+def test_manifest_catches_changed_files(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    original = np.random.default_rng(0).standard_normal((6, 4))
+    np.testing.assert_array_equal(store.add("matrix", original), original)
+    assert DatasetStore(str(tmp_path)).verify() == {'matrix': True}
+
+    changed = original.copy()
+    changed[0, 0] += 1.0
+    np.save(store.path("matrix"), changed)
+    assert DatasetStore(str(tmp_path)).verify() == {'matrix': False}
+    np.save(store.path("matrix"), np.ones((4, 6)))
+    with pytest.raises(ValueError):
+        DatasetStore(str(tmp_path)).open("matrix")
@@ -0,0 +1,47 @@
+"""Per-thread connections of DatabaseHandler."""
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+from db_manager import DatabaseHandler
+
+def test_connections_of_exited_threads_are_closed(tmp_path):
+    db = DatabaseHandler(str(tmp_path / "history.db"))
+    connections = []
+
+    def use_connection():
+        connections.append(db.connection)
+        db.get_conversations()
+
+    for _ in range(50):
+        thread = threading.Thread(target=use_connection)
+        thread.start()
+        thread.join()
+    gc.collect()
+
+    assert len(db._connections) == 1
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    db.close()
+
+def test_close_releases_the_connections_of_live_threads(tmp_path):
+    db = DatabaseHandler(str(tmp_path / "history.db"))
+    ready, done = threading.Event(), threading.Event()
+
+    def hold_connection():
+        db.get_conversations()
+        ready.set()
+        done.wait()
+
+    thread = threading.Thread(target=hold_connection)
+    thread.start()
+    ready.wait()
+    db.close()
+    assert len(db._connections) == 0
+    assert db.get_conversations() == []
+    done.set()
+    thread.join()
+    db.close()
@@ -0,0 +1,266 @@
+"""Model fallback against a local fake provider speaking the OpenAI and Anthropic HTTP APIs."""
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import agent_functions
+from llm_cache import LLMCache
+from llm_clients import ClientRegistry
+
+class FakeProvider(BaseHTTPRequestHandler):
+    # Chunked transfer encoding lets a stream be cut off mid-body
+    protocol_version = "HTTP/1.1"
+    # Model name -> answer text, or a function of the prompt; an empty answer is a valid but empty completion
+    answers = {}
+    # Model name, or a text the prompt contains -> seconds to wait before answering; set release to answer at once
+    delays = {}
+    release = threading.Event()
+    # Requests being answered right now, and the most seen at once
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+    # Models whose streams drop the connection after the first half of the answer
+    broken_streams = set()
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append((self.path, body['model']))
+        prompt = json.dumps(body['messages'])
+        delay = max([seconds for key, seconds in self.delays.items() if key == body['model'] or key in prompt],
+                    default=0)
+        cls = type(self)
+        with self.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            if self.release.wait(delay):
+                return
+        finally:
+            with self.lock:
+                cls.in_flight -= 1
+        answer = self.answers.get(body['model'], "")
+        text = answer(prompt) if callable(answer) else answer
+        if body.get('stream'):
+            self.stream(body['model'], text)
+            return
+        if self.path.endswith("/chat/completions"):
+            payload = {'id': "fake", 'object': "chat.completion", 'created': 0, 'model': body['model'],
+                       'choices': [{'index': 0, 'finish_reason': "stop",
+                                    'message': {'role': "assistant", 'content': text}}],
+                       'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}}
+        else:
+            payload = {'id': "fake", 'type': "message", 'role': "assistant", 'model': body['model'],
+                       'content': [{'type': "text", 'text': text}] if text else [],
+                       'stop_reason': "end_turn", 'stop_sequence': None,
+                       'usage': {'input_tokens': 1, 'output_tokens': 1}}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream(self, model, text):
+        """Send text in two halves as server-sent events in the provider's format"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        halves = [text[:len(text) // 2], text[len(text) // 2:]]
+        openai = self.path.endswith("/chat/completions")
+        if not openai:
+            self.send_event("message_start", {'type': "message_start", 'message': {
+                'id': "fake", 'type': "message", 'role': "assistant", 'model': model, 'content': [],
+                'stop_reason': None, 'stop_sequence': None, 'usage': {'input_tokens': 1, 'output_tokens': 1}}})
+            self.send_event("content_block_start", {'type': "content_block_start", 'index': 0,
+                                                    'content_block': {'type': "text", 'text': ""}})
+        for number, half in enumerate(halves):
+            if number and model in self.broken_streams:
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            if openai:
+                self.send_event(None, {'id': "fake", 'object': "chat.completion.chunk", 'created': 0, 'model': model,
+                                       'choices': [{'index': 0, 'delta': {'content': half}, 'finish_reason': None}]})
+            else:
+                self.send_event("content_block_delta", {'type': "content_block_delta", 'index': 0,
+                                                        'delta': {'type': "text_delta", 'text': half}})
+        if openai:
+            self.send_event(None, {'id': "fake", 'object': "chat.completion.chunk", 'created': 0, 'model': model,
+                                   'choices': [{'index': 0, 'delta': {}, 'finish_reason': "stop"}]})
+            self.send_chunk(b"data: [DONE]\n\n")
+        else:
+            self.send_event("content_block_stop", {'type': "content_block_stop", 'index': 0})
+            self.send_event("message_delta", {'type': "message_delta", 'usage': {'output_tokens': 1},
+                                              'delta': {'stop_reason': "end_turn", 'stop_sequence': None}})
+            self.send_event("message_stop", {'type': "message_stop"})
+        self.send_chunk(b"")
+
+    def send_event(self, event, data):
+        self.send_chunk((f"event: {event}\n" if event else "").encode() + f"data: {json.dumps(data)}\n\n".encode())
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def provider(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{url}/v1")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", url)
+    monkeypatch.setattr(agent_functions, "llm_cache", LLMCache(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(agent_functions, "client_registry",
+                        ClientRegistry(agent_functions.build_client, client_closer=agent_functions.close_client))
+    monkeypatch.setattr(agent_functions, "selected_model", "OpenAI GPT-4o")
+    FakeProvider.answers = {}
+    FakeProvider.delays = {}
+    FakeProvider.release = threading.Event()
+    FakeProvider.broken_streams = set()
+    FakeProvider.in_flight = FakeProvider.max_in_flight = 0
+    FakeProvider.requests = []
+    yield FakeProvider
+    FakeProvider.release.set()
+    server.shutdown()
+    server.server_close()
+
+def test_primary_model_answers(provider):
+    provider.answers = {"gpt-4o": "primary"}
+    response = agent_functions.run_async_func(agent_functions.invoke_with_fallback, "prompt", hedge=False)
+    assert response.content == "primary"
+    assert provider.requests == [("/v1/chat/completions", "gpt-4o")]
+
+def test_empty_answer_falls_back_to_the_next_provider(provider):
+    provider.answers = {"claude-3-5-sonnet-latest": "fallback"}
+    response = agent_functions.run_async_func(agent_functions.invoke_with_fallback, "prompt", hedge=False)
+    assert response.content == "fallback"
+    assert [model for _, model in provider.requests] == ["gpt-4o", "claude-3-5-sonnet-latest"]
+    assert agent_functions.selected_model == "Claude 3.5 Sonnet"
+
+def test_cached_answer_of_the_invoked_model_skips_the_request(provider):
+    provider.answers = {"gpt-4o": "primary"}
+    agent_functions.run_async_func(agent_functions.invoke_with_fallback, "prompt", hedge=False)
+    response = agent_functions.run_async_func(agent_functions.invoke_with_fallback, "prompt", hedge=False)
+    assert response.content == "primary"
+    assert len(provider.requests) == 1
+
+def test_outermost_run_closes_the_loop_clients(provider):
+    provider.answers = {"gpt-4o": "primary"}
+
+    async def invoke_and_keep_clients():
+        await agent_functions.invoke_with_fallback("prompt", hedge=False)
+        state = agent_functions.client_registry._state_for_loop()
+        return state['http_client']
+
+    http_client = agent_functions.run_async_func(invoke_and_keep_clients)
+    assert http_client.is_closed
+
+def test_hedged_request_returns_the_faster_model_and_cancels_the_slower_one(provider, monkeypatch):
+    provider.answers = {"gpt-4o": "slow primary", "claude-3-5-sonnet-latest": "fast hedge"}
+    provider.delays = {"gpt-4o": 30}
+    monkeypatch.setattr(agent_functions, "HEDGE_DEFAULT_DELAY", 0.2)
+    cancelled = []
+    invoke_model = agent_functions.invoke_model
+
+    async def recording_invoke_model(model, prompt):
+        try:
+            return await invoke_model(model, prompt)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+
+    monkeypatch.setattr(agent_functions, "invoke_model", recording_invoke_model)
+
+    async def hedged():
+        response = await agent_functions.invoke_with_fallback("prompt", hedge=True)
+        return response, list(cancelled)
+
+    response, cancelled_on_return = agent_functions.run_async_func(hedged)
+    assert response.content == "fast hedge"
+    assert cancelled_on_return == ["OpenAI GPT-4o"]
+    assert [model for _, model in provider.requests] == ["gpt-4o", "claude-3-5-sonnet-latest"]
+    assert agent_functions.client_registry.breaker("OpenAI GPT-4o").allow_request()
+
+def test_stream_that_breaks_off_restarts_on_the_next_model(provider, monkeypatch):
+    monkeypatch.setattr(agent_functions, "selected_model", "Claude 3.5 Sonnet")
+    provider.answers = {"claude-3-5-sonnet-latest": "def broken(): pass", "gpt-4o": "def fixed(): return 1"}
+    provider.broken_streams = {"claude-3-5-sonnet-latest"}
+    updates = []
+    text = agent_functions.run_async_func(agent_functions.stream_with_fallback, "prompt", updates.append)
+
+    assert text == "def fixed(): return 1"
+    assert updates == ["def broke", "def fixed(", "def fixed(): return 1"]
+    assert agent_functions.selected_model == "OpenAI GPT-4o"
+    assert agent_functions.llm_cache.get("gpt-4o", 0.7, "prompt") == text
+    assert agent_functions.llm_cache.get("claude-3-5-sonnet-latest", None, "prompt") is None
+
+def test_cached_stream_is_delivered_as_one_update(provider):
+    provider.answers = {"gpt-4o": "def cached(): pass"}
+    agent_functions.run_async_func(agent_functions.stream_with_fallback, "prompt", lambda text: None)
+    updates = []
+    text = agent_functions.run_async_func(agent_functions.stream_with_fallback, "prompt", updates.append)
+
+    assert text == "def cached(): pass"
+    assert updates == [text]
+    assert len(provider.requests) == 1
+
+def answer_with_technique(techniques):
+    return lambda prompt: f"# {next(technique for technique in techniques if technique in prompt)}"
+
+def test_concurrent_improvements_respect_the_bound(provider):
+    techniques = [f"technique {i}" for i in range(1, 6)]
+    provider.answers = {"gpt-4o": answer_with_technique(techniques)}
+    provider.delays = {"gpt-4o": 0.2}
+
+    async def collect():
+        return [result async for result in agent_functions.improve_code_concurrently("code", techniques, max_concurrency=2)]
+
+    results = agent_functions.run_async_func(collect)
+    assert sorted(results) == [(i, f"technique {i}", f"# technique {i}") for i in range(1, 6)]
+    assert provider.max_in_flight == 2
+
+def test_concurrent_improvements_yield_in_completion_order(provider):
+    techniques = ["slow technique", "fast technique", "medium technique"]
+    provider.answers = {"gpt-4o": answer_with_technique(techniques)}
+    provider.delays = {"slow technique": 0.6, "fast technique": 0.0, "medium technique": 0.3}
+
+    async def collect():
+        return [result async for result in agent_functions.improve_code_concurrently("code", techniques)]
+
+    results = agent_functions.run_async_func(collect)
+    assert results == [(2, "fast technique", "# fast technique"), (3, "medium technique", "# medium technique"),
+                       (1, "slow technique", "# slow technique")]
+
+def test_stopping_early_cancels_the_pending_improvements(provider, monkeypatch):
+    techniques = ["fast technique", "stuck technique", "other stuck technique"]
+    provider.answers = {"gpt-4o": answer_with_technique(techniques)}
+    provider.delays = {"stuck technique": 30}
+    cancelled = []
+    improve_code = agent_functions.improve_code
+
+    async def recording_improve_code(code, technique_subset, *args):
+        try:
+            return await improve_code(code, technique_subset, *args)
+        except asyncio.CancelledError:
+            cancelled.append(technique_subset[0])
+            raise
+
+    monkeypatch.setattr(agent_functions, "improve_code", recording_improve_code)
+
+    async def first_only():
+        results = agent_functions.improve_code_concurrently("code", techniques)
+        first = await results.__anext__()
+        await results.aclose()
+        return first, sorted(cancelled)
+
+    first, cancelled_on_close = agent_functions.run_async_func(first_only)
+    assert first == (1, "fast technique", "# fast technique")
+    assert cancelled_on_close == ["other stuck technique", "stuck technique"]
@@ -0,0 +1,43 @@
+"""IncrementalSVD against a full recompute with np.linalg.svd."""
+import numpy as np
+
+from incremental_svd import IncrementalSVD
+
+def low_rank(rng, m, n, rank):
+    return rng.standard_normal((m, rank)) @ rng.standard_normal((rank, n))
+
+def test_updates_appends_and_removals_match_a_full_recompute():
+    rng = np.random.default_rng(0)
+    matrix = low_rank(rng, 60, 40, 5)
+    factorization = IncrementalSVD.from_matrix(matrix, reorthogonalize_every=3)
+
+    x, y = rng.standard_normal((60, 2)), rng.standard_normal((40, 2))
+    factorization.update(x, y)
+    matrix = matrix + x @ y.T
+    rows = rng.standard_normal((3, 40))
+    factorization.append_rows(rows)
+    matrix = np.vstack([matrix, rows])
+    columns = rng.standard_normal((63, 2))
+    factorization.append_columns(columns)
+    matrix = np.hstack([matrix, columns])
+    factorization.remove_rows([0, 10])
+    matrix = np.delete(matrix, [0, 10], axis=0)
+    factorization.remove_columns([5])
+    matrix = np.delete(matrix, [5], axis=1)
+
+    assert factorization.shape == matrix.shape
+    exact = np.linalg.svd(matrix, compute_uv=False)
+    np.testing.assert_allclose(factorization.s, exact[:factorization.rank], rtol=1e-9, atol=1e-9 * exact[0])
+    check = factorization.check(matrix)
+    assert check['relative_error'] < 1e-10
+    assert check['orthogonality_error'] < 1e-10
+
+def test_max_rank_starts_from_the_exact_leading_triplets():
+    rng = np.random.default_rng(1)
+    matrix = rng.standard_normal((80, 50))
+    factorization = IncrementalSVD.from_matrix(matrix, max_rank=10)
+    u, s, vt = np.linalg.svd(matrix, full_matrices=False)
+    assert factorization.rank == 10
+    np.testing.assert_allclose(factorization.s, s[:10], rtol=1e-12)
+    best = (u[:, :10] * s[:10]) @ vt[:10]
+    np.testing.assert_allclose(factorization.matrix(), best, atol=1e-10)
@@ -0,0 +1,48 @@
+"""Lookups, buffered access times and eviction of the LLM response cache."""
+import sqlite3
+
+import llm_cache
+from llm_cache import LLMCache
+
+def writes_during(cache, action):
+    """Rows written to the cache file while action runs, seen from a separate connection"""
+    def rows():
+        conn = sqlite3.connect(cache.db_name)
+        try:
+            return conn.execute("SELECT value FROM cache_stats ORDER BY name").fetchall(), \
+                conn.execute("SELECT key, accessed_at FROM llm_responses ORDER BY key").fetchall()
+        finally:
+            conn.close()
+    before = rows()
+    action()
+    return before != rows()
+
+def test_hits_do_not_write_until_the_buffer_is_flushed(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    cache.set("model", 0.7, "prompt", "answer")
+    assert not writes_during(cache, lambda: [cache.get("model", 0.7, "prompt") for _ in range(10)])
+    assert cache.hits == 10
+    stats = cache.stats()
+    assert stats['total_hits'] == 10 and stats['total_misses'] == 0
+
+def test_a_full_buffer_is_flushed(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "ACCESS_FLUSH_BATCH", 5)
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    cache.set("model", None, "prompt", "answer")
+    assert writes_during(cache, lambda: [cache.get("model", None, "prompt") for _ in range(5)])
+
+def test_eviction_sees_buffered_access_times(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_bytes=20)
+    cache.set("model", None, "old", "x" * 8)
+    cache.set("model", None, "new", "y" * 8)
+    # A hit makes "old" the most recently used entry, so "new" is evicted for the third one
+    assert cache.get("model", None, "old") == "x" * 8
+    cache.set("model", None, "third", "z" * 8)
+    assert cache.get("model", None, "old") == "x" * 8
+    assert cache.get("model", None, "new") is None
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), ttl_seconds=-1)
+    cache.set("model", None, "prompt", "answer")
+    assert cache.get("model", None, "prompt") is None
+    assert cache.stats()['total_misses'] == 1
@@ -0,0 +1,75 @@
+"""Circuit breaker states, Retry-After parsing and the latency histogram."""
+from types import SimpleNamespace
+
+from llm_clients import CircuitBreaker, LatencyHistogram, retry_after_seconds
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10.0, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+
+    clock.now = 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+def test_failed_probe_reopens_with_a_doubled_capped_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10.0, max_cooldown=15.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 10.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # 2 * 10 s, capped at 15 s
+    clock.now = 24.9
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 25.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_rate_limit_trips_at_once_for_the_retry_after_period():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10.0, clock=clock)
+    breaker.record_failure(retry_after=2.0, trip=True)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 2.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_released_probe_can_be_taken_again():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=1.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 1.0
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+def test_retry_after_headers():
+    def error(headers):
+        return Exception() if headers is None else SimpleNamespace(response=SimpleNamespace(headers=headers))
+    assert retry_after_seconds(error({'retry-after-ms': "1500"})) == 1.5
+    assert retry_after_seconds(error({'retry-after': "7"})) == 7.0
+    assert retry_after_seconds(error({'retry-after': "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after_seconds(error({'retry-after': "soon"})) is None
+    assert retry_after_seconds(error(None)) is None
+
+def test_latency_percentiles_are_bucket_upper_bounds():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) is None
+    for seconds in [0.1] * 90 + [10.0] * 10:
+        histogram.record(seconds)
+    assert 0.1 <= histogram.percentile(0.5) < 0.1 * 10 ** 0.1 + 1e-9
+    assert 10.0 <= histogram.percentile(0.95) < 10.0 * 10 ** 0.1 + 1e-9
@@ -0,0 +1,39 @@
+"""Limits of sandboxed benchmark runs, applied to the child after it started."""
+import os
+import sys
+
+import pytest
+
+from sandbox import run_sandboxed
+
+def run_python(source, **limits):
+    return run_sandboxed([sys.executable, "-c", source], limits)
+
+def test_normal_run_reports_output_and_usage():
+    run = run_python("print('hello')")
+    assert run['returncode'] == 0 and run['stdout'].strip() == "hello"
+    assert run['limit_exceeded'] is None
+    assert run['peak_rss'] > 0
+
+def test_wall_clock_limit_kills_the_process_group():
+    run = run_python("import subprocess, sys, time\n"
+                     "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+                     "time.sleep(60)", wall_seconds=1.0)
+    assert run['limit_exceeded'] == "wall"
+    assert run['wall_time'] < 30
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="prlimit limits are Linux-only")
+def test_cpu_time_limit():
+    run = run_python("while True: pass", wall_seconds=30.0, cpu_seconds=1)
+    assert run['limit_exceeded'] == "cpu"
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="prlimit limits are Linux-only")
+def test_memory_limit():
+    run = run_python("blocks = [bytearray(64 * 1024 ** 2) for _ in range(64)]", memory_bytes=512 * 1024 ** 2)
+    assert run['limit_exceeded'] == "memory"
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="CPU pinning is Linux-only")
+def test_child_is_pinned_to_the_given_cores():
+    core = min(os.sched_getaffinity(0))
+    run = run_sandboxed([sys.executable, "-c", "import os; print(sorted(os.sched_getaffinity(0)))"], None, {core})
+    assert run['stdout'].strip() == str([core])
@@ -0,0 +1,63 @@
+"""MinHash/LSH lookup of earlier submissions and the results it offers for reuse."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+from db_manager import DatabaseHandler
+from similarity_index import SimilarityIndex, compute_signature, estimated_similarity
+
+CODE = """
+def benchmark_target(values):
+    total = 0
+    for value in values:
+        if value % 3 == 0:
+            total += value * value
+    return total
+"""
+
+def result(output, execution_time, techniques, limit_exceeded=None, eliminated_in=None):
+    return {'code': CODE, 'output': output, 'execution_time': execution_time, 'memory_usage': 100.0,
+            'techniques': techniques, 'limit_exceeded': limit_exceeded, 'eliminated_in': eliminated_in}
+
+def test_near_duplicates_are_similar_and_unrelated_code_is_not():
+    renamed_comment = CODE.replace("total = 0", "total = 0  # running sum")
+    unrelated = "import json\nprint(json.dumps({'a': [1, 2, 3]}, indent=2))\n"
+    assert estimated_similarity(compute_signature(CODE), compute_signature(renamed_comment)) == 1.0
+    assert estimated_similarity(compute_signature(CODE), compute_signature(unrelated)) < 0.2
+
+def test_best_match_skips_failed_stopped_and_eliminated_runs(tmp_path):
+    db = DatabaseHandler(str(tmp_path / "history.db"))
+    index = SimilarityIndex(db)
+    conversation_id = db.create_conversation("test")
+    entry_id = db.save_optimization(conversation_id, CODE, 4, [
+        result("Exception occurred: ZeroDivisionError", 0.001, "broken"),
+        result("Error: no benchmark_target", 0.002, "missing"),
+        result("Stopped: wall-clock limit exceeded", 0.003, "slow", limit_exceeded="wall"),
+        result("Eliminated in round 1 at input scale 0.05", None, "small input", eliminated_in=1),
+        result("Eliminated in round 1 at input scale 0.05", 0.0001, "older row", eliminated_in=1),
+        result("42", 0.5, "Original"),
+        result("42", 0.2, "vectorized")
+    ])
+    index.add(entry_id, CODE)
+
+    match = index.find_best_match(CODE)
+    assert match['entry_id'] == entry_id
+    assert [row['techniques'] for row in match['results']] == ["vectorized", "Original"]
+    db.close()
+
+def test_results_table_of_older_databases_gains_the_new_columns(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE optimization_results (id INTEGER PRIMARY KEY AUTOINCREMENT, entry_id INTEGER,
+                    improved_code TEXT NOT NULL, output TEXT, execution_time FLOAT, memory_usage FLOAT, techniques TEXT)""")
+    conn.close()
+    db = DatabaseHandler(path)
+    columns = [row[1] for row in db.connection.execute("PRAGMA table_info(optimization_results)")]
+    assert 'limit_exceeded' in columns and 'eliminated_in' in columns
+    db.close()
+
+def test_index_does_not_load_the_measurement_module():
+    check = "import sys, similarity_index; print('testing_agent' in sys.modules)"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(sys.modules[SimilarityIndex.__module__].__file__))
+    assert subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, env=env).stdout.strip() == "False"
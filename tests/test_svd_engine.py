@@ -0,0 +1,32 @@
+"""svd_engine plans and the truncated SVD against np.linalg.svd."""
+import numpy as np
+import pytest
+
+from svd_engine import run_plan
+from truncated_svd import adaptive_svd, randomized_svd
+
+@pytest.mark.parametrize("driver", ["gesdd", "gesvd"])
+@pytest.mark.parametrize("transpose", [False, True])
+def test_every_plan_reconstructs_the_matrix(driver, transpose):
+    matrix = np.random.default_rng(0).standard_normal((30, 20))
+    u, s, vt = run_plan(matrix, "thin", driver, transpose)
+    np.testing.assert_allclose((u * s) @ vt, matrix, atol=1e-10)
+    np.testing.assert_allclose(run_plan(matrix, "values", driver, transpose),
+                               np.linalg.svd(matrix, compute_uv=False), atol=1e-10)
+
+@pytest.mark.parametrize("want", ["values", "thin"])
+def test_gesvd_rejects_non_finite_input(want):
+    matrix = np.ones((5, 4))
+    matrix[2, 1] = np.nan
+    with pytest.raises(ValueError):
+        run_plan(matrix, want, "gesvd", False)
+
+def test_truncated_svd_finds_the_leading_singular_values_of_a_low_rank_matrix():
+    rng = np.random.default_rng(2)
+    matrix = rng.standard_normal((200, 8)) @ rng.standard_normal((8, 150))
+    exact = np.linalg.svd(matrix, compute_uv=False)
+    _, s, _ = randomized_svd(matrix, 8)
+    np.testing.assert_allclose(s, exact[:8], rtol=1e-8)
+    u, s, vt = adaptive_svd(matrix, tol=1e-8)
+    assert len(s) == 8
+    np.testing.assert_allclose((u * s) @ vt, matrix, atol=1e-8 * exact[0])
@@ -0,0 +1,70 @@
+"""Technique discovery with a stub web search backend."""
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import agent_functions
+from llm_cache import LLMCache
+
+CODE = "def total(values):\n    return sum(v * v for v in values)\n"
+
+class StubSearch:
+    def __init__(self, response, delay=0.0):
+        self.response = response
+        self.delay = delay
+        self.queries = []
+
+    async def search(self, query, max_results, **options):
+        self.queries.append(query)
+        await asyncio.sleep(self.delay)
+        return self.response
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    """Answers invoke_with_fallback by the kind of prompt; returns the prompts it saw"""
+    prompts = []
+    answers = {'Summarize the following code': "sum of squares",
+               'Generate a list of': "1. Loop unrolling\n2. Vectorize with numpy",
+               'search snippets': "Use numpy.dot\nVectorize with numpy"}
+
+    async def invoke_with_fallback(prompt, hedge=None):
+        prompts.append(prompt)
+        return AIMessage(content=next(answer for marker, answer in answers.items() if marker in prompt))
+
+    monkeypatch.setattr(agent_functions, "invoke_with_fallback", invoke_with_fallback)
+    monkeypatch.setattr(agent_functions, "llm_cache", LLMCache(str(tmp_path / "cache.db")))
+    # Restored after the test, whatever set_search_backend installs
+    monkeypatch.setattr(agent_functions, "search_backend", agent_functions.search_backend)
+    return prompts
+
+def run(coroutine_function, *args):
+    return agent_functions.run_async_func(coroutine_function, *args)
+
+def test_search_timeout_falls_back_to_the_direct_techniques(llm, monkeypatch):
+    monkeypatch.setattr(agent_functions, "SEARCH_TIMEOUT", 0.1)
+    agent_functions.set_search_backend(StubSearch({'answer': "too late", 'results': []}, delay=5.0))
+    techniques = run(agent_functions.get_optimization_techniques, CODE, 2)
+
+    assert techniques == ["Loop unrolling", "Vectorize with numpy"]
+    assert not any('search snippets' in prompt for prompt in llm)
+
+def test_search_results_are_cached_in_the_search_namespace(llm):
+    backend = StubSearch({'answer': "Use BLAS", 'results': [{'content': "Blocked loops"}, {'content': ""}]})
+    agent_functions.set_search_backend(backend)
+    first = run(agent_functions.search_techniques, CODE, 2, "sum of squares")
+    second = run(agent_functions.search_techniques, CODE, 2, "sum of squares")
+
+    assert first == second == ["Use BLAS", "Blocked loops"]
+    assert len(backend.queries) == 1
+    query = "detailed and in-depth sum of squares optimization techniques"
+    assert agent_functions.llm_cache.get("tavily", None, f"{query}\n2", namespace="search") is not None
+    assert agent_functions.llm_cache.get("tavily", None, f"{query}\n2") is None
+
+def test_direct_techniques_are_merged_with_the_searched_ones(llm):
+    agent_functions.set_search_backend(StubSearch({'answer': "Use numpy.dot", 'results': [{'content': "BLAS kernels"}]}))
+    techniques = run(agent_functions.get_optimization_techniques, CODE, 2)
+
+    assert techniques == ["Use numpy.dot", "Vectorize with numpy"]
+    merge_prompt = next(prompt for prompt in llm if 'search snippets' in prompt)
+    assert "BLAS kernels" in merge_prompt and "Loop unrolling" in merge_prompt
@@ -0,0 +1,76 @@
+"""Limits and temporary files of the measurement runs."""
+import os
+
+import testing_agent
+
+CODE = "def total(n):\n    return sum(range(n))\n"
+SAMPLE = "size = int(1000 * SAMPLE_SCALE)\ndef benchmark_target():\n    return total(size)\nprint(benchmark_target())\n"
+
+def test_scaling_sweep_uses_the_baseline_cutoff(monkeypatch):
+    calls = []
+
+    def fake_get_metrics(temp_file_path, cores, timing_config, limits=None):
+        calls.append((timing_config, limits))
+        os.remove(temp_file_path)
+        return "", 0.01, 0.0, {}, {'median': 0.01, 'peak_traced_bytes': 0}, None
+
+    monkeypatch.setattr(testing_agent, "get_metrics", fake_get_metrics)
+    baseline = {'wall_time': 20.0, 'timing': {'median': 2.0}, 'limit_exceeded': None}
+    full_size = ("", 0.01, 0.0, {}, {'median': 0.01, 'peak_traced_bytes': 0}, None)
+    testing_agent.measure_scaling(CODE, SAMPLE, full_size, {0}, baseline)
+
+    assert len(calls) == len(testing_agent.COMPLEXITY_SWEEP_SCALES)
+    for timing_config, limits in calls:
+        assert limits['wall_seconds'] == testing_agent.CUTOFF_FACTOR * 20.0
+        assert timing_config['call_timeout'] == testing_agent.CUTOFF_FACTOR * 2.0
+        assert timing_config['max_seconds'] == testing_agent.COMPLEXITY_SWEEP_TIMING['max_seconds']
+
+def test_measured_run_removes_its_temporary_file():
+    path = testing_agent.write_temp_code(testing_agent.candidate_source(CODE, SAMPLE))
+    output, execution_time, _, _, timing, limit_exceeded = testing_agent.get_metrics(path)
+    assert output.splitlines()[-1] == str(sum(range(1000)))
+    assert limit_exceeded is None
+    assert not os.path.exists(path)
+
+def test_eliminated_versions_report_no_reduced_scale_measurements(monkeypatch):
+    def fake_measure_version(i, temp_file_path, cores, baseline, timing_overrides=None):
+        os.remove(temp_file_path)
+        return "ok", 0.001 * (i + 1), 2048.0, {'wall_time': 0.1}, {'median': 0.001 * (i + 1)}, None
+
+    def fake_measure_full_size(code, sample_input, pending, save_report, reports, core_slots):
+        for i in pending:
+            save_report(i, testing_agent.report_from_metrics(("ok", 1.0, 2048.0, {}, {'median': 1.0}, None), "{}"))
+
+    monkeypatch.setattr(testing_agent, "measure_version", fake_measure_version)
+    monkeypatch.setattr(testing_agent, "measure_full_size", fake_measure_full_size)
+    monkeypatch.setattr(testing_agent, "TOURNAMENT_SCALES", [0.5, 1.0])
+    reports = [None] * 5
+
+    def save_report(i, report):
+        reports[i] = report
+
+    testing_agent.run_tournament([CODE] * 5, SAMPLE, reports, save_report, [{0}])
+
+    assert [report.get('eliminated_in') for report in reports] == [None, None, None, 1, 1]
+    assert [report['execution_time'] for report in reports[:3]] == [1.0, 1.0, 1.0]
+    for report in reports[3:]:
+        assert report['execution_time'] is None and report['memory_usage'] is None and report['timing'] is None
+        assert report['output'].startswith("Eliminated in round 1 at input scale 0.5")
+    assert reports[4]['tournament']['rounds'][0]['execution_time'] == 0.005
+
+def test_invalidating_code_drops_its_reports_profiles_and_sample(monkeypatch, tmp_path):
+    store = testing_agent.DatabaseHandler(str(tmp_path / "benchmarks.db"))
+    monkeypatch.setattr(testing_agent, "result_store", store)
+    monkeypatch.setattr(testing_agent, "environment_fingerprint", lambda: "env")
+    key, code_hash, sample_hash = testing_agent.benchmark_key(CODE, SAMPLE)
+    store.save_sample(testing_agent.sample_key_for(CODE), SAMPLE)
+    store.save_benchmark(key, code_hash, sample_hash, "env", {'output': "ok"})
+    store.save_profile(key, code_hash, {'samples': 0}, None, None)
+
+    testing_agent.invalidate_code(CODE)
+    assert store.get_benchmark(key) is None and store.get_profile(key) is None
+    assert testing_agent.get_sample_input(CODE) == SAMPLE
+
+    testing_agent.invalidate_code(CODE, include_sample=True)
+    assert store.get_sample(testing_agent.sample_key_for(CODE)) is None
+    store.close()
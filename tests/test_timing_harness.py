@@ -0,0 +1,50 @@
+"""Timing summaries and per-call resource usage of the in-process timing harness."""
+import time
+
+import timing_harness
+
+def busy(seconds):
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+def test_usage_counters_are_per_call_whatever_the_iteration_count():
+    config = dict(timing_harness.DEFAULT_CONFIG, warmup=1, precision=0.0, max_seconds=60.0)
+    few = timing_harness.time_target(lambda: busy(0.005), dict(config, min_iterations=5, max_iterations=5))
+    many = timing_harness.time_target(lambda: busy(0.005), dict(config, min_iterations=40, max_iterations=40))
+
+    assert (few['iterations'], many['iterations']) == (5, 40)
+    for summary in (few, many):
+        cpu = summary['per_call_usage']['cpu_user_time'] + summary['per_call_usage']['cpu_system_time']
+        assert 0.004 <= cpu <= 0.01
+
+def seconds(values):
+    return [int(value * 1e9) for value in values]
+
+def test_confidence_interval_uses_the_order_statistic_ranks():
+    # n = 10: ranks floor(5 - 3.10) = 1 and ceil(5 + 3.10) - 1 = 8 of the sorted samples
+    summary = timing_harness.summarize_samples(seconds([10, 1, 9, 2, 8, 3, 7, 4, 6, 5]))
+    assert summary['iterations'] == 10
+    assert (summary['ci_low'], summary['ci_high']) == (2.0, 9.0)
+    assert summary['median'] == 5.5 and summary['min'] == 1.0 and summary['iqr'] == 4.5
+    # n = 100: ranks 40 and 59
+    summary = timing_harness.summarize_samples(seconds(range(1, 101)))
+    assert (summary['ci_low'], summary['ci_high']) == (41.0, 60.0)
+    # A single sample is its own interval
+    summary = timing_harness.summarize_samples(seconds([3]))
+    assert summary['ci_low'] == summary['median'] == summary['ci_high'] == 3.0
+
+def test_only_separated_intervals_are_significant():
+    baseline = timing_harness.summarize_samples(seconds(range(1, 11)))
+    overlapping = timing_harness.summarize_samples(seconds(range(5, 15)))
+    touching = timing_harness.summarize_samples(seconds([value / 10 for value in range(1, 9)] + [2, 2.5]))
+    faster = timing_harness.summarize_samples(seconds([value / 10 for value in range(1, 11)]))
+    slower = timing_harness.summarize_samples(seconds(range(20, 30)))
+
+    assert (touching['ci_high'], baseline['ci_low']) == (2.0, 2.0)
+    assert not timing_harness.is_significant_difference(baseline, overlapping)
+    assert not timing_harness.is_significant_difference(baseline, touching)
+    assert timing_harness.is_significant_difference(baseline, faster)
+    assert timing_harness.is_significant_difference(baseline, slower)
+    assert not timing_harness.is_significant_difference(baseline, None)
+    assert not timing_harness.is_significant_difference(None, faster)
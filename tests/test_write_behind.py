@@ -0,0 +1,61 @@
+"""Batching, ordering and shutdown of the write-behind history queue."""
+import threading
+
+import pytest
+
+from db_manager import DatabaseHandler, WriteBehindQueue
+
+RESULTS = [{'code': "print(1)", 'output': "1", 'execution_time': 0.1, 'memory_usage': 10.0, 'techniques': "Original"}]
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = WriteBehindQueue(DatabaseHandler(str(tmp_path / "history.db")))
+    yield writer
+    writer.close()
+
+def test_conversation_future_can_be_used_before_it_is_committed(writer):
+    conversation = writer.create_conversation("title")
+    entries = [writer.save_optimization(conversation, f"code {i}", 1, RESULTS) for i in range(3)]
+    writer.flush()
+    reader = DatabaseHandler(writer.db.db_name)
+    assert [entry['id'] for entry in reader.get_conversation_entries(conversation.result())] \
+        == sorted(entry.result() for entry in entries)
+    reader.close()
+
+def test_failing_job_does_not_take_its_batch_down(writer):
+    def broken(cursor):
+        raise ValueError("broken job")
+
+    first = writer.create_conversation("first")
+    failed = writer.submit(broken)
+    last = writer.create_conversation("last")
+    writer.flush()
+    assert last.result() == first.result() + 1
+    with pytest.raises(ValueError):
+        failed.result()
+    assert writer.metrics()['failed_jobs'] == 1
+
+def test_close_either_accepts_and_commits_a_job_or_rejects_it(writer):
+    accepted, rejected = [], []
+    start = threading.Barrier(5)
+
+    def submit_many():
+        start.wait()
+        for i in range(200):
+            try:
+                accepted.append(writer.create_conversation(f"conversation {i}"))
+            except RuntimeError:
+                rejected.append(i)
+
+    threads = [threading.Thread(target=submit_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    writer.close()
+    for thread in threads:
+        thread.join()
+
+    assert len(accepted) + len(rejected) == 800
+    assert all(future.done() and future.exception() is None for future in accepted)
+    with pytest.raises(RuntimeError):
+        writer.create_conversation("after close")